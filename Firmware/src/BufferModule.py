@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# Author: Cyrill Lippuner
+# Date: October 2018
+"""
+SoftWEAR Buffer module.
+
+    Preallocated columnar ring buffers for the samples of the drivers. A driver
+    appends into its SampleBuffer, the update thread takes SampleBlocks holding a
+    columnar copy of the taken samples (one slice per column) and serializes them
+    block-wise. Taken blocks stay valid in the send queues and the block cache
+    after the ring has wrapped.
+"""
+
+import struct                                                   # Packing of the columns
+from array import array                                         # Typed arrays for the columns
+from SchedulerModule import newData                             # Signal new samples to the update thread
+
+CAPACITY = 1024                                                 # Default number of samples kept per buffer
+NAN = float('nan')                                              # Placeholder for 'None' values
+
+
+class SampleBuffer:
+    """Ring buffer with a timestamp column and one column per dimension."""
+
+    # Number of samples the buffer can hold
+    _capacity = CAPACITY
+
+    # Dimension of the samples
+    _dim = 0
+
+    # Timestamp column
+    _timestamps = None
+
+    # Value columns
+    _columns = None
+
+    # Total number of samples written
+    _written = 0
+
+    # Total number of samples taken
+    _taken = 0
+
+    # Number of samples overwritten before they were taken
+    dropped = 0
+
+    def __init__(self, dim, capacity=CAPACITY):
+        """Preallocate the columns."""
+        self._capacity = capacity
+        self._dim = dim
+        self._timestamps = array('d', [0.]) * capacity
+        self._columns = [array('d', [0.]) * capacity for _ in range(dim)]
+        self._written = 0
+        self._taken = 0
+        self.dropped = 0
+
+    def __len__(self):
+        """Return the number of samples not yet taken."""
+        return min(self._written - self._taken, self._capacity)
+
+    def append(self, timestamp, values):
+        """Write a sample, 'None' values are stored as NaN."""
+        index = self._written % self._capacity
+        self._timestamps[index] = timestamp
+        for column, value in zip(self._columns, values):
+            column[index] = NAN if value is None else value
+        self._written += 1                                      # Publish the sample once it is complete
+        newData.set()                                           # Wake the update thread
+
+    def take(self, clear=True):
+        """Return a block of the samples not yet taken."""
+        end = self._written
+        start = self._taken
+        if end - start > self._capacity:                        # The oldest samples have been overwritten
+            self.dropped += end - start - self._capacity
+            start = end - self._capacity
+        if clear:
+            self._taken = end
+        segments = []                                           # Contiguous index ranges of the samples
+        if end > start:
+            first = start % self._capacity
+            last = first + end - start
+            if last <= self._capacity:
+                segments = [(first, last)]
+            else:
+                segments = [(first, self._capacity), (0, last - self._capacity)]
+        timestamps = array('d')                                 # Copy the column slices
+        columns = [array('d') for _ in range(self._dim)]
+        for first, last in segments:
+            timestamps.extend(self._timestamps[first:last])
+            for copy, column in zip(columns, self._columns):
+                copy.extend(column[first:last])
+        return SampleBlock(timestamps, columns)
+
+    def clear(self):
+        """Drop all samples not yet taken."""
+        self._taken = self._written
+
+
+class SampleBlock:
+    """Consecutive samples taken from a SampleBuffer. Behaves like a list of [timestamp, [values]]."""
+
+    # Timestamp column
+    _timestamps = None
+
+    # Value columns
+    _columns = None
+
+    def __init__(self, timestamps, columns):
+        """Hold the timestamp and value columns of the samples."""
+        self._timestamps = timestamps
+        self._columns = columns
+
+    def __len__(self):
+        """Return the number of samples."""
+        return len(self._timestamps)
+
+    def __getitem__(self, i):
+        """Return the sample i as [timestamp, [values]]."""
+        if i < 0:
+            i += len(self)
+        if i < 0 or i >= len(self):
+            raise IndexError('sample index out of range')
+        return [self._timestamps[i],
+                [None if column[i] != column[i] else column[i] for column in self._columns]]
+
+    def __iter__(self):
+        """Iterate the samples as [timestamp, [values]]."""
+        for i in range(len(self)):
+            yield self[i]
+
+    def dim(self):
+        """Return the dimension of the samples."""
+        return len(self._columns)
+
+    def toList(self):
+        """Return the samples as list of [timestamp, [values]]."""
+        return [sample for sample in self]
+
+    def packTimestamps(self):
+        """Return the timestamps as little-endian float64."""
+        return struct.pack('<%dd' % len(self._timestamps), *self._timestamps)
+
+    def packColumns(self):
+        """Return the value columns one after another as little-endian float32."""
+        return b''.join([struct.pack('<%df' % len(column), *column) for column in self._columns])
@@ -7,31 +7,148 @@ SoftWEAR Communications module.
     The API provided by this class is asynchronous;
     i.e. there is a background thread doing all the work and calls are non-blocking.
     Inspired by the RoboCom.
+
+    Several clients (Interface, recorder, haptic controller, ...) may be connected at
+    once. Every client has its own protocol, bounded send queue and writer thread, so a
+    slow client only drops its own data. A 'Subscribe' message restricts the data sent
+    to a client to a list of device names. Data blocks are serialized once and shared
+    by all clients talking the same protocol.
+
+    A client may request the data over UDP with a 'Stream' message for the lowest
+    latency: the data messages are sent as sequence-numbered packets right away
+    (no queue, no batching, lost packets are not repeated), the control messages
+    stay on the TCP connection.
 """
 
 import os                                                       # Operating system functionality
 import socket as sock                                           # Standard socket API. Communication is over TCP/IP
+import select                                                   # Wait for received data without socket timeouts
+import struct                                                   # Errors of blocks that cannot be packed
 import threading                                                # Threading class for the background thread
 import json                                                     # Serializing class. All objects sent are serialized
-from collections import deque                                   # Queues will be used for recieving and sending
 import logging                                                  # This class logs all info - so logging is imported
 import time                                                     # For delays in the background thread
+import ProtocolModule                                           # SoftWEAR Protocol module for framing the messages
+import SchedulerModule                                          # SoftWEAR Scheduler module to wake the update thread
+from Config import SEND_BATCH_LATENCY, SEND_COALESCE, TCP_NODELAY # SoftWEAR Config module.
+from Config import SEND_QUEUE_SIZE, QUEUE_POLICY                # SoftWEAR Config module.
+from Config import MAX_CLIENTS, SEND_TIMEOUT                    # SoftWEAR Config module.
+from Config import UDP_STREAM, PACKET_SIZE                      # SoftWEAR Config module.
+from Config import COMPRESSION                                  # SoftWEAR Config module.
 
 
 LOG_LEVEL_PRINT = logging.DEBUG
 LOG_LEVEL_SAVE = logging.DEBUG
 
+# Policies of the client send queues, 'block' would stall the update thread on one slow client
+CLIENT_QUEUE_POLICIES = [ProtocolModule.QUEUE_DROP_OLDEST, ProtocolModule.QUEUE_KEEP_LATEST]
+if QUEUE_POLICY not in CLIENT_QUEUE_POLICIES:                   # Fail at start instead of blocking the clients
+    raise ValueError('Policy {} is not allowed'.format(QUEUE_POLICY))
+
+class CommunicationClient:
+    """Client connected to the CommunicationConnection."""
+
+    # The Connection Socket of the client
+    conn = None
+
+    # The address of the client
+    addr = None
+
+    # The state of the client (Connected, Disconnected)
+    state = 'Connected'
+
+    # Encoder of the protocol and compression negotiated with the client
+    encoder = None
+
+    # Decoder splitting the received stream into messages
+    decoder = None
+
+    # Send queue (bounded for the data messages)
+    sendQueue = None
+
+    # Event set when messages are added to the send queue
+    sendEvent = None
+
+    # Device names the client subscribed to, None for all devices
+    subscription = None
+
+    # Address of the UDP data stream, None to send the data over TCP
+    streamAddr = None
+
+    # Sequence number of the next UDP packet
+    sequence = 0
+
+    # Number of UDP packets that could not be sent
+    streamDropped = 0
+
+    def __init__(self, conn, addr, cache=None):
+        """Create the client of an accepted connection, the encoded data blocks of the cache are shared."""
+        self.conn = conn
+        self.addr = addr
+        self.state = 'Connected'
+        self.encoder = ProtocolModule.Encoder(cache)            # Every new connection starts with JSON
+        self.decoder = ProtocolModule.Decoder()                 # Initialize the stream decoder
+        self.sendQueue = ProtocolModule.MessageQueue(SEND_QUEUE_SIZE, QUEUE_POLICY) # Initialize the send queue
+        self.sendEvent = threading.Event()                      # Initialize the send event
+        self.subscription = None                                # Send the data of all devices until subscribed
+        self.streamAddr = None                                  # Send the data over TCP until a stream is requested
+        self.sequence = 0
+        self.streamDropped = 0
+
+    def subscribe(self, names):
+        """Restrict the data sent to the client to the device names (None for all devices)."""
+        self.subscription = None if names is None else set(names)
+
+    def stream(self, port):
+        """Send the data messages over UDP to the port of the client (None to go back to TCP)."""
+        self.streamAddr = None if port is None else (self.addr[0], int(port))
+
+    def filter(self, message):
+        """Return the message restricted to the subscribed devices or None if nothing is left."""
+        if self.subscription is None or not ProtocolModule.isData(message):
+            return message
+        data = [block for block in message['data'] if block['name'] in self.subscription]
+        if len(data) == 0:
+            return None
+        if len(data) == len(message['data']):
+            return message
+        return {'type': 'D', 'data': data}                      # The blocks are shared with the other clients
+
+    def send(self, messages):
+        """Queue the messages for the client and wake its writer."""
+        queued = False
+        for message in messages:
+            message = self.filter(message)
+            if message is not None:
+                self.sendQueue.put(message)                     # Add message to queue to send (may drop old data)
+                queued = True
+        if queued:
+            self.sendEvent.set()                                # Wake the writer
+
+
 class CommunicationConnection:
     """CommunicationConnection connection."""
 
     # Timeout in seconds. Affects the sending 'Sampling Period'
     _timeout = 0.1
 
-    # Send queue
-    _sendQueue = deque()
+    # Connected clients by socket
+    _clients = {}
+
+    # Lock for the connected clients
+    _clientsLock = None
+
+    # Encoded data blocks shared by the clients
+    _cache = None
+
+    # The UDP socket of the data streams
+    _udp = None
 
     # Recv queue
-    _recvQueue = deque()
+    _recvQueue = None
+
+    # Data messages and samples dropped by the disconnected clients
+    _dropped = None
 
     # Logger object used by the class to create the log file
     _logger = logging.getLogger('Communication')
@@ -58,8 +175,13 @@ class CommunicationConnection:
         Creates (and binds) the socket, starts the logger and sets all communication options.
         """
         self._commsThreadRun = True                             # Initialize the thread enable boolean
-        self._sendQueue = deque()                               # Initialize the send queue
-        self._recvQueue = deque()                               # Initialize the recieve queue
+        self._clients = {}                                      # No clients connected
+        self._clientsLock = threading.Lock()                    # Initialize the clients lock
+        self._cache = ProtocolModule.BlockCache()               # Initialize the encoded blocks
+        self._udp = sock.socket(sock.AF_INET, sock.SOCK_DGRAM)  # Socket of the UDP data streams
+        self._udp.setblocking(False)                            # A full send buffer drops packets instead of blocking
+        self._recvQueue = ProtocolModule.MessageQueue()         # Initialize the recieve queue
+        self._dropped = {'messages': 0, 'samples': 0, 'packets': 0} # Initialize the dropped counters
 
         # Configure the logger
         self._logger = logging.getLogger('CommunicationModule')
@@ -100,81 +222,181 @@ class CommunicationConnection:
         pass
 
     def _innerThread(self):
-        """Inner thread function, does all socket sendind and recieving."""
-        while True:                                             # Infinite loop of servicing requests
-            self._logger.info('Listening for incoming connections')
-            self._s.listen(1)                                   # Listen for connections
-            self._state = 'Listening'
-            remainder = ""                                      # Remainder mechanism for TCP incomplete transmissions
-
-            while True:                                         # While loop for the accept call
-                try:                                            # Since we are non-blocking, timeouts can/will occur
-                    conn, addr = self._s.accept()               # Accept any incoming connection
-                    conn.settimeout(self._timeout)              # Set new socket timeout
-                    self._logger.info("Connected to: " + str(addr))
-                    self._state = 'Connected'
-                    break
-                except sock.timeout:                            # We expect timeouts, as we have non-blocking calls
-                    if not self._commsThreadRun:
-                        return                                  # This line terminates the background thread
-
-            while True:                                         # While loop dedicated to recieving and sending data
-                try:                                            # We will be using the connection socket
-                    data = conn.recv(1024)
-                    if not data: break                          # This means remote location closed socket
-                    self._logger.debug("Recieved RAW data: " + str(data))
-                    m_list = (remainder + data.decode("utf-8")).split("}")  # Add the recieved data to the previous remainder
-                    remainder = ""
-                    while len(m_list) > 0:                      # After it's split, go through all sub-messages to compose a complete message
-                                                                # If we have a message stub and it's imbalanced (more '{' than '}')
-                        if remainder and remainder.count("{") > remainder.count("}"):
-                            remainder += m_list.pop(0)          # Add the next sub-message
-                            if len(m_list) > 0:
-                                    remainder += "}"            # Add terminator only if the split indicates we recieved it
-                        elif remainder:                         # If we have a message and it's balanced -> we have a complete message
-                            self._recvQueue.append(json.loads(remainder))
-                            self._logger.info("Recieved data: " + str(remainder))
-                            remainder = ""                      # After the recieve reset the remainder
-                                                                # If we have no message and the list is almost empty - only "" remains
-                        elif len(m_list) == 1 and m_list[0] == "":
-                             m_list.pop(0)                      # Empty it
-                        else:                                   # If we have no message and the list is not empty -> start a new sub-message
-                            remainder += m_list.pop(0)
-                            if len(m_list) > 0:
-                                remainder += "}"                # Add terminator only if the split indicates we recieved it
-                except sock.timeout:                            # We expect timeouts, as we have non-blocking calls
-                    pass
-                except IOError as exc:
-                    self._logger.error('IOError Error occurred: ' + str(exc))
-                except sock.error as exc:
+        """Inner thread function, accepts the clients and does all socket recieving."""
+        self._logger.info('Listening for incoming connections')
+        self._s.listen(MAX_CLIENTS)                             # Listen for connections
+        self._state = 'Listening'
+
+        while self._commsThreadRun:                             # Infinite loop of servicing requests
+            for client in self._getClients():
+                if client.state != 'Connected':                 # Writer failed, drop the client
+                    self._dropClient(client)
+            sockets = [self._s] + [client.conn for client in self._getClients()]
+            try:
+                readable, _, _ = select.select(sockets, [], [], self._timeout) # Wait for connections and received data
+            except (select.error, ValueError) as exc:           # A client socket has been closed meanwhile
+                self._logger.error('Select Error occurred: ' + str(exc))
+                continue
+            for s in readable:
+                if s is self._s:
+                    self._acceptClient()
+                else:
+                    client = self._clients.get(s)
+                    if client is not None:
+                        self._receive(client)
+
+        for client in self._getClients():                       # Close all connections if we ever reach here
+            self._dropClient(client)
+
+    def _acceptClient(self):
+        """Accept a new client and start its writer."""
+        try:
+            conn, addr = self._s.accept()                       # Accept any incoming connection
+        except sock.timeout:                                    # The client gave up meanwhile
+            return
+        except sock.error as exc:
+            self._logger.error('Socket Error occurred: ' + str(exc))
+            return
+        if len(self._clients) >= MAX_CLIENTS:                   # Refuse clients above the limit
+            self._logger.warning("Refused: " + str(addr) + ", " + str(MAX_CLIENTS) + " clients connected")
+            conn.close()
+            return
+        conn.settimeout(SEND_TIMEOUT)                           # The reader waits with select, the writer gives up after the timeout
+        conn.setsockopt(sock.IPPROTO_TCP, sock.TCP_NODELAY, 1 if TCP_NODELAY else 0) # Batches are complete, do not delay them
+        client = CommunicationClient(conn, addr, self._cache)
+        with self._clientsLock:
+            self._clients[conn] = client
+            self._state = 'Connected'
+        self._logger.info("Connected to: " + str(addr))
+
+        writer = threading.Thread(target=self._writerThread, args=(client,), name="CommunicationWriterThread")
+        writer.daemon = True                                    # Set thread as daemonic
+        writer.start()                                          # Send independently of the receiving
+
+    def _dropClient(self, client):
+        """Disconnect a client, its writer terminates on its own."""
+        with self._clientsLock:
+            if self._clients.pop(client.conn, None) is None:
+                return                                          # Already dropped
+            dropped = client.sendQueue.dropped()
+            self._dropped['messages'] += dropped['messages']
+            self._dropped['samples'] += dropped['samples']
+            self._dropped['packets'] += client.streamDropped
+            if len(self._clients) == 0:
+                self._state = 'Listening'
+        client.state = 'Disconnected'                           # Stop the writer of the connection
+        client.sendEvent.set()                                  # Wake the writer to terminate
+        client.sendQueue.clear()                                # Drop the messages and release blocked producers
+        try:
+            client.conn.shutdown(sock.SHUT_RDWR)                # Abort a blocked write of the writer
+        except sock.error:
+            pass
+        client.conn.close()                                     # Close connection
+        self._logger.info("Disconnected from: " + str(client.addr))
+
+    def _receive(self, client):
+        """Receive from a client and queue the completed messages."""
+        try:
+            count = client.decoder.recvInto(client.conn)        # Receive directly into the decoder buffer
+            if not count:                                       # This means remote location closed socket
+                self._dropClient(client)
+                return
+            self._logger.debug("Recieved RAW data: " + str(count) + " bytes")
+            for message in client.decoder.decode():             # Decode all completed messages
+                if message['type'] == 'Hello':                  # Protocol negotiation is handled here
+                    protocol = ProtocolModule.negotiate(message.get('protocols', []))
+                    compression = []                            # Compression requires the binary protocol
+                    if protocol == ProtocolModule.PROTOCOL_BINARY:
+                        compression = ProtocolModule.negotiateCompression(message.get('compression', []), COMPRESSION)
+                    client.encoder.setProtocol(protocol, compression)
+                    client.sendQueue.put({'type': 'Hello', 'name': '', 'protocol': protocol, 'compression': compression}, front=True)
+                    client.sendEvent.set()                      # Wake the writer
+                    self._logger.info("Negotiated protocol: " + protocol + " " + str(compression))
+                elif message['type'] == 'Subscribe':            # Subscriptions are handled per client
+                    client.subscribe(message.get('names'))
+                    self._logger.info("Subscribed to: " + str(message.get('names')))
+                elif message['type'] == 'Stream':               # UDP data streams are handled per client
+                    if UDP_STREAM:
+                        client.stream(message.get('port'))
+                        self._logger.info("Streaming to: " + str(client.streamAddr))
+                    else:
+                        self._logger.warning("Stream refused, UDP_STREAM is disabled")
+                else:
+                    self._recvQueue.put(message)
+                    SchedulerModule.newData.set()               # Wake the update thread
+                    self._logger.info("Recieved data: " + str(message))
+        except sock.timeout:                                    # We expect timeouts, as we have non-blocking calls
+            pass
+        except IOError as exc:
+            self._logger.error('IOError Error occurred: ' + str(exc))
+            self._dropClient(client)
+        except sock.error as exc:
                                                                 # Socket error occured. Log it and mark the disconnect
-                    self._logger.error('Socket Error occurred: ' + str(exc))
-                    print("Error Occured: " + str(exc))
-                    self._state = 'Disconnected'
-                    break
+            self._logger.error('Socket Error occurred: ' + str(exc))
+            print("Error Occured: " + str(exc))
+            self._dropClient(client)
+        except Exception as exc:
+                                                                # Log generic errors
+            self._logger.error('General Error occurred: ' + str(exc))
+
+    def _writerThread(self, client):
+        """Writer thread of a client, sends all queued messages with a single write."""
+        while client.state == 'Connected' and self._commsThreadRun:
+            if not client.sendEvent.wait(self._timeout) and len(client.sendQueue) == 0: # Wait for messages to send
+                continue
+            if SEND_BATCH_LATENCY > 0:
+                time.sleep(SEND_BATCH_LATENCY)                  # Gather the messages queued meanwhile
+            client.sendEvent.clear()                            # Messages queued from now on wake the next batch
+            messages = client.sendQueue.takeAll()               # Pop all elements from the sending queue
+            if SEND_COALESCE:
+                messages = ProtocolModule.coalesce(messages)    # Merge consecutive data messages into one frame
+            chunks = []
+            for message in messages:
+                try:
+                    chunks.append(client.encoder.encode(message)) # Data blocks are encoded once for all clients
                 except Exception as exc:
                                                                 # Log generic errors
                     self._logger.error('General Error occurred: ' + str(exc))
-                while len(self._sendQueue) > 0:
-                    try:
-                                                                # Pop all elements from the sending queue and send them all
-                        send_message = self._sendQueue.popleft()
-                        conn.sendall(str.encode(send_message))
-                        self._logger.info("Sent message: " + str(send_message))
-                    except IOError as exc:
-                        self._logger.error('IOError Error occurred: ' + str(exc))
-                    except sock.error as exc:
-                                                                # Socket error occured. Log it and mark the disconnect
-                        self._logger.error('Socket Error occurred: ' + str(exc))
-                        print("Error Occured: " + str(exc))
-                        self._state = 'Disconnected'
-                    except Exception as exc:
-                                                                # Log generic errors
-                        self._logger.error('General Error occurred: ' + str(exc))
-                if not self._commsThreadRun:
-                    return                                      # This line terminates the background thread
-            conn.close()                                        # Close connection if we ever reach here
-
+            if len(chunks) == 0 or client.state != 'Connected':
+                continue
+            try:
+                client.conn.sendall(b''.join(chunks))           # Send the whole batch at once
+                self._logger.info("Sent messages: " + str(len(chunks)))
+            except (IOError, sock.error) as exc:
+                                                                # Socket error or timeout of a slow client. Log it and mark the disconnect
+                self._logger.error('Socket Error occurred: ' + str(exc))
+                print("Error Occured: " + str(exc))
+                client.state = 'Disconnected'                   # The inner thread drops the client
+
+    def _stream(self, client, messages):
+        """Send the data messages as UDP packets to the client, the other messages are queued for TCP."""
+        queued = []
+        for message in messages:
+            if not ProtocolModule.isData(message):
+                queued.append(message)                          # Control messages stay on TCP
+                continue
+            message = client.filter(message)
+            if message is None:
+                continue
+            data = [block for block in message['data'] if len(block['values']) > 0]
+            try:
+                packets = ProtocolModule.encodePackets(data, client.sequence, self._cache, PACKET_SIZE)
+            except struct.error:                                # Ragged or non numeric samples are sent over TCP
+                queued.append(message)
+                continue
+            client.sequence += len(packets)
+            for packet in packets:
+                try:
+                    self._udp.sendto(packet, client.streamAddr)
+                except sock.error as exc:                       # Full send buffer or unreachable client, the packet is lost
+                    client.streamDropped += 1
+                    self._logger.debug('UDP Error occurred: ' + str(exc))
+        client.send(queued)
+
+    def _getClients(self):
+        """Return the list of the connected clients."""
+        with self._clientsLock:
+            return list(self._clients.values())
 
     def connect(self):
         """Start the background communication thread."""
@@ -195,22 +417,48 @@ class CommunicationConnection:
         self._commsThreadRun = False                            # Set communication flag to false
         time.sleep(0.5)
         self._s.close()                                         # Close socket
+        self._udp.close()                                       # Close UDP socket
         logging.shutdown()
 
     def sendMessages(self, messages):
-        """Send a data object to the remote host."""
-        for message in messages:
-            self._sendQueue.append(message)                     # Add messages to queue to send
+        """Send messages (JSON strings or message dicts) to all connected clients."""
+        for client in self._getClients():
+            if client.streamAddr is not None:
+                self._stream(client, messages)                  # Data is sent over UDP right away
+            else:
+                client.send(messages)                           # Filtered by the subscription of the client
         self._logger.debug('Messages added to send queue: ' + str(messages))
 
     def getMessages(self):
         """Get a list of all the messages that have been recieved since the last call of this function."""
-        messages = []                                           # Return object initialized as an empty list
-        while len(self._recvQueue) > 0:
-            messages.append(self._recvQueue.popleft())          # Pop all messages from the recieve queue and add them to the return list
+        messages = self._recvQueue.takeAll()                    # Pop all messages from the recieve queue
         self._logger.debug('Messages removed from rcv queue: ' + str(messages))
         return list(map(lambda x: json.dumps(x), messages))
 
+    def getThroughput(self):
+        """Get the received bytes and messages per second of all clients since the last call of this function."""
+        throughput = {'bytes': 0., 'messages': 0.}
+        for client in self._getClients():
+            clientThroughput = client.decoder.throughput()
+            throughput['bytes'] += clientThroughput['bytes']
+            throughput['messages'] += clientThroughput['messages']
+        return throughput
+
+    def getDropped(self):
+        """Get the number of data messages and samples dropped by the full send queues and UDP packets not sent."""
+        with self._clientsLock:
+            dropped = dict(self._dropped)
+            for client in self._clients.values():
+                clientDropped = client.sendQueue.dropped()
+                dropped['messages'] += clientDropped['messages']
+                dropped['samples'] += clientDropped['samples']
+                dropped['packets'] += client.streamDropped
+        return dropped
+
+    def getClients(self):
+        """Get the number of connected clients."""
+        return len(self._clients)
+
     def countRecvMessages(self):
         """Get the number of message currently in the recieve queue."""
         return len(self._recvQueue)
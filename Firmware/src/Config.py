@@ -22,6 +22,76 @@ Configuration file for the Firmware of the Wearable SoftWEAR. PLEASE DO NOT CHAN
 # Layout configuration
 LAYOUT = "DefaultLayout"
 
+# I2C scheduling: 'bus' reads all devices of a bus from a single scheduler thread,
+# 'thread' runs one thread per driver
+I2C_SCHEDULING = 'bus'
+
+# Late ticks of the periodic loops: 'drop' restarts the schedule from now,
+# 'catchup' runs the missed ticks back to back
+SCHEDULER_POLICY = 'drop'
+
+# Hardware backend: 'board' uses the Adafruit libraries of the BBGW,
+# 'simulation' runs on virtual hardware described by SIMULATION
+HARDWARE = 'board'
+
+# Sending: the first queued message waits at most SEND_BATCH_LATENCY seconds to be
+# sent together with the following ones, consecutive data messages are merged
+SEND_BATCH_LATENCY = 0.005
+SEND_COALESCE = True
+# Disable Nagle's algorithm on the connection (batches are written at once)
+TCP_NODELAY = True
+
+# Bounded send queues: number of queued data messages and the policy of a full queue
+# 'dropoldest' drops the oldest data message, 'latest' keeps the latest sample of every
+# device. Control messages are never dropped. 'block' is not allowed for the client send
+# queues, one slow client would block the update thread and with it all other clients.
+SEND_QUEUE_SIZE = 100
+QUEUE_POLICY = 'dropoldest'
+
+# Fan-out server: number of clients served at once. A client whose socket does not
+# accept a batch within SEND_TIMEOUT seconds is disconnected.
+MAX_CLIENTS = 4
+SEND_TIMEOUT = 2.
+
+# UDP data stream: clients may request the data messages over UDP ('Stream' message),
+# the control messages stay on TCP. Datagrams hold at most PACKET_SIZE bytes.
+UDP_STREAM = True
+PACKET_SIZE = 1400
+
+# Compressions of the binary protocol offered to the clients: 'quantize' (fixed-point,
+# delta encoded samples) and 'zlib' (deflated payloads). Used if the client offers them.
+COMPRESSION = ['quantize', 'zlib']
+
+# Debounce of the edge detection on the input pins and the scan pin in milliseconds,
+# edges following an accepted edge within this time are ignored
+GPIO_DEBOUNCE = 10
+
+################################################################################
+# Simulated hardware (only used with HARDWARE = 'simulation')
+SIMULATION = {
+    # Levels of the input pins driven by the simulation
+    "GPIO": {
+        "P9_41": 1,                                             # Scanning enabled
+        "P9_15": 1                                              # I2C mux detected
+    },
+    # Analog pins with a connected sensor
+    "ADC": ["P9_39", "P9_40"],
+    # I2C devices, MUX and CHANNEL place a device behind a TCA9548A channel
+    "I2C": [
+        {"DEVICE": "TCA9548A", "ADDRESS": 0x70, "BUSNUM": 2},
+        {"DEVICE": "BNO055", "ADDRESS": 0x28, "BUSNUM": 2, "MUX": 0x70, "CHANNEL": 0},
+        {"DEVICE": "BNO055", "ADDRESS": 0x29, "BUSNUM": 2, "MUX": 0x70, "CHANNEL": 0},
+        {"DEVICE": "ADS1015", "ADDRESS": 0x48, "BUSNUM": 2, "MUX": 0x70, "CHANNEL": 1},
+        {"DEVICE": "PCA9685", "ADDRESS": 0x40, "BUSNUM": 2, "MUX": 0x70, "CHANNEL": 2}
+    ],
+    # Latencies in seconds
+    "GPIO_LATENCY": 0.00001,                                    # Pin access
+    "ADC_LATENCY": 0.0001,                                      # Analog conversion
+    "I2C_LATENCY": 0.0001,                                      # I2C transfer
+    "I2C_BYTE_LATENCY": 0.00009                                 # Every byte of an I2C transfer (100 kHz)
+}
+################################################################################
+
 ################################################################################
 # Used I2C addresses
 ADDRESSES = []
@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+# Author: Cyrill Lippuner
+# Date: October 2018
+"""
+SoftWEAR Hardware module.
+
+    Selects the hardware backend configured with HARDWARE. 'board' uses the Adafruit
+    libraries of the BBGW, 'simulation' uses virtual pins, analog channels and I2C
+    devices described by SIMULATION. All modules and drivers import GPIO, ADC, PWM and
+    I2C from here.
+"""
+
+from Config import HARDWARE                                     # SoftWEAR Config module.
+
+if HARDWARE == 'board':
+    import Adafruit_BBIO.GPIO as GPIO                           # Main peripheral class. Implements GPIO communication
+    import Adafruit_BBIO.ADC as ADC                             # Analog pins
+    import Adafruit_BBIO.PWM as PWM                             # PWM pins
+    import Adafruit_GPIO.I2C as I2C                             # I2C buses
+elif HARDWARE == 'simulation':
+    import simulation.GPIO as GPIO                              # Virtual pins
+    import simulation.ADC as ADC                                # Virtual analog pins
+    import simulation.PWM as PWM                                # Virtual PWM pins
+    import simulation.I2C as I2C                                # Virtual I2C buses with simulated devices
+else:
+    raise ValueError('Hardware {} is not allowed'.format(HARDWARE))
@@ -5,8 +5,12 @@
 SoftWEAR I2C module. Adds MUX features and hardware detection to normal I2C.
 """
 
-from Config import PIN_MAP                                      # SoftWEAR Config module.
+import threading                                                # Threading class for the bus scheduler threads
+import time                                                     # Required for the scheduling of the reads
+
+from Config import PIN_MAP, I2C_SCHEDULING                      # SoftWEAR Config module.
 from MuxModule import GetMux                                    # SoftWEAR MUX module.
+import SchedulerModule                                          # SoftWEAR Scheduler module.
 
 from drivers.I2C_BNO055 import BNO055                           # Driver module for the BNO055 device
 from drivers.I2C_PCA9685 import PCA9685                         # Driver module for the PCA9685 device
@@ -25,19 +29,126 @@ MuxModule = GetMux()
 # List of all possible drivers
 DRIVERS = [BNO055, PCA9685, ADS1015]
 
+# Longest sleep of a bus scheduler without devices due
+SCHEDULER_IDLE = 0.1
+
+# Window in seconds over which the achieved rates are measured
+RATE_WINDOW = 1.
+
+
+class BusScheduler:
+    """Reads all devices of one I2C bus from a single thread, ordered by mux channel."""
+
+    # Bus num of the scheduler
+    _busnum = None
+
+    # Scheduled drivers as list of (driver, name), ordered by mux and channel
+    _drivers = []
+
+    # Next deadline in ns on the monotonic clock for each device
+    _deadlines = {}
+
+    # Number of updates in the current rate window for each device
+    _counts = {}
+
+    # Start of the current rate window
+    _windowStart = 0
+
+    # Achieved and requested rate for each device
+    _rates = {}
+
+    # Thread active flag
+    _threadActive = False
+
+    # Thread of the scheduler
+    _thread = None
+
+    # Lock for the driver list
+    _lock = None
+
+    def __init__(self, busnum):
+        """Create the scheduler for a bus and start its thread."""
+        self._busnum = busnum
+        self._drivers = []
+        self._deadlines = {}
+        self._counts = {}
+        self._rates = {}
+        self._windowStart = SchedulerModule.nowNs()
+        self._lock = threading.Lock()
+        self._threadActive = True                               # Set thread active flag
+        self._thread = threading.Thread(target=self._loop, name='I2C_BUS_{}'.format(busnum)) # Create thread
+        self._thread.daemon = True                              # Set thread as daemonic
+        self._thread.start()                                    # Start thread
+
+    def setDrivers(self, drivers):
+        """Set the drivers to schedule as list of (driver, muxName, muxedChannel)."""
+        drivers = sorted(drivers, key=lambda el: (el[1] or '', el[2] if el[2] != None else -1))
+        now = SchedulerModule.nowNs()
+        self._lock.acquire()
+        self._drivers = [(drv, drv.getName()) for drv, muxName, muxedChannel in drivers]
+        names = [name for drv, name in self._drivers]
+        self._deadlines = dict((name, self._deadlines.get(name, now)) for name in names) # New devices are due now
+        self._counts = dict((name, self._counts.get(name, 0)) for name in names)
+        self._rates = dict((name, self._rates[name]) for name in names if name in self._rates)
+        self._lock.release()
+
+    def getRates(self):
+        """Return the achieved and requested rate in Hz for each device."""
+        return dict(self._rates)
+
+    def stop(self):
+        """Stop the scheduler thread."""
+        self._threadActive = False
+
+    def _loop(self):
+        """Inner loop of the scheduler."""
+        while self._threadActive:
+            now = SchedulerModule.nowNs()
+            nextDeadline = now + int(SCHEDULER_IDLE * 1e9)
+            self._lock.acquire()
+            for drv, name in self._drivers:                     # Devices are ordered by mux channel
+                deadline = self._deadlines[name]
+                if deadline <= now:                             # Device is due
+                    SchedulerModule.loopJitter.add((SchedulerModule.nowNs() - deadline) / 1e9) # Lateness of the read
+                    drv.update()                                # Read/write the device
+                    self._counts[name] += 1
+                    period = max(int(drv.getPeriod() * 1e9), 1)
+                    deadline, dropped = SchedulerModule.nextDeadline(deadline, period, SchedulerModule.nowNs()) # Missed cycles per policy
+                    self._deadlines[name] = deadline
+                nextDeadline = min(nextDeadline, deadline)
+
+            duration = (now - self._windowStart) / 1e9
+            if duration >= RATE_WINDOW:                         # Update the achieved rates
+                for drv, name in self._drivers:
+                    self._rates[name] = {'achieved': self._counts[name] / duration, 'requested': 1. / drv.getPeriod()}
+                    self._counts[name] = 0
+                self._windowStart = now
+            self._lock.release()
+
+            delay = nextDeadline - SchedulerModule.nowNs()
+            if delay > 0:
+                time.sleep(delay / 1e9)                         # Sleep until the next device is due
+
+
 class I2C:
     """Implements I2C functionality."""
 
     # List of all connected drivers
     _connectedDrivers = []
 
+    # Connected drivers by device name
+    _drivers = {}
+
     # List of connected devices dictionary
     connectedDevices = []
 
+    # Bus schedulers by bus num (only used with I2C_SCHEDULING 'bus')
+    _schedulers = {}
+
 
     def __init__(self):
         """Initialize the device drivers and the MUX object associated with I2C."""
-        pass
+        self._schedulers = {}
 
     def detectMux(self):
         """Detect if a mux is active."""
@@ -81,7 +192,7 @@ class I2C:
                         drv = DRIVER(pinConfig)                 # Test the different drivers
                         if not drv.getDeviceConnected():        # Validate driver connected
                             continue                            # Try next driver until none is left
-                        drv.configureDevice()                   # Configure device
+                        drv.configureDevice(I2C_SCHEDULING != 'bus') # Configure device
                         connectedDrivers.append(drv)            # Add to connected driver list
                         connectedDevices.append({   'address': pinConfig["ADDRESS"], # Add to connected device list
                                                     'bus': pinConfig["BUSNUM"],
@@ -136,7 +247,7 @@ class I2C:
                                     drv = DRIVER(pinConfig, muxedChannel, muxName) # Test the different drivers
                                     if not drv.getDeviceConnected(): # Validate driver connected
                                         continue                # Try next driver until none is left
-                                    drv.configureDevice()       # Configure device
+                                    drv.configureDevice(I2C_SCHEDULING != 'bus') # Configure device
                                     connectedDrivers.append(drv) # Add to connected driver list
                                     connectedDevices.append({   'address': pinConfig["ADDRESS"], # Add to connected device list
                                                                 'bus': pinConfig["BUSNUM"],
@@ -160,36 +271,55 @@ class I2C:
         for drv in disconnectedDriver:                          # Clean up disconnected drivers
             drv.cleanup()
         self._connectedDrivers = connectedDrivers
+        self._drivers = dict((drv.getName(), drv) for drv in connectedDrivers) # Index the drivers by name
         self.connectedDevices = connectedDevices
+        if I2C_SCHEDULING == 'bus':
+            self._updateSchedulers()
+
+    def _updateSchedulers(self):
+        """Hand the connected drivers to the scheduler of their bus."""
+        buses = {}
+        for drv, device in zip(self._connectedDrivers, self.connectedDevices): # Drivers and devices are in the same order
+            buses.setdefault(device['bus'], []).append((drv, device.get('muxName'), device['mux'] if device['mux'] != -1 else None))
+        for bus in set(list(buses.keys()) + list(self._schedulers.keys())):
+            if bus not in self._schedulers:
+                self._schedulers[bus] = BusScheduler(bus)       # Create a scheduler for a new bus
+            self._schedulers[bus].setDrivers(buses.get(bus, []))
+
+    def getRates(self):
+        """Return the achieved and requested rate in Hz for each scheduled device."""
+        rates = {}
+        for scheduler in self._schedulers.values():
+            rates.update(scheduler.getRates())
+        return rates
 
     def getValues(self):
         """Get values of a device."""
+        rates = self.getRates()                                 # Achieved rates of the bus schedulers
         for device in self.connectedDevices:                    # Loop all connected devices
-            for drv in self._connectedDrivers:                  # Loop all connected drivers
-                if device['name'] == drv.getName():             # Match for drv and device
-                    values = drv.getValues()                    # Get last values from device and clear them
-                    cycleDuration = drv.getCycleDuration()      # Get cycle duration for driver
-                    if len(values) > 0:                         # Check if new data is available
-                        device['val'] = values[-1][1]           # Get most recent value
-                        device['vals'] = values                 # Get all new values
-                        device['cycle'] = cycleDuration         # Get cycle duration
+            if device['name'] in rates:
+                device['rate'] = rates[device['name']]          # Get achieved and requested rate
+            drv = self._drivers.get(device['name'])             # Driver of the device
+            if drv is None:
+                continue
+            values = drv.getValues()                            # Get last values from device and clear them
+            cycleDuration = drv.getCycleDuration()              # Get cycle duration for driver
+            device['vals'] = values                             # Get all new values (none if nothing new, not sent again)
+            if len(values) > 0:                                 # Check if new data is available
+                device['val'] = values[-1][1]                   # Get most recent value
+                device['cycle'] = cycleDuration                 # Get cycle duration
 
 
     def setValue(self, name, dim, value):
         """Set value for dim of a device."""
-        for drv in self._connectedDrivers:                      # Check for driver
-            if (drv.getName() == name):                         # If driver exists, set the value
-                drv.setValue(dim, value)
-                break
+        drv = self._drivers.get(name)                           # Check for driver
+        if drv is not None:                                     # If driver exists, set the value
+            drv.setValue(dim, value)
 
     def settings(self, settingsMessage):
         """Change settings of a device."""
-        drv = None
-        for el in self._connectedDrivers:                       # Check for driver
-            if (el.getName() == settingsMessage['name']):
-                drv = el
-                break
-        else:
+        drv = self._drivers.get(settingsMessage['name'])        # Check for driver
+        if drv is None:
             return
 
         if ('mode' in settingsMessage):                         # Check for mode settings
@@ -215,3 +345,11 @@ class I2C:
                 drv.setDutyFrequency(settingsMessage['dutyFrequency'])
             except ValueError:
                 raise ValueError                                # Pass on the value error
+
+        for device in self.connectedDevices:                    # Keep the device dictionary up to date
+            if device['name'] == settingsMessage['name']:
+                device['mode'] = drv.getMode()
+                device['frequency'] = drv.getFrequency()
+                device['dutyFrequency'] = drv.getDutyFrequency()
+                device['flags'] = drv.getFlags()
+                device['settings'] = drv.getSettings()
@@ -13,17 +13,20 @@ import time                                                     # Required for c
 import threading                                                # Threading class for the threads
 import Config                                                   # SoftWEAR Config
 import CommunicationModule                                      # SoftWEAR Communication module
+import ProtocolModule                                           # SoftWEAR Protocol module
 import MuxModule                                                # SoftWEAR MUX module
 import InputModule                                              # SoftWEAR Input module
 import OutputModule                                             # SoftWEAR Output module
 import PWMModule                                                # SoftWEAR PWM module
 import ADCModule                                                # SoftWEAR ADC module
 import I2CModule                                                # SoftWEAR I2C module
+import RegistryModule                                           # SoftWEAR Registry module
+import SchedulerModule                                          # SoftWEAR Scheduler module
 import json                                                     # Serializing class. All objects sent are serialized
 from termcolor import colored                                   # Color printing in the console
 import cProfile                                                 # Used to profile the script
 
-import Adafruit_BBIO.GPIO as GPIO                               # Main peripheral class. Implements GPIO communication
+from HardwareModule import GPIO                                 # Main peripheral class. Implements GPIO communication
 
 BOARD = "Beaglebone Green Wireless v1.0"                        # Name of the Board
 SOFTWARE = "Firmware-BeagleboneGreenWireless(v0.1)"             # Identifier of the Software
@@ -35,10 +38,12 @@ EVENT_LOG = False                                               # Flag whether e
 
 PRINT_PERIODE = 0.2                                             # Print periode to display values of devices in terminal
 UPDATE_PERIODE = 0.01                                           # Update periode to refresh values
+UPDATE_TIMEOUT = 0.1                                            # Longest wait for new samples or messages
 SCAN_PERIODE = 2                                                # Scan periode to refresh values
 
 scanForDevices = True                                           # Scanning enabled as default
 scanPin = Config.PIN_MAP['SCAN']                                # Scan pin
+scanEvent = threading.Event()                                   # Set by edges of the scan pin and Scan messages
 exit = False                                                    # Exit flag to terminate all threads
 c = None                                                        # Connection object
 
@@ -60,8 +65,10 @@ output = OutputModule.Output()                                  # Initialize the
 pwm = PWMModule.PWM()                                           # Initialize the SoftWEAR PWM Module
 adc = ADCModule.ADC()                                           # Initialize the SoftWEAR ADC Module
 i2c = I2CModule.I2C()                                           # Initialize the SoftWEAR I2C Module
+registry = RegistryModule.Registry()                            # Initialize the SoftWEAR device registry
 
 GPIO.setup(scanPin, GPIO.IN, GPIO.PUD_UP)                       # Setup scan pin
+GPIO.add_event_detect(scanPin, GPIO.BOTH, callback=lambda pin: scanEvent.set(), bouncetime=Config.GPIO_DEBOUNCE) # Wake the scan thread on edges
 
 def muxScan():
     """Scan for new mux devices."""
@@ -70,25 +77,10 @@ def muxScan():
 
 def inputScan():
     """Scan for new input devices."""
-    global inputList, input
+    global inputList
     input.scan()                                                # Scan devices on the input pins
-    inputListPrevious = inputList                               # Keep copy of last input devices
-    inputList = []                                              # Reset list of connected Input list
-    inputListRegister = []                                      # List of new devices that need to be registered
-    inputListDeregister = []                                    # List of new devices that need to be deregistered
-
-    for el1 in input.connectedDevices:                          # Check for connected and new devices
-        if (len(filter(lambda el2: el2['name'] == el1['name'], inputListPrevious)) > 0):
-            inputList.append(el1)                               # Add to connected list
-        else:                                                   # Device is not yet registered
-            inputListRegister.append(el1)                       # Add to register list
-            inputList.append(el1)                               # Add connected list
-
-    for el1 in inputListPrevious:                               # Check for disconnected devices
-        if (len(filter(lambda el2: el2['name'] == el1['name'], inputList)) == 0):
-            inputListDeregister.append(el1)                     # Add to deregister list
-
-    return inputListRegister, inputListDeregister
+    inputList = input.connectedDevices                          # Update list of connected devices
+    return registry.update(input, inputList)                    # Get the devices to register and deregister
 
 def inputUpdate():
     """Update the input devices."""
@@ -96,25 +88,10 @@ def inputUpdate():
 
 def outputScan():
     """Scan for new output devices."""
-    global outputList, output
+    global outputList
     output.scan()                                               # Scan devices on the output pins
-    outputListPrevious = outputList                             # Keep copy of last output devices
-    outputList = []                                             # Reset list of connected Output list
-    outputListRegister = []                                     # List of new devices that need to be registered
-    outputListDeregister = []                                   # List of new devices that need to be deregistered
-
-    for el1 in output.connectedDevices:                         # Check for connected and new devices
-        if (len(filter(lambda el2: el2['name'] == el1['name'], outputListPrevious)) > 0):
-            outputList.append(el1)                              # Add to connected list
-        else:                                                   # Device is not yet registered
-            outputListRegister.append(el1)                      # Add to register list
-            outputList.append(el1)                              # Add connected list
-
-    for el1 in outputListPrevious:                              # Check for disconnected devices
-        if (len(filter(lambda el2: el2['name'] == el1['name'], outputList)) == 0):
-            outputListDeregister.append(el1)                    # Add to deregister list
-
-    return outputListRegister, outputListDeregister
+    outputList = output.connectedDevices                        # Update list of connected devices
+    return registry.update(output, outputList)                  # Get the devices to register and deregister
 
 def outputUpdate():
     """Update the output devices."""
@@ -122,25 +99,10 @@ def outputUpdate():
 
 def pwmScan():
     """Scan for new pwm devices."""
-    global pwmList, pwm
+    global pwmList
     pwm.scan()                                                  # Scan devices on the pwm pins
-    pwmListPrevious = pwmList                                   # Keep copy of last pwm devices
-    pwmList = []                                                # Reset list of connected PWM list
-    pwmListRegister = []                                        # List of new devices that need to be registered
-    pwmListDeregister = []                                      # List of new devices that need to be deregistered
-
-    for el1 in pwm.connectedDevices:                            # Check for connected and new devices
-        if (len(filter(lambda el2: el2['name'] == el1['name'], pwmListPrevious)) > 0):
-            pwmList.append(el1)                                 # Add to connected list
-        else:                                                   # Device is not yet registered
-            pwmListRegister.append(el1)                         # Add to register list
-            pwmList.append(el1)                                 # Add connected list
-
-    for el1 in pwmListPrevious:                                 # Check for disconnected devices
-        if (len(filter(lambda el2: el2['name'] == el1['name'], pwmList)) == 0):
-            pwmListDeregister.append(el1)                       # Add to deregister list
-
-    return pwmListRegister, pwmListDeregister
+    pwmList = pwm.connectedDevices                              # Update list of connected devices
+    return registry.update(pwm, pwmList)                        # Get the devices to register and deregister
 
 def pwmUpdate():
     """Update the pwm devices."""
@@ -148,25 +110,10 @@ def pwmUpdate():
 
 def adcScan():
     """Scan for new adc devices."""
-    global adcList, adc
+    global adcList
     adc.scan()                                                  # Scan devices on the analog pins
-    adcListPrevious = adcList                                   # Keep copy of last adc devices
-    adcList = []                                                # Reset list of connected ADC list
-    adcListRegister = []                                        # List of new devices that need to be registered
-    adcListDeregister = []                                      # List of new devices that need to be deregistered
-
-    for el1 in adc.connectedDevices:                            # Check for connected and new devices
-        if (len(filter(lambda el2: el2['name'] == el1['name'], adcListPrevious)) > 0):
-            adcList.append(el1)                                 # Add to connected list
-        else:                                                   # Device is not yet registered
-            adcListRegister.append(el1)                         # Add to register list
-            adcList.append(el1)                                 # Add connected list
-
-    for el1 in adcListPrevious:                                 # Check for disconnected devices
-        if (len(filter(lambda el2: el2['name'] == el1['name'], adcList)) == 0):
-            adcListDeregister.append(el1)                       # Add to deregister list
-
-    return adcListRegister, adcListDeregister
+    adcList = adc.connectedDevices                              # Update list of connected devices
+    return registry.update(adc, adcList)                        # Get the devices to register and deregister
 
 
 def adcUpdate():
@@ -176,25 +123,10 @@ def adcUpdate():
 
 def i2cScan():
     """Update the status of all I2C devices and saves any connect or disconnect events."""
-    global i2cList, i2c
+    global i2cList
     i2c.scan()                                                  # Scan devices on the I2C channels
-    i2cListPrevious = i2cList                                   # Keep copy of last i2c devices
-    i2cList = []                                                # Reset list of connected I2C list
-    i2cListRegister = []                                        # List of new devices that need to be registered
-    i2cListDeregister = []                                      # List of new devices that need to be deregistered
-
-    for el1 in i2c.connectedDevices:                            # Check for connected and new devices
-        if (len(filter(lambda el2: el2['name'] == el1['name'], i2cListPrevious)) > 0):
-            i2cList.append(el1)                                 # Add to connected list
-        else:                                                   # Device is not yet registered
-            i2cListRegister.append(el1)                         # Add to register list
-            i2cList.append(el1)                                 # Add connected list
-
-    for el1 in i2cListPrevious:                                 # Check for disconnected devices
-        if (len(filter(lambda el2: el2['name'] == el1['name'], i2cList)) == 0):
-            i2cListDeregister.append(el1)                       # Add to deregister list
-
-    return i2cListRegister, i2cListDeregister
+    i2cList = i2c.connectedDevices                              # Update list of connected devices
+    return registry.update(i2c, i2cList)                        # Get the devices to register and deregister
 
 def i2cUpdate():
     """Update the I2C devices."""
@@ -204,9 +136,10 @@ def scanThread():
     """Thread dedicated to scan for new devices."""
     global c, scanForDevices, scanDuration
     while True:                                                 # Enter the infinite loop
+        scanEvent.clear()                                       # Changes from now on wake the next wait
         if not scanForDevices or not GPIO.input(scanPin):       # Check for scanning
             scanDuration = 0                                    # No scanning
-            time.sleep(SCAN_PERIODE)
+            scanEvent.wait()                                    # Sleep until the scan pin or the scan setting changes
             continue
         startTime = time.time()                                 # Save start time of update cycle
 
@@ -220,100 +153,21 @@ def scanThread():
         i2cListRegister, i2cListDeregister = i2cScan()          # Get the I2C devices and events
 
 
-        for device in inputListDeregister:                      # Create input device deregister message
-            messagesSend.append(json.dumps({'type': 'Deregister',
-                                            'name': device['name']}))
-
-
-
-        for device in inputListRegister:                        # Create input device register message
-            messagesSend.append(json.dumps({'type': 'Register',
-                                            'name': device['name'],
-                                            'dir': device['dir'],
-                                            'dim': device['dim'],
-                                            'about': device['about'],
-                                            'settings': device['settings'],
-                                            'mode': device['mode'],
-                                            'flags': device['flags'],
-                                            'frequency': device['frequency'],
-                                            'dutyFrequency': device['dutyFrequency']}))
-
-        for device in outputListDeregister:                     # Create output device deregister message
-            messagesSend.append(json.dumps({'type': 'Deregister',
-                                            'name': device['name']}))
-
-
-
-        for device in outputListRegister:                       # Create output device register message
-            messagesSend.append(json.dumps({'type': 'Register',
-                                            'name': device['name'],
-                                            'dir': device['dir'],
-                                            'dim': device['dim'],
-                                            'about': device['about'],
-                                            'settings': device['settings'],
-                                            'mode': device['mode'],
-                                            'flags': device['flags'],
-                                            'frequency': device['frequency'],
-                                            'dutyFrequency': device['dutyFrequency']}))
-
-        for device in pwmListDeregister:                        # Create pwm device deregister message
-            messagesSend.append(json.dumps({'type': 'Deregister',
-                                            'name': device['name']}))
-
-
-
-        for device in pwmListRegister:                          # Create pwm device register message
-            messagesSend.append(json.dumps({'type': 'Register',
-                                            'name': device['name'],
-                                            'dir': device['dir'],
-                                            'dim': device['dim'],
-                                            'about': device['about'],
-                                            'settings': device['settings'],
-                                            'mode': device['mode'],
-                                            'flags': device['flags'],
-                                            'frequency': device['frequency'],
-                                            'dutyFrequency': device['dutyFrequency']}))
-
-        for device in adcListDeregister:                        # Create ADC device deregister message
-            messagesSend.append(json.dumps({'type': 'Deregister',
-                                            'name': device['name']}))
-
-
-
-        for device in adcListRegister:                          # Create ADC device register message
-            messagesSend.append(json.dumps({'type': 'Register',
-                                            'name': device['name'],
-                                            'dir': device['dir'],
-                                            'dim': device['dim'],
-                                            'about': device['about'],
-                                            'settings': device['settings'],
-                                            'mode': device['mode'],
-                                            'flags': device['flags'],
-                                            'frequency': device['frequency'],
-                                            'dutyFrequency': device['dutyFrequency']}))
-
-        for device in i2cListDeregister:                        # Create I2C device deregister message
-            messagesSend.append(json.dumps({'type': 'Deregister',
-                                            'name': device['name']}))
-
-
-
-        for device in i2cListRegister:                          # Create I2C device register message
-            messagesSend.append(json.dumps({'type': 'Register',
-                                            'name': device['name'],
-                                            'dir': device['dir'],
-                                            'dim': device['dim'],
-                                            'about': device['about'],
-                                            'settings': device['settings'],
-                                            'mode': device['mode'],
-                                            'flags': device['flags'],
-                                            'frequency': device['frequency'],
-                                            'dutyFrequency': device['dutyFrequency']}))
+        for deviceListRegister, deviceListDeregister in [(inputListRegister, inputListDeregister),
+                                                         (outputListRegister, outputListDeregister),
+                                                         (pwmListRegister, pwmListDeregister),
+                                                         (adcListRegister, adcListDeregister),
+                                                         (i2cListRegister, i2cListDeregister)]:
+            for device in deviceListDeregister:                 # Create device deregister message
+                messagesSend.append(json.dumps({'type': 'Deregister',
+                                                'name': device['name']}))
+            for device in deviceListRegister:                   # Create device register message (encoded by the registry)
+                messagesSend.append(registry.getRegisterMessage(device['name']))
 
         if c.getState() == 'Connected':
             c.sendMessages(messagesSend[:])                     # Send the messages
         if embeddedC != None and embeddedC.getState() == 'Connected':
-            embeddedC._inMessages = embeddedC._inMessages + messagesSend[:] # Send the messages
+            embeddedC.putMessages(messagesSend)                 # Send the messages
         if EVENT_LOG:                                           # Check for event log
             eventLog(messagesSend)                              # Call event log function
 
@@ -321,7 +175,7 @@ def scanThread():
         scanDuration = endTime - startTime                      # Calculate time used to scan for devices
 
         if (scanDuration < SCAN_PERIODE):
-            time.sleep(SCAN_PERIODE - scanDuration)             # Sleep until next scan period
+            scanEvent.wait(SCAN_PERIODE - scanDuration)         # Sleep until next scan period or a change of the scan pin
 
         if exit:                                                # Exit
             break;
@@ -330,15 +184,17 @@ def scanThread():
 def updateThread():
     """Thread dedicated to get updated values of the devices."""
     global c, scanForDevices, updateDuration, UPDATE_PERIODE
+    ticker = SchedulerModule.Ticker(UPDATE_PERIODE)             # Deadlines of the update cycles
     while True:                                                 # Enter the infinite loop
+        SchedulerModule.newData.wait(UPDATE_TIMEOUT)            # Block until new samples or messages are available
+        SchedulerModule.newData.clear()                         # Data arriving from now on wakes the next cycle
         startTime = time.time()                                 # Save start time of update cycle
         messagesSend = []                                       # List of messages to send
         messagesRecv = []                                       # Get new messages
         if c.getState() == 'Connected':
             messagesRecv = messagesRecv + c.getMessages()       # Send the messages
         if embeddedC != None and embeddedC.getState() == 'Connected':
-            messagesRecv = messagesRecv + embeddedC._outMessages # Send the messages
-            embeddedC._outMessages = []                         # Clear out messages
+            messagesRecv = messagesRecv + embeddedC.takeMessages() # Take the messages of the loop
 
 
         inputUpdate()                                           # Update input devices
@@ -349,106 +205,45 @@ def updateThread():
 
         for messageString in messagesRecv:
             message = json.loads(messageString)                 # Parse message from string to JSON
-            if message['type'] == 'DeviceList':                 # Create device register message for all devices
-                for device in inputList:
-                    messagesSend.append(json.dumps({'type': 'Register',
-                                                    'name': device['name'],
-                                                    'dir': device['dir'],
-                                                    'dim': device['dim'],
-                                                    'about': device['about'],
-                                                    'settings': device['settings'],
-                                                    'mode': device['mode'],
-                                                    'flags': device['flags'],
-                                                    'frequency': device['frequency'],
-                                                    'dutyFrequency': device['dutyFrequency']}))
-                for device in outputList:
-                    messagesSend.append(json.dumps({'type': 'Register',
-                                                    'name': device['name'],
-                                                    'dir': device['dir'],
-                                                    'dim': device['dim'],
-                                                    'about': device['about'],
-                                                    'settings': device['settings'],
-                                                    'mode': device['mode'],
-                                                    'flags': device['flags'],
-                                                    'frequency': device['frequency'],
-                                                    'dutyFrequency': device['dutyFrequency']}))
-                for device in pwmList:
-                    messagesSend.append(json.dumps({'type': 'Register',
-                                                    'name': device['name'],
-                                                    'dir': device['dir'],
-                                                    'dim': device['dim'],
-                                                    'about': device['about'],
-                                                    'settings': device['settings'],
-                                                    'mode': device['mode'],
-                                                    'flags': device['flags'],
-                                                    'frequency': device['frequency'],
-                                                    'dutyFrequency': device['dutyFrequency']}))
-                for device in adcList:
-                    messagesSend.append(json.dumps({'type': 'Register',
-                                                    'name': device['name'],
-                                                    'dir': device['dir'],
-                                                    'dim': device['dim'],
-                                                    'about': device['about'],
-                                                    'settings': device['settings'],
-                                                    'mode': device['mode'],
-                                                    'flags': device['flags'],
-                                                    'frequency': device['frequency'],
-                                                    'dutyFrequency': device['dutyFrequency']}))
-                for device in i2cList:
-                    messagesSend.append(json.dumps({'type': 'Register',
-                                                    'name': device['name'],
-                                                    'dir': device['dir'],
-                                                    'dim': device['dim'],
-                                                    'about': device['about'],
-                                                    'settings': device['settings'],
-                                                    'mode': device['mode'],
-                                                    'flags': device['flags'],
-                                                    'frequency': device['frequency'],
-                                                    'dutyFrequency': device['dutyFrequency']}))
+            if message['type'] == 'DeviceList':                 # Send the cached register messages of all devices
+                messagesSend.extend(registry.getRegisterMessages())
             if message['type'] == 'Set':                        # Get set message for a device and check for devices
-                output.setValue(message['name'], message['dim'], message['value'])
-                pwm.setValue(message['name'], message['dim'], message['value'])
-                i2c.setValue(message['name'], message['dim'], message['value'])
+                module = registry.getModule(message['name'])    # Module of the device
+                if module is not None and hasattr(module, 'setValue'):
+                    module.setValue(message['name'], message['dim'], message['value'])
 
             if message['type'] == 'Settings':                   # Change settings for a device
-                input.settings(message)
-                output.settings(message)
-                pwm.settings(message)
-                adc.settings(message)
-                i2c.settings(message)
+                module = registry.getModule(message['name'])    # Module of the device
+                if module is not None:
+                    module.settings(message)
+                    registry.invalidate(message['name'])        # Re-encode the register message with the new settings
 
             if message['type'] == 'Scan':                       # Change scan for a device
                 scanForDevices = message['value']
+                scanEvent.set()                                 # Wake the scan thread
 
             if message['type'] == 'Ping':                       # Ping back
                 messagesSend.append(json.dumps({'type': 'Ping','name':''}))
 
         dataMessage = {'type': 'D', 'data': []}                 # Create data message
-        for device in inputList:                                # Create input device data message
-            dataMessage['data'].append({'name': device['name'], 'values': device['vals'], 'cycle': device['cycle']})
-        for device in outputList:                               # Create output device data message
-            dataMessage['data'].append({'name': device['name'], 'values': device['vals'], 'cycle': device['cycle']})
-        for device in pwmList:                                  # Create pwm device data message
-            dataMessage['data'].append({'name': device['name'], 'values': device['vals'], 'cycle': device['cycle']})
-        for device in adcList:                                  # Create adc device data message
-            dataMessage['data'].append({'name': device['name'], 'values': device['vals'], 'cycle': device['cycle']})
-        for device in i2cList:                                  # Create i2c device data message
-            dataMessage['data'].append({'name': device['name'], 'values': device['vals'], 'cycle': device['cycle']})
+        for device in inputList + outputList + pwmList + adcList + i2cList: # Create device data message
+            if len(device['vals']) > 0:                         # Only devices with new values
+                dataMessage['data'].append({'name': device['name'], 'values': device['vals'], 'cycle': device['cycle']})
 
         if len(dataMessage['data']) > 0:
-            messagesSend.append(json.dumps(dataMessage))        # Send data message
+            messagesSend.append(dataMessage)                    # Send data message (serialized by the connection protocol)
 
         if c.getState() == 'Connected':
             c.sendMessages(messagesSend[:])                     # Send the messages
         if embeddedC != None and embeddedC.getState() == 'Connected':
-            embeddedC._inMessages = embeddedC._inMessages + messagesSend[:] # Send the messages
+            embeddedC.putMessages(messagesSend)                 # Send the messages (serialized when taken by the loop)
         if DATA_LOG:                                            # Check for data log
             dataLog(messagesSend)                               # Call data log function
         endTime = time.time()                                   # Save end time of update cycle
         updateDuration = endTime - startTime                    # Calculate time used to update values
 
-        if (updateDuration < UPDATE_PERIODE):
-            time.sleep(UPDATE_PERIODE - updateDuration)         # Sleep until next update period
+        ticker.setPeriod(UPDATE_PERIODE)                        # Follow period changes
+        ticker.wait()                                           # At most one cycle per period, samples in between are batched
 
         if exit:                                                # Exit
             break;
@@ -465,6 +260,7 @@ def livePrint():
     stringToPrint += colored("****************************************************************\n", 'green')
     stringToPrint += "\n"
     stringToPrint += "Connection:  {}".format(colored(connectionState, attrs=['bold', 'dark'])) # Print connection status
+    stringToPrint += " ({} clients)".format(c.getClients())     # Print number of connected clients
     stringToPrint += "\n"
     stringToPrint += "Update cycle:  "                          # Print update cycle time
     stringToPrint += colored("{:.2f} ms / {:.2f} ms\n".format(updateDuration * 1000, UPDATE_PERIODE * 1000), 'grey') # Print update cycle time
@@ -473,6 +269,15 @@ def livePrint():
         stringToPrint += colored("{:.2f} ms / {:.2f} ms\n".format(scanDuration * 1000, SCAN_PERIODE * 1000), 'grey') # Print scan cycle time
     else:
         stringToPrint += "Scan   cycle: -\n"                    # Print scan disabled
+    muxStats = mux.getSwitchStats()                             # Get mux channel switch counters
+    stringToPrint += "Mux switches:  "                          # Print performed and elided mux switches
+    stringToPrint += colored("{} / {} elided\n".format(muxStats['switches'], muxStats['elided']), 'grey') # Print mux switches
+    jitter = SchedulerModule.loopJitter.percentiles()           # Get jitter percentiles of the device loops
+    stringToPrint += "Loop jitter:   "                          # Print lateness of the device loops
+    stringToPrint += colored("p50 {:.2f} ms / p90 {:.2f} ms / p99 {:.2f} ms\n".format(jitter['p50'] * 1000, jitter['p90'] * 1000, jitter['p99'] * 1000), 'grey') # Print jitter
+    dropped = c.getDropped()                                    # Get the data dropped by the full send queue
+    stringToPrint += "Send dropped:  "                          # Print dropped messages and samples
+    stringToPrint += colored("{} messages / {} samples\n".format(dropped['messages'], dropped['samples']), 'grey') # Print dropped data
 
     # Print Input informations:
     stringToPrint += "\nConnected Inputs: {}\n".format(colored(len(inputList), attrs=['bold', 'dark']))
@@ -508,7 +313,10 @@ def livePrint():
     stringToPrint += "\nConnected I2Cs: {}\n".format(colored(len(i2cList), attrs=['bold', 'dark']))
     for el in i2cList:                                        # Go through all connected I2C devices
         if ('bus' in el and 'name' in el and 'about' in el and 'val' in el and 'cycle' in el):
-            stringToPrint += '(BUS {}) {}: {} / {} | {:.2f} ms\n'.format(str(el['bus']), el['name'], colored(str(el['about']['dimMap']), 'blue'), colored(str(el['val']), 'blue'), el['cycle'] * 1000.)
+            stringToPrint += '(BUS {}) {}: {} / {} | {:.2f} ms'.format(str(el['bus']), el['name'], colored(str(el['about']['dimMap']), 'blue'), colored(str(el['val']), 'blue'), el['cycle'] * 1000.)
+            if 'rate' in el:                                    # Achieved vs requested rate of the bus scheduler
+                stringToPrint += ' | {:.1f} / {:.1f} Hz'.format(el['rate']['achieved'], el['rate']['requested'])
+            stringToPrint += '\n'
 
     stringToPrint += "\n\nManually break to exit!\n"            # Print exit condition
     stringToPrint += ">> Ctrl-C\n"                              # Print exit shortcut
@@ -520,6 +328,12 @@ def diagLog():
     with open("../Logs/diag.log", "a") as f:                    # Open diag file
         f.write("System,Scan,{}\n".format(scanDuration))        # Log scan duration
         f.write("System,Update,{}\n".format(updateDuration))    # Log update duration
+        jitter = SchedulerModule.loopJitter.percentiles()       # Get jitter percentiles of the device loops
+        f.write("System,Jitter,{},{},{}\n".format(jitter['p50'], jitter['p90'], jitter['p99'])) # Log jitter percentiles
+        muxStats = mux.getSwitchStats()                         # Get mux channel switch counters
+        f.write("System,MuxSwitches,{},{}\n".format(muxStats['switches'], muxStats['elided'])) # Log performed and elided mux switches
+        dropped = c.getDropped()                                # Get the data dropped by the full send queue
+        f.write("System,Dropped,{},{}\n".format(dropped['messages'], dropped['samples'])) # Log dropped messages and samples
         for el in inputList:                                    # Loop input device
             if ('name' in el and 'cycle' in el):                # Check for values
                 f.write("Device,{},{}\n".format(el['name'], el['cycle'] * 1000.)) # Log device loop duration
@@ -535,6 +349,8 @@ def diagLog():
         for el in i2cList:                                      # Loop i2c device
             if ('name' in el and 'cycle' in el):                # Check for values
                 f.write("Device,{},{}\n".format(el['name'], el['cycle'] * 1000.)) # Log device loop duration
+            if ('name' in el and 'rate' in el):                 # Check for scheduler rates
+                f.write("Rate,{},{},{}\n".format(el['name'], el['rate']['achieved'], el['rate']['requested'])) # Log achieved and requested rate
 
 
 
@@ -543,14 +359,14 @@ def dataLog(messages):
     """Log data streamed by the firmware."""
     with open("../Logs/data.log", "a") as f:                    # Open log file
         for message in messages:                                # Loop all messages
-            f.write(message)                                    # Write message
+            f.write(ProtocolModule.toJSON(message))             # Write message
             f.write('\n')                                       # Next line
 
 def eventLog(messages):
     """Log events streamed by the firmware."""
     with open("../Logs/event.log", "a") as f:                   # Open log file
         for message in messages:                                # Loop all messages
-            f.write(message)                                    # Write message
+            f.write(ProtocolModule.toJSON(message))             # Write message
             f.write('\n')                                       # Next line
 
 def main():
@@ -597,11 +413,11 @@ def main():
         if c.getState() is 'Connected':
         #     sendMessages = [json.dumps({'type': 'Ping','name':''})]
         #     c.sendMessages(sendMessages)
-            messagesSend = [json.dumps({'type': 'CycleDuration','name':'', 'values': {'update': updateDuration, 'scan': scanDuration}})]
+            messagesSend = [json.dumps({'type': 'CycleDuration','name':'', 'values': {'update': updateDuration, 'scan': scanDuration, 'jitter': SchedulerModule.loopJitter.percentiles(), 'dropped': c.getDropped()}})]
             c.sendMessages(messagesSend)                        # Send the messages
         if embeddedC != None and embeddedC.getState() == 'Connected':
-            messagesSend = [json.dumps({'type': 'CycleDuration','name':'', 'values': {'update': updateDuration, 'scan': scanDuration}})]
-            embeddedC._inMessages = embeddedC._inMessages + messagesSend[:] # Send the messages
+            messagesSend = [json.dumps({'type': 'CycleDuration','name':'', 'values': {'update': updateDuration, 'scan': scanDuration, 'jitter': SchedulerModule.loopJitter.percentiles(), 'dropped': embeddedC.getDropped()}})]
+            embeddedC.putMessages(messagesSend)                 # Send the messages
 
         if LIVE_PRINT:                                          # Check for live plotting
             livePrint()                                         # Call print function
@@ -613,10 +429,11 @@ def main():
     exit = True
     c.stopAndFreeResources()
 
-# Just call the main function.
-if ('p' in sys.argv):                                           # Check profile parameter
-    with open("../Logs/stats.log", "w"):                        # Clear log file
-        pass                                                    # Write message
-    cProfile.run('main()', '../Logs/stats.log')
-else:
-    main()
+# Just call the main function (not when imported, e.g. by the benchmark).
+if __name__ == '__main__':
+    if ('p' in sys.argv):                                       # Check profile parameter
+        with open("../Logs/stats.log", "w"):                    # Clear log file
+            pass                                                # Write message
+        cProfile.run('main()', '../Logs/stats.log')
+    else:
+        main()
@@ -9,7 +9,7 @@ SoftWEAR Multiplexer module.
     channels. Hardware detection feature provided.
 """
 
-import Adafruit_BBIO.GPIO as GPIO                               # Main peripheral class. Implements GPIO communication
+from HardwareModule import GPIO                                 # Main peripheral class. Implements GPIO communication
 
 from Config import PIN_MAP                                      # SoftWEAR Config module.
 
@@ -42,6 +42,9 @@ class Mux:
     # List of connected muxes dictionary. Contains: {}
     connectedMuxes = []
 
+    # Connected drivers by name
+    _drivers = {}
+
     def __init__(self):
         """
         Class constructor.
@@ -93,47 +96,50 @@ class Mux:
             drv.cleanup()
         self._connectedDrivers = connectedDrivers
         self.connectedMuxes = connectedMuxes
+        self._drivers = dict((drv.getName(), drv) for drv in connectedDrivers) # Resolve names without scanning
 
     def activate(self, name, muxedPin):
         """Activate a MUX pin (0-#). Any future operations will happen on this selected channel."""
-        for device in self.connectedMuxes:                      # Loop all connected muxes
-            for drv in self._connectedDrivers:                  # Loop all connected drivers
-                if name == drv.getName():                       # Match for drv and device
-                    drv.activate(muxedPin)                      # Activate the pin on the mux
-                    return
+        drv = self._drivers.get(name)                           # Find the driver by name
+        if drv != None:
+            drv.activate(muxedPin)                              # Activate the pin on the mux
 
     def deactivate(self, name):
         """Deactivate the previously activated MUX pin."""
-        for device in self.connectedMuxes:                      # Loop all connected muxes
-            for drv in self._connectedDrivers:                  # Loop all connected drivers
-                if name == drv.getName():                       # Match for drv and device
-                    drv.deactivate()                            # Deactivate any pin on the mux
-                    return
+        drv = self._drivers.get(name)                           # Find the driver by name
+        if drv != None:
+            drv.deactivate()                                    # Deactivate any pin on the mux
 
     def listFor(self, deviceType):
         """Return a list of connected muxes with device type (Input, ADC, I2C)."""
         muxes = []
         for device in self.connectedMuxes:                      # Loop all connected muxes
-            for drv in self._connectedDrivers:                  # Loop all connected drivers
-                if device['name'] == drv.getName():             # Match for drv and device
-                    if (deviceType in drv.getAbout()['types']): # Check for the device type
-                        muxes.append(drv.getName())             # Collect driver
+            drv = self._drivers.get(device['name'])             # Match for drv and device
+            if drv != None and deviceType in drv.getAbout()['types']: # Check for the device type
+                muxes.append(drv.getName())                     # Collect driver
         return muxes
 
 
     def detect(self, name):
         """Return True if the detect pin is High, False otherwise."""
-        for device in self.connectedMuxes:                      # Loop all connected muxes
-            for drv in self._connectedDrivers:                  # Loop all connected drivers
-                if name == drv.getName():                       # Match for drv and device
-                    return drv.getMuxConnected()                # Detect a mux
+        drv = self._drivers.get(name)                           # Find the driver by name
+        if drv != None:
+            return drv.getMuxConnected()                        # Detect a mux
 
     def about(self, name):
         """Return information about the mux."""
-        for device in self.connectedMuxes:                      # Loop all connected muxes
-            for drv in self._connectedDrivers:                  # Loop all connected drivers
-                if name == drv.getName():                       # Match for drv and device
-                    return drv.getAbout()                       # Get information about mux
+        drv = self._drivers.get(name)                           # Find the driver by name
+        if drv != None:
+            return drv.getAbout()                               # Get information about mux
+
+    def getSwitchStats(self):
+        """Return the number of performed and elided channel switches of all muxes."""
+        stats = {'switches': 0, 'elided': 0}
+        for drv in self._connectedDrivers:                      # Loop all connected drivers
+            driverStats = drv.getSwitchStats()
+            stats['switches'] += driverStats['switches']
+            stats['elided'] += driverStats['elided']
+        return stats
 
 # Single mux
 MUX = Mux()
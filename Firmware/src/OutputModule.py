@@ -26,6 +26,9 @@ class Output:
     # List of all connected drivers
     _connectedDrivers = []
 
+    # Connected drivers by device name
+    _drivers = {}
+
     # List of connected devices dictionary.
     connectedDevices = []
 
@@ -98,37 +101,34 @@ class Output:
         for drv in disconnectedDriver:                          # Clean up disconnected drivers
             drv.cleanup()
         self._connectedDrivers = connectedDrivers
+        self._drivers = dict((drv.getName(), drv) for drv in connectedDrivers) # Index the drivers by name
         self.connectedDevices = connectedDevices
 
 
     def getValues(self):
         """Get values of a device."""
         for device in self.connectedDevices:                    # Loop all connected devices
-            for drv in self._connectedDrivers:                  # Loop all connected drivers
-                if device['name'] == drv.getName():             # Match for drv and device
-                    values = drv.getValues()                    # Get last values from device and clear them
-                    cycleDuration = drv.getCycleDuration()      # Get cycle duration for driver
-                    if len(values) > 0:                         # Check if new data is available
-                        device['val'] = values[-1][1]           # Get most recent value
-                        device['vals'] = values                 # Get all new values
-                        device['cycle'] = cycleDuration         # Get cycle duration
+            drv = self._drivers.get(device['name'])             # Driver of the device
+            if drv is None:
+                continue
+            values = drv.getValues()                            # Get last values from device and clear them
+            cycleDuration = drv.getCycleDuration()              # Get cycle duration for driver
+            device['vals'] = values                             # Get all new values (none if nothing new, not sent again)
+            if len(values) > 0:                                 # Check if new data is available
+                device['val'] = values[-1][1]                   # Get most recent value
+                device['cycle'] = cycleDuration                 # Get cycle duration
 
 
     def setValue(self, name, dim, value):
         """Set value for dim of a device."""
-        for drv in self._connectedDrivers:                      # Check for driver
-            if (drv.getName() == name):                         # If driver exists, set the value
-                drv.setValue(dim, value)
-                break
+        drv = self._drivers.get(name)                           # Check for driver
+        if drv is not None:                                     # If driver exists, set the value
+            drv.setValue(dim, value)
 
     def settings(self, settingsMessage):
         """Change settings of a device."""
-        drv = None
-        for el in self._connectedDrivers:                       # Check for driver
-            if (el.getName() == settingsMessage['name']):
-                drv = el
-                break
-        else:
+        drv = self._drivers.get(settingsMessage['name'])        # Check for driver
+        if drv is None:
             return
 
         if ('mode' in settingsMessage):                         # Check for mode settings
@@ -142,3 +142,11 @@ class Output:
                 drv.setFrequency(settingsMessage['frequency'])
             except ValueError:
                 raise ValueError                                # Pass on the value error
+
+        for device in self.connectedDevices:                    # Keep the device dictionary up to date
+            if device['name'] == settingsMessage['name']:
+                device['mode'] = drv.getMode()
+                device['frequency'] = drv.getFrequency()
+                device['dutyFrequency'] = drv.getDutyFrequency()
+                device['flags'] = drv.getFlags()
+                device['settings'] = drv.getSettings()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+# Author: Cyrill Lippuner
+# Date: October 2018
+"""
+SoftWEAR Registry module.
+
+    Single registry of the connected devices of all modules keyed by the device
+    name. The modules register their devices after every scan, the registry
+    yields the register and deregister events and resolves the module of a
+    device for the 'Set' and 'Settings' messages.
+
+    The 'Register' message of a device is encoded once when the device is
+    registered and served from the cache for 'DeviceList' requests. After a
+    'Settings' message the module updates the device dictionary and the device
+    is re-encoded at once, also while scanning is disabled.
+"""
+
+import json                                                     # Serializing class for the register messages
+import threading                                                # Lock shared by the scan and update thread
+
+# Fields of a device sent with the 'Register' message
+REGISTER_FIELDS = ['name', 'dir', 'dim', 'about', 'settings', 'mode', 'flags', 'frequency', 'dutyFrequency']
+
+
+def encodeRegister(device):
+    """Return the encoded 'Register' message of a device dictionary."""
+    message = {'type': 'Register'}
+    for field in REGISTER_FIELDS:
+        message[field] = device[field]
+    return json.dumps(message)
+
+
+class Registry:
+    """Connected devices of all modules keyed by name."""
+
+    # Devices by name
+    _devices = {}
+
+    # Module of each device by name
+    _modules = {}
+
+    # Devices of each module by name
+    _moduleDevices = {}
+
+    # Names of the devices of each module in scan order
+    _moduleNames = {}
+
+    # Modules in registration order
+    _moduleOrder = []
+
+    # Encoded register message of each device by name
+    _messages = {}
+
+    # Lock for the scan and update thread
+    _lock = None
+
+    def __init__(self):
+        """Create an empty registry."""
+        self._devices = {}
+        self._modules = {}
+        self._moduleDevices = {}
+        self._moduleNames = {}
+        self._moduleOrder = []
+        self._messages = {}
+        self._lock = threading.Lock()
+
+    def update(self, module, devices):
+        """Replace the devices of a module. Returns the lists of devices to register and deregister."""
+        current = dict((device['name'], device) for device in devices)
+        with self._lock:
+            previous = self._moduleDevices.get(module, {})
+            added = set(current) - set(previous)                # Newly connected devices
+            removed = set(previous) - set(current)              # Disconnected devices
+            if module not in self._moduleDevices:
+                self._moduleOrder.append(module)
+            for name in removed:
+                del self._devices[name]
+                del self._modules[name]
+                del self._messages[name]
+            for name, device in current.items():                # Connected devices get the latest device dictionary
+                self._devices[name] = device
+                self._modules[name] = module
+                if name in added:                               # Encode new devices only
+                    self._messages[name] = encodeRegister(device)
+            self._moduleDevices[module] = current
+            self._moduleNames[module] = [device['name'] for device in devices]
+        register = [device for device in devices if device['name'] in added] # Keep the scan order
+        deregister = [device for name, device in previous.items() if name in removed]
+        return register, deregister
+
+    def get(self, name):
+        """Return the device dictionary of a name or None."""
+        return self._devices.get(name)
+
+    def getModule(self, name):
+        """Return the module of a device or None."""
+        return self._modules.get(name)
+
+    def invalidate(self, name):
+        """Re-encode the register message of a device after its settings changed."""
+        with self._lock:
+            device = self._devices.get(name)
+            if device is not None:
+                self._messages[name] = encodeRegister(device)
+
+    def getRegisterMessage(self, name):
+        """Return the encoded register message of a device or None."""
+        return self._messages.get(name)
+
+    def getRegisterMessages(self):
+        """Return the encoded register messages of all devices, ordered by module and scan."""
+        with self._lock:
+            return [self._messages[name] for module in self._moduleOrder for name in self._moduleNames[module]]
+
+    def __len__(self):
+        """Return the number of registered devices."""
+        return len(self._devices)
+
+    def __contains__(self, name):
+        """Check if a device is registered."""
+        return name in self._devices
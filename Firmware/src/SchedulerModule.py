@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+# Author: Cyrill Lippuner
+# Date: October 2018
+"""
+SoftWEAR Scheduler module.
+
+    Periodic deadlines on a monotonic clock for the loops of the Firmware. A Ticker
+    sleeps until its next deadline (kept in integer nanoseconds) instead of sleeping
+    for the period minus the time used, so the loops neither drift nor follow jumps
+    of the wall clock. Late ticks are dropped or caught up according to a policy and
+    the lateness of every wakeup is collected for the jitter percentiles.
+
+    The drivers signal 'newData' whenever a sample is stored and the connection
+    whenever a message is received, the update thread waits on it instead of
+    polling.
+"""
+
+import threading                                                # Event for new samples
+import time                                                     # Sleeping and fallback clock
+from array import array                                         # Ring of the jitter samples
+from Config import SCHEDULER_POLICY                             # SoftWEAR Config module.
+
+POLICY_DROP = 'drop'                                            # Late ticks are dropped, the schedule restarts from now
+POLICY_CATCH_UP = 'catchup'                                     # Late ticks are run back to back until on schedule
+POLICIES = [POLICY_DROP, POLICY_CATCH_UP]                       # Supported policies
+
+JITTER_SAMPLES = 1000                                           # Number of wakeups kept for the percentiles
+PERCENTILES = [50, 90, 99]                                      # Reported jitter percentiles
+
+
+def _monotonicClock():
+    """Return the best available monotonic clock in nanoseconds."""
+    if hasattr(time, 'monotonic_ns'):                           # Python 3.7+
+        return time.monotonic_ns
+    if hasattr(time, 'monotonic'):                              # Python 3.3+
+        return lambda: int(time.monotonic() * 1e9)
+    try:                                                        # Python 2 on Linux: clock_gettime(CLOCK_MONOTONIC)
+        import ctypes
+        import ctypes.util
+
+        class timespec(ctypes.Structure):
+            _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+        librt = ctypes.CDLL(ctypes.util.find_library('rt') or 'librt.so.1', use_errno=True)
+        clock_gettime = librt.clock_gettime
+        clock_gettime.argtypes = [ctypes.c_int, ctypes.POINTER(timespec)]
+        CLOCK_MONOTONIC = 1
+        ts = timespec()
+
+        def clock():
+            if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(ts)) != 0:
+                raise OSError(ctypes.get_errno(), 'clock_gettime failed')
+            return ts.tv_sec * 1000000000 + ts.tv_nsec
+        clock()                                                 # Fail here rather than in a loop
+        return clock
+    except (ImportError, OSError, AttributeError):
+        return lambda: int(time.time() * 1e9)                   # Wall clock as last resort
+
+# Monotonic clock in nanoseconds
+nowNs = _monotonicClock()
+
+def now():
+    """Return the monotonic clock in seconds."""
+    return nowNs() / 1e9
+
+def nextDeadline(deadline, period, current, policy=SCHEDULER_POLICY):
+    """Return the deadline following deadline (all in ns) for the policy and the number of dropped ticks."""
+    deadline += period
+    if deadline > current or policy == POLICY_CATCH_UP:
+        return deadline, 0
+    dropped = (current - deadline) // period + 1                # Ticks that passed without being run
+    return deadline + dropped * period, dropped
+
+
+class Jitter:
+    """Ring of the latest wakeup latenesses (s) with percentiles."""
+
+    # Lateness of the latest wakeups
+    _samples = None
+
+    # Total number of samples added
+    _count = 0
+
+    def __init__(self, size=JITTER_SAMPLES):
+        """Preallocate the ring."""
+        self._samples = array('d', [0.]) * size
+        self._count = 0
+
+    def add(self, lateness):
+        """Add the lateness of a wakeup in seconds."""
+        count = self._count
+        self._samples[count % len(self._samples)] = lateness
+        self._count = count + 1
+
+    def percentiles(self, percentiles=PERCENTILES):
+        """Return the percentiles of the latest samples as {'p50': s, ...}."""
+        samples = sorted(self._samples[:min(self._count, len(self._samples))])
+        result = {}
+        for percentile in percentiles:
+            if len(samples) == 0:
+                result['p{}'.format(percentile)] = 0.
+            else:
+                result['p{}'.format(percentile)] = samples[min(len(samples) * percentile // 100, len(samples) - 1)]
+        return result
+
+
+class Ticker:
+    """Periodic deadlines of a loop."""
+
+    # Period in ns
+    _period = 0
+
+    # Next deadline in ns
+    _deadline = 0
+
+    # Policy for late ticks
+    _policy = SCHEDULER_POLICY
+
+    # Number of ticks dropped
+    dropped = 0
+
+    # Lateness of the wakeups
+    jitter = None
+
+    def __init__(self, period, policy=SCHEDULER_POLICY, jitter=None):
+        """Start the schedule now with a period in seconds."""
+        if policy not in POLICIES:
+            raise ValueError('Policy {} is not allowed'.format(policy))
+        self._period = max(int(period * 1e9), 1)
+        self._policy = policy
+        self._deadline = nowNs() + self._period
+        self.dropped = 0
+        self.jitter = jitter if jitter is not None else Jitter()
+
+    def setPeriod(self, period):
+        """Change the period in seconds, applied from the next deadline on."""
+        period = max(int(period * 1e9), 1)
+        if period != self._period:
+            self._deadline += period - self._period
+            self._period = period
+
+    def wait(self):
+        """Sleep until the next deadline. Returns the number of ticks dropped."""
+        delay = self._deadline - nowNs()
+        if delay > 0:
+            time.sleep(delay / 1e9)
+        current = nowNs()
+        self.jitter.add((current - self._deadline) / 1e9)       # Lateness of the wakeup
+        self._deadline, dropped = nextDeadline(self._deadline, self._period, current, self._policy)
+        self.dropped += dropped
+        return dropped
+
+
+# Lateness of the wakeups of all driver loops
+loopJitter = Jitter()
+
+# Set by the drivers whenever a sample is stored and by the connection for received messages
+newData = threading.Event()
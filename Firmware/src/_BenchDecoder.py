@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# Author: Cyrill Lippuner
+# Date: October 2018
+"""
+Benchmark of the stream decoder.
+
+    Replays a recorded session through the legacy brace-splitting decoder and the
+    ProtocolModule decoder (json and binary protocol). The session is read from the
+    data log written by 'Main.py m' or, if missing, synthesized.
+
+    Usage: python _BenchDecoder.py [data.log] [minutes]
+"""
+
+import sys                                                      # Required for get input args
+import os                                                       # Check for the data log
+import time                                                     # Timing of the runs
+import json                                                     # Serializing class for the messages
+import random                                                   # Synthesized sensor values
+import ProtocolModule                                           # SoftWEAR Protocol module
+
+LOG_FILE = '../Logs/data.log'                                   # Data log written by the Firmware
+RATE = 100                                                      # Update rate of the synthesized session
+DEVICES = 12                                                    # Number of synthesized BNO055
+RECV_SIZE = 1024                                                # Chunk size of the legacy receive calls
+
+
+def loadSession(path):
+    """Return the messages of a data log (one JSON message per line)."""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def synthesizeSession(minutes):
+    """Return the messages of a session with DEVICES BNO055 streaming at RATE."""
+    messages = []
+    start = time.time()
+    for cycle in range(int(minutes * 60 * RATE)):
+        timestamp = start + float(cycle) / RATE
+        data = []
+        for device in range(DEVICES):
+            values = [[timestamp, [random.uniform(-1., 1.) for _ in range(4)]]]
+            data.append({'name': 'I2C-{}@BNO055[0x28]'.format(device), 'values': values, 'cycle': 0.004})
+        messages.append({'type': 'D', 'data': data})
+        if cycle % RATE == 0:
+            messages.append({'type': 'CycleDuration', 'name': '', 'values': {'update': 0.002, 'scan': 0.03}})
+    return messages
+
+def legacyDecode(chunks):
+    """Decode the chunks with the brace-splitting decoder used before the ProtocolModule."""
+    messages = []
+    remainder = ""
+    for data in chunks:
+        m_list = (remainder + data.decode("utf-8")).split("}")
+        remainder = ""
+        while len(m_list) > 0:
+            if remainder and remainder.count("{") > remainder.count("}"):
+                remainder += m_list.pop(0)
+                if len(m_list) > 0:
+                    remainder += "}"
+            elif remainder:
+                messages.append(json.loads(remainder))
+                remainder = ""
+            elif len(m_list) == 1 and m_list[0] == "":
+                m_list.pop(0)
+            else:
+                remainder += m_list.pop(0)
+                if len(m_list) > 0:
+                    remainder += "}"
+    return messages
+
+def decoderDecode(chunks):
+    """Decode the chunks with the ProtocolModule decoder."""
+    decoder = ProtocolModule.Decoder()
+    messages = []
+    for data in chunks:
+        messages.extend(decoder.feed(data))
+    return messages
+
+def split(stream, size):
+    """Split the stream into receive sized chunks."""
+    return [stream[i:i + size] for i in range(0, len(stream), size)]
+
+def run(name, decode, chunks, count, streamLength):
+    """Time a decoder on the chunks and print the throughput."""
+    startTime = time.time()
+    messages = decode(chunks)
+    duration = time.time() - startTime
+    if len(messages) != count:
+        print("{:<24} FAILED decoded {} of {} messages".format(name, len(messages), count))
+        return
+    print("{:<24} {:>10} bytes {:>8.3f} s {:>10.1f} MB/s {:>12.0f} msg/s".format(
+        name, streamLength, duration, streamLength / duration / 1e6, count / duration))
+
+def main():
+    """Replay the session through all decoders."""
+    path = sys.argv[1] if len(sys.argv) > 1 else LOG_FILE
+    minutes = float(sys.argv[2]) if len(sys.argv) > 2 else 10.
+    if os.path.isfile(path):
+        messages = loadSession(path)
+        print("Replaying {} messages from {}".format(len(messages), path))
+    else:
+        messages = synthesizeSession(minutes)
+        print("Replaying {} synthesized messages ({} min, {} BNO055 at {} Hz)".format(len(messages), minutes, DEVICES, RATE))
+
+    jsonStream = b''.join([ProtocolModule.encodeMessage(m, ProtocolModule.PROTOCOL_JSON) for m in messages])
+    binaryStream = b''.join([ProtocolModule.encodeMessage(m, ProtocolModule.PROTOCOL_BINARY) for m in messages])
+
+    run('legacy json', legacyDecode, split(jsonStream, RECV_SIZE), len(messages), len(jsonStream))
+    run('decoder json', decoderDecode, split(jsonStream, ProtocolModule.RECV_SIZE), len(messages), len(jsonStream))
+    run('decoder binary', decoderDecode, split(binaryStream, ProtocolModule.RECV_SIZE), len(messages), len(binaryStream))
+
+
+if __name__ == '__main__':
+    main()
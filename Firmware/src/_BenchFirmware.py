@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+# Author: Cyrill Lippuner
+# Date: October 2018
+"""
+End-to-end benchmark of the Firmware.
+
+    Boots Main on the simulated hardware with a number of BNO055 behind I2C muxes,
+    connects a headless client over TCP and measures for a number of seconds:
+    sustained samples/s, achieved frequency per device, sensor-to-client latency
+    (sample timestamp to reception) and the CPU time used by every thread.
+    The results are printed as JSON to track regressions across commits.
+
+    Usage: python _BenchFirmware.py [devices] [seconds] [frequency] [json|binary] [quantize,zlib|none]
+"""
+
+import sys                                                      # Required for get input args
+import os                                                       # Thread CPU times and exit
+import time                                                     # Timing of the runs
+import json                                                     # Serializing class for the results
+import socket                                                   # Client connection to the Firmware
+import threading                                                # Threads of the Firmware
+import subprocess                                               # Commit of the tree
+import Config                                                   # SoftWEAR Config
+import ProtocolModule                                           # SoftWEAR Protocol module
+
+HOST = '127.0.0.1'                                              # Firmware runs on the same machine
+PORT = 12345                                                    # Port of the CommunicationModule
+DEVICES = 8                                                     # Number of simulated BNO055
+SECONDS = 10.                                                   # Duration of the measurement
+FREQUENCY = '100 Hz'                                            # Frequency requested for every device
+SCAN_TIMEOUT = 120.                                             # Longest wait for all devices to register
+BNO055_ADDRESSES = [0x28, 0x29]                                 # Addresses of the BNO055 on a mux channel
+MUX_ADDRESSES = [0x70, 0x71, 0x72, 0x73, 0x74, 0x75, 0x76, 0x77] # Addresses of the TCA9548A
+MUX_RANGE = 8                                                   # Channels of a TCA9548A
+BUSNUM = 2                                                      # Bus of the simulated devices
+DETECT = 'P9_15'                                                # Detect pin of the I2C muxes
+PERCENTILES = [50, 90, 99]                                      # Reported latency percentiles
+BNO055_NAME = 'BNO055@'                                         # Name prefix of the simulated devices
+
+
+def simulate(devices):
+    """Configure the simulated hardware with the devices behind as few muxes as possible."""
+    perMux = MUX_RANGE * len(BNO055_ADDRESSES)
+    if devices < 1 or devices > perMux * len(MUX_ADDRESSES):
+        raise ValueError('Devices {} is not allowed'.format(devices))
+    muxes = MUX_ADDRESSES[:(devices + perMux - 1) // perMux]
+    i2c = [{'DEVICE': 'TCA9548A', 'ADDRESS': mux, 'BUSNUM': BUSNUM} for mux in muxes]
+    for index in range(devices):
+        mux = muxes[index // perMux]
+        channel = (index % perMux) // len(BNO055_ADDRESSES)
+        address = BNO055_ADDRESSES[index % len(BNO055_ADDRESSES)]
+        i2c.append({'DEVICE': 'BNO055', 'ADDRESS': address, 'BUSNUM': BUSNUM, 'MUX': mux, 'CHANNEL': channel})
+
+    Config.HARDWARE = 'simulation'                              # Must be set before the Firmware is imported
+    Config.SIMULATION['GPIO'] = {Config.PIN_MAP['SCAN']: 1, DETECT: 1}
+    Config.SIMULATION['ADC'] = []
+    Config.SIMULATION['I2C'] = i2c
+    Config.PIN_MAP['MUX'][:] = [{'ADDRESS': mux, 'BUSNUM': BUSNUM, 'DETECT': DETECT} for mux in muxes]
+    Config.PIN_MAP['I2C'][:] = [{'ADDRESS': address, 'BUSNUM': BUSNUM} for address in BNO055_ADDRESSES]
+
+def threadTimes():
+    """Return the CPU time (user + system) in seconds of every named thread."""
+    times = {}
+    ticks = float(os.sysconf('SC_CLK_TCK'))
+    for thread in threading.enumerate():
+        tid = getattr(thread, 'native_id', None)                # Only available since Python 3.8
+        if tid is None:
+            continue
+        try:
+            with open('/proc/self/task/{}/stat'.format(tid)) as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except IOError:
+            continue
+        times[thread.name] = times.get(thread.name, 0.) + (int(fields[11]) + int(fields[12])) / ticks
+    return times
+
+def percentile(values, p):
+    """Return the p-th percentile of the sorted values."""
+    if len(values) == 0:
+        return 0.
+    return values[min(len(values) - 1, int(len(values) * p / 100.))]
+
+def commit():
+    """Return the commit of the tree or None."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD']).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Client:
+    """Headless client collecting the samples of every device."""
+
+    # Connection socket
+    _s = None
+
+    # Stream decoder
+    _decoder = None
+
+    # Registered devices: name -> register message
+    devices = {}
+
+    # Received samples per device during the measurement
+    samples = {}
+
+    # Timestamp of the newest received sample per device, older samples are duplicates
+    newest = {}
+
+    # Sensor-to-client latencies in seconds during the measurement
+    latencies = []
+
+    # Last CycleDuration values
+    cycleDuration = None
+
+    # Flag whether the samples are counted
+    measuring = False
+
+    # Bytes received during the measurement
+    bytesReceived = 0
+
+    def __init__(self, protocol, compression):
+        """Connect to the Firmware and negotiate the protocol and compression."""
+        self.devices = {}
+        self.samples = {}
+        self.newest = {}
+        self.latencies = []
+        self._decoder = ProtocolModule.Decoder()
+        self._s = socket.create_connection((HOST, PORT), 5.)
+        self._s.settimeout(0.1)
+        protocols = [protocol] if protocol == ProtocolModule.PROTOCOL_JSON else ProtocolModule.PROTOCOLS
+        hello = ProtocolModule.helloMessage(protocols, compression)
+        self._s.sendall(ProtocolModule.toBytes(ProtocolModule.toJSON(hello)))
+
+    def send(self, message):
+        """Send a JSON message to the Firmware."""
+        self._s.sendall(ProtocolModule.toBytes(ProtocolModule.toJSON(message)))
+
+    def receive(self, duration):
+        """Receive and account the messages for duration seconds."""
+        endTime = time.time() + duration
+        while time.time() < endTime:
+            try:
+                count = self._decoder.recvInto(self._s)
+                if not count:
+                    raise IOError('Firmware closed the connection')
+            except socket.timeout:
+                continue
+            if self.measuring:
+                self.bytesReceived += count
+            now = time.time()
+            for message in self._decoder.decode():
+                if message['type'] == 'Register':
+                    self.devices[message['name']] = message
+                elif message['type'] == 'Deregister':
+                    self.devices.pop(message['name'], None)
+                elif message['type'] == 'CycleDuration':
+                    self.cycleDuration = message['values']
+                elif message['type'] == 'D':
+                    for block in message['data']:
+                        newest = self.newest.get(block['name'])
+                        fresh = [sample for sample in block['values'] if newest is None or sample[0] > newest]
+                        if len(fresh) > 0:                      # Only count every (name, timestamp) once
+                            self.newest[block['name']] = fresh[-1][0]
+                        if not self.measuring:
+                            continue
+                        self.samples[block['name']] = self.samples.get(block['name'], 0) + len(fresh)
+                        if block['name'].startswith(BNO055_NAME): # Latency of the simulated sensors
+                            for sample in fresh:
+                                self.latencies.append(now - sample[0])
+
+    def close(self):
+        """Close the connection."""
+        self._s.close()
+
+
+def main():
+    """Boot the Firmware, wait for all devices and measure."""
+    devices = int(sys.argv[1]) if len(sys.argv) > 1 else DEVICES
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else SECONDS
+    frequency = sys.argv[3] if len(sys.argv) > 3 else FREQUENCY
+    protocol = sys.argv[4] if len(sys.argv) > 4 else 'binary'
+    compression = sys.argv[5].split(',') if len(sys.argv) > 5 else ProtocolModule.COMPRESSIONS
+    if compression == ['none']:
+        compression = []
+    simulate(devices)
+
+    import Main                                                 # Import after the Config is prepared
+    firmware = threading.Thread(target=Main.main, name='Firmware') # Run the Firmware
+    firmware.daemon = True
+    firmware.start()
+
+    client = None
+    startTime = time.time()
+    while client is None:                                       # Wait for the server socket
+        try:
+            client = Client(protocol, compression)
+        except socket.error:
+            if time.time() - startTime > SCAN_TIMEOUT:
+                raise
+            time.sleep(0.1)
+    names = []
+    while len(names) < devices:                                 # Wait until the scan registered all devices
+        if time.time() - startTime > SCAN_TIMEOUT:
+            raise IOError('Only {} of {} devices registered'.format(len(names), devices))
+        client.receive(0.5)
+        names = [name for name in client.devices if name.startswith(BNO055_NAME)]
+    bootDuration = time.time() - startTime
+    for name in names:
+        client.send({'type': 'Settings', 'name': name, 'frequency': frequency})
+    client.receive(1.)                                          # Settle on the new frequency
+
+    client.measuring = True
+    cpuBefore = threadTimes()
+    processBefore = os.times()
+    measureStart = time.time()
+    client.receive(seconds)
+    duration = time.time() - measureStart
+    processAfter = os.times()
+    cpuAfter = threadTimes()
+    client.close()
+
+    latencies = sorted(client.latencies)
+    total = sum(client.samples.values())                       # Samples of all devices, the GPIO drivers included
+    result = {
+        'commit': commit(),
+        'python': sys.version.split()[0],
+        'devices': devices,
+        'frequency': frequency,
+        'protocol': protocol,
+        'compression': compression,
+        'duration': duration,
+        'boot': bootDuration,
+        'samples': total,
+        'samplesPerSecond': total / duration,
+        'bytesPerSecond': client.bytesReceived / duration,
+        'deviceFrequency': dict((name, client.samples.get(name, 0) / duration) for name in names),
+        'latency': dict(('p{}'.format(p), percentile(latencies, p)) for p in PERCENTILES),
+        'cpu': dict((name, cpuAfter[name] - cpuBefore.get(name, 0.)) for name in cpuAfter),
+        'cpuProcess': (processAfter[0] + processAfter[1]) - (processBefore[0] + processBefore[1]),
+        'cycleDuration': client.cycleDuration
+    }
+    print(json.dumps(result, indent=2, sort_keys=True))
+    sys.stdout.flush()
+    os._exit(0)                                                 # The Firmware threads never terminate
+
+
+if __name__ == '__main__':
+    main()
@@ -4,13 +4,20 @@
 """
 Driver file for the BASIC ADC. Read the value from a analog pin for integrating into
 the SoftWEAR package.
+
+    With an OVERSAMPLING flag every sample is the mean of a burst of reads (boxcar
+    decimation), which lowers the noise at the same output frequency. The flags select
+    the ratio, the largest raised one is used. The burst is shortened to fit into
+    BURST_SHARE of the period, measured with the duration of the last burst.
 """
 #import Adafruit_GPIO.AdafruitBBIOAdapter as AdafruitBBIOAdapter # Main peripheral class. Implements GPIO read out
-import Adafruit_BBIO.ADC as ADC
+from HardwareModule import ADC                                  # SoftWEAR Hardware module.
 import threading                                                # Threading class for the threads
 import time                                                     # Required for controllng the sampling period
 
 from MuxModule import GetMux                                    # SoftWEAR MUX module.
+from BufferModule import SampleBuffer                           # SoftWEAR sample ring buffer.
+from SchedulerModule import Ticker, loopJitter                  # SoftWEAR monotonic loop deadlines.
 
 # Create a MUX shadow instance as there is only one Mux
 MuxModule = GetMux()
@@ -20,6 +27,12 @@ TIMEOUT_TICKS = 10
 TIMEOUT_ENABLED = True
 TIMEOUT_THRESHOLD = 0.005
 
+# Reads averaged for a sample by oversampling flag
+OVERSAMPLING = {'OVERSAMPLING x4': 4, 'OVERSAMPLING x16': 16, 'OVERSAMPLING x64': 64}
+
+# Share of the period a burst of reads may take
+BURST_SHARE = 0.5
+
 class ADCBasic:
     """Driver for BASIC ADC."""
 
@@ -70,7 +83,8 @@ class ADCBasic:
             '60 Hz',
             '100 Hz'
         ],
-        'modes': ['Auto Detection', 'Manual Detection']
+        'modes': ['Auto Detection', 'Manual Detection'],
+        'flags': ['OVERSAMPLING x4', 'OVERSAMPLING x16', 'OVERSAMPLING x64']
     }
 
     # Data type of values
@@ -109,6 +123,9 @@ class ADCBasic:
     # Duration needed for an update cycle
     _cycleDuration = 0
 
+    # Duration of a read measured with the last burst
+    _readDuration = 0
+
 
     def __init__(self, pin, muxedPin = None, muxName = None):
         """Device supports a pin."""
@@ -118,7 +135,7 @@ class ADCBasic:
         self._zeroCounter = 0                                   # Set zero counter to 0
         self._mode = self._settings['modes'][0]                 # Set default mode
         self._flags = []                                        # Set default flag list
-        self._values = []                                       # Set empty values array
+        self._values = SampleBuffer(self._dim)                  # Set empty sample buffer
         ADC.setup()                                             # Enable ADC readings
 
     def cleanup(self):
@@ -159,6 +176,7 @@ class ADCBasic:
 
     def _loop(self):
         """Inner loop of the driver."""
+        ticker = Ticker(self._period, jitter=loopJitter)        # Deadlines of the loop
         while True:
             beginT = time.time()                                # Save start time of loop cycle
 
@@ -166,7 +184,13 @@ class ADCBasic:
             if (self._muxedPin != None):
                 MuxModule.activate(self._muxName, self._muxedPin) # Activate mux pin
             ADC.read(self._pin)
-            self._currentValue = ADC.read(self._pin)
+            ratio = self._oversampling()                        # Average a burst of reads (a single read without oversampling)
+            burstT = time.time()
+            total = 0.
+            for _ in range(ratio):
+                total += ADC.read(self._pin)
+            self._currentValue = total / ratio
+            self._readDuration = (time.time() - burstT) / ratio # Duration of a read for the next burst
             if (self._muxedPin != None):
                 MuxModule.deactivate(self._muxName)             # Deactivate mux
             if self._mode == 'Auto Detection':                  # Go for detection
@@ -177,25 +201,29 @@ class ADCBasic:
             elif self._mode == 'Manual Detection':              # Keep device anyway
                 self._zeroCounter = 0                           # Reset zero counter
 
-            self._values.append([time.time(), [self._currentValue]]) # Save timestamp and value
+            self._values.append(time.time(), [self._currentValue]) # Save timestamp and value
 
             endT = time.time()                                  # Save start time of loop cycle
             deltaT = endT - beginT                              # Calculate time used for loop cycle
             self._cycleDuration = deltaT                        # Save time needed for a cycle
-            if (deltaT < self._period):
-                time.sleep(self._period - deltaT)               # Sleep until next loop period
+            ticker.setPeriod(self._period)                      # Follow frequency changes
+            ticker.wait()                                       # Sleep until the next deadline
 
             if not self._threadActive:                          # Stop the thread
                 return
 
+    def _oversampling(self):
+        """Return the number of reads of a burst, the largest raised ratio that fits into the period."""
+        ratio = max([OVERSAMPLING[flag] for flag in self._flags if flag in OVERSAMPLING] + [1])
+        if ratio > 1 and self._readDuration > 0:                # Keep the burst within its share of the period
+            ratio = max(1, min(ratio, int(BURST_SHARE * self._period / self._readDuration)))
+        return ratio
+
     def getValues(self, clear=True):
         """Get values for the adc device."""
         if self._values == None:                                # Return empty array for no values
             return []
-        values = self._values[:]                                # Get the values
-        if clear:
-            self._values = []                                   # Reset values
-        return values                                           # Return the values
+        return self._values.take(clear)                         # Return the values (columnar copy)
 
     def getDevice(self):
         """Return device name."""
@@ -267,7 +295,13 @@ class ADCBasic:
 
     def setFlag(self, flag, value):
         """Set device flag."""
-        raise ValueError('flag {} is not allowed'.format(flag))
+        if (flag in self._settings['flags']):
+            if value and flag not in self._flags:
+                self._flags.append(flag)                        # Add the flag
+            elif not value and flag in self._flags:
+                self._flags.remove(flag)                        # Remove the flag
+        else:
+            raise ValueError('flag {} is not allowed'.format(flag))
 
     def getFrequency(self):
         """Return device frequency."""
@@ -5,11 +5,23 @@
 Driver file for the ADS_1015 Analog reader. Communicates
 with the device via I2C and implements the basic functions for integrating into
 the SoftWEAR package.
+
+    In the 'Single Shot' mode every update converts the four channels one after the
+    other and waits for each conversion. The 'Sequenced' mode pipelines the channels:
+    every update reads the finished conversion and starts the one of the next channel,
+    the bus is free for other devices while the chip converts. The data rate of the
+    chip follows the frequency, the conversion ready bit is only polled if the update
+    comes earlier than the conversion time. A conversion that is not ready after its
+    conversion time restarts the sequence. The frequencies above 100 Hz are only
+    available in the 'Sequenced' mode.
 """
 import time                                                     # Imported for delay reasons
 import drivers._ADS1X15 as ADS1015_DRIVER                       # Import official driver
+from HardwareModule import I2C                                  # SoftWEAR Hardware module.
 import threading                                                # Threading class for the threads
 from MuxModule import GetMux                                    # SoftWEAR MUX module.
+from BufferModule import SampleBuffer                           # SoftWEAR sample ring buffer.
+from SchedulerModule import Ticker, loopJitter                  # SoftWEAR monotonic loop deadlines.
 
 # Mux Module to switch channels
 MuxModule = GetMux()
@@ -22,11 +34,10 @@ DRIVER_BUSNUM  = [1, 2]
 
 
 # Constants
-#################################################################
-# TODO:
-# Add constants to be used for settings for example.
-# MY_CONST = ...
-#################################################################
+ADS1015_CHANNELS   = 4
+ADS1015_DATA_RATES = [128, 250, 490, 920, 1600, 2400, 3300]     # Data rates of the chip in samples per second
+READY_MARGIN       = 1.1                                        # Tolerance of the conversion time (internal oscillator)
+SINGLE_SHOT_MAX    = 100                                        # Highest frequency in Hz of four blocking conversions per update
 
 
 #################################################################
@@ -81,8 +92,12 @@ class ADS1015:
             '40 Hz',
             '50 Hz',
             '60 Hz',
-            '100 Hz'
-        ]
+            '100 Hz',
+            '200 Hz',
+            '400 Hz',
+            '800 Hz'
+        ],
+        'modes': ['Single Shot', 'Sequenced']
     }
 
     # Data type of values
@@ -91,6 +106,9 @@ class ADS1015:
     # Data range for values
     _dataRange = []
 
+    # Resolution of the values (raw conversion results)
+    _dataResolution = [1., 1., 1., 1.]
+
     # Value to set
     _currentValue = 0
 
@@ -121,6 +139,18 @@ class ADS1015:
     # Duration needed for an update cycle
     _cycleDuration = 0
 
+    # Data rate of the chip in samples per second ('Sequenced' mode)
+    _dataRate = ADS1015_DATA_RATES[0]
+
+    # Channel of the running conversion, None if no conversion is running ('Sequenced' mode)
+    _channel = None
+
+    # End of the longest conversion time of the running conversion ('Sequenced' mode)
+    _readyAt = 0
+
+    # Values of the current sequence ('Sequenced' mode)
+    _row = None
+
     # Address of the driver
     _address = None
 
@@ -146,11 +176,14 @@ class ADS1015:
             self._muxName = muxName                                 # Set mux name
             self._muxedChannel = muxedChannel                       # Set muxed pin
 
-            self._values = []                                       # Set empty values array
+            self._values = SampleBuffer(self._dim)                  # Set empty sample buffer
 
             self._frequency = self._settings['frequencies'][6]      # Set default frequency
+            self._mode = self._settings['modes'][0]                 # Set default mode
+            self._row = [None] * ADS1015_CHANNELS                   # Set empty sequence
+            self._updateDataRate()                                  # Set data rate for the frequency
 
-            self._drv = ADS1015_DRIVER.ADS1015(address=self._address,busnum=self._busnum) # Create the driver object
+            self._drv = ADS1015_DRIVER.ADS1015(address=self._address,busnum=self._busnum,i2c=I2C) # Create the driver object
 
             if (muxedChannel != None):
                 MuxModule.deactivate(muxName)                       # Deactivate mux
@@ -178,6 +211,7 @@ class ADS1015:
             if (self._muxedChannel != None):
                 MuxModule.activate(self._muxName, self._muxedChannel) # Activate mux channel
             self._connected = self._drv.read_adc(0) != None     # Device is connected and has no error
+            self._channel = None                                # The read replaced a running conversion, restart the sequence
             if (self._muxedChannel != None):
                 MuxModule.deactivate(self._muxName)             # Deactivate mux
         except:
@@ -187,7 +221,7 @@ class ADS1015:
         self.LOCK.release()                                     # Release driver
         return self._connected
 
-    def configureDevice(self):
+    def configureDevice(self, startThread=True):
         """Once the device is connected, it must be configured."""
         try:
             if (self._muxedChannel != None):
@@ -200,56 +234,96 @@ class ADS1015:
                 MuxModule.deactivate(self._muxName)             # Deactivate mux
             raise IOError('<What Error?>')
         self._threadActive = True                               # Set thread active flag
-        self._thread = threading.Thread(target=self._loop, name=self._name) # Create thread
-        self._thread.daemon = True                              # Set thread as daemonic
-        self._thread.start()                                    # Start thread
+        if startThread:                                         # Otherwise the bus scheduler calls update()
+            self._thread = threading.Thread(target=self._loop, name=self._name) # Create thread
+            self._thread.daemon = True                          # Set thread as daemonic
+            self._thread.start()                                # Start thread
 
     def _loop(self):
         """Inner loop of the driver."""
+        ticker = Ticker(self.getPeriod(), jitter=loopJitter)    # Deadlines of the loop
         while True:
-            beginT = time.time()                                # Save start time of loop cycle
-            deltaT = 0
+            self.update()                                       # Read/write the device
 
-            try:
-                self.LOCK.acquire()                             # Lock the driver for loop
-                if (self._muxedChannel != None):
-                    MuxModule.activate(self._muxName, self._muxedChannel) # Activate mux channel
-
-                                                                # Read all values
-                self._currentValue = [self._drv.read_adc(0), self._drv.read_adc(1), self._drv.read_adc(2), self._drv.read_adc(3)]
+            ticker.setPeriod(self.getPeriod())                  # Follow frequency and mode changes
+            ticker.wait()                                       # Sleep until the next deadline
 
-                self._values.append([time.time(), self._currentValue]) # Save timestamp and value
-
-                endT = time.time()                              # Save start time of loop cycle
-                deltaT = endT - beginT                          # Calculate time used for loop cycle
-                self._cycleDuration = deltaT                    # Save time needed for a cycle
+            if not self._threadActive:                          # Stop the thread
+                return
 
-                if (self._muxedChannel != None):
-                    MuxModule.deactivate(self._muxName)         # Deactivate mux
-                self.LOCK.release()                             # Release driver
-            except:
-                self._connected = False                         # Device disconnected
-                if (self._muxedChannel != None):
-                    MuxModule.deactivate(self._muxName)         # Deactivate mux
-                self.LOCK.release()                             # Release driver
+    def update(self):
+        """Read/write the device once, used by the inner loop or the bus scheduler. Return the time used."""
+        beginT = time.time()                                    # Save start time of loop cycle
+        deltaT = 0
 
+        try:
+            self.LOCK.acquire()                                 # Lock the driver for loop
+            if (self._muxedChannel != None):
+                MuxModule.activate(self._muxName, self._muxedChannel) # Activate mux channel
 
+            if self._mode == 'Sequenced':
+                self._sequence()                                # Read one channel and start the next
+            else:                                               # Read all values
+                self._currentValue = [self._drv.read_adc(0), self._drv.read_adc(1), self._drv.read_adc(2), self._drv.read_adc(3)]
 
-            if (deltaT < self._period):
-                time.sleep(self._period - deltaT)               # Sleep until next loop period
+                self._values.append(time.time(), self._currentValue) # Save timestamp and value
 
+            endT = time.time()                                  # Save start time of loop cycle
+            deltaT = endT - beginT                              # Calculate time used for loop cycle
+            self._cycleDuration = deltaT                        # Save time needed for a cycle
 
-            if not self._threadActive:                          # Stop the thread
+            if (self._muxedChannel != None):
+                MuxModule.deactivate(self._muxName)             # Deactivate mux
+            self.LOCK.release()                                 # Release driver
+        except:
+            self._connected = False                             # Device disconnected
+            self._channel = None                                # Restart the sequence
+            if (self._muxedChannel != None):
+                MuxModule.deactivate(self._muxName)             # Deactivate mux
+            self.LOCK.release()                                 # Release driver
+
+        return deltaT
+
+    def _sequence(self):
+        """Read the finished conversion and start the conversion of the next channel (lock needs to be held)."""
+        if self._channel != None and not self._conversionReady():
+            self._channel = None                                # Conversion timed out, restart the sequence
+            self._row = [None] * ADS1015_CHANNELS               # The last result may belong to another channel
+        if self._channel != None:
+            self._row[self._channel] = self._drv.get_last_result() # Read the conversion
+            if self._channel == ADS1015_CHANNELS - 1:           # Sequence complete
+                self._currentValue = self._row[:]
+                self._values.append(time.time(), self._currentValue) # Save timestamp and value
+                self._updateDataRate()                          # Follow the duration of the transfers
+            self._channel = (self._channel + 1) % ADS1015_CHANNELS
+        else:
+            self._channel = 0                                   # Start a new sequence
+        self._drv.start_conversion(self._channel, data_rate=self._dataRate) # Start the next conversion
+        self._readyAt = time.time() + READY_MARGIN / self._dataRate # Data rate of this conversion
+
+    def _conversionReady(self):
+        """Return True if the running conversion finished, polls the ready bit only for the remaining conversion time."""
+        if time.time() >= self._readyAt:                        # Updated late, the conversion finished
+            return True
+        while time.time() < self._readyAt:                      # Updated early, poll the conversion ready bit
+            if self._drv.conversion_ready():
+                return True
+        return self._drv.conversion_ready()                     # Last check after the conversion time
+
+    def _updateDataRate(self):
+        """Set the lowest data rate whose conversions finish before the next update of a channel."""
+        available = self._period / ADS1015_CHANNELS - self._cycleDuration # The update itself takes the bus
+        for dataRate in ADS1015_DATA_RATES:
+            if READY_MARGIN / dataRate <= available:
+                self._dataRate = dataRate
                 return
+        self._dataRate = ADS1015_DATA_RATES[-1]
 
     def getValues(self, clear=True):
         """Get values for the i2c device."""
         if self._values == None:                                # Return empty array for no values
             return []
-        values = self._values[:]                                # Get the values
-        if clear:
-            self._values = []                                   # Reset values
-        return values                                           # Return the values
+        return self._values.take(clear)                         # Return the values (columnar copy)
 
 
     def getDevice(self):
@@ -290,7 +364,8 @@ class ADS1015:
             'dimMap': self._dimMap[:],
             'dimUnit': self._dimUnit[:],
             'dataType': self._dataType,
-            'dataRange': self._dataRange[:]
+            'dataRange': self._dataRange[:],
+            'dataResolution': self._dataResolution[:]
         }
 
     def getSettings(self):
@@ -307,7 +382,15 @@ class ADS1015:
 
     def setMode(self, mode):
         """Set device mode."""
-        raise ValueError('set mode is not implemented')
+        if (mode in self._settings['modes']):
+            if mode == 'Single Shot' and int(self._frequency[:-3]) > SINGLE_SHOT_MAX:
+                raise ValueError('mode {} is not allowed at frequency {}'.format(mode, self._frequency))
+            self.LOCK.acquire()                                 # Mode changes between updates
+            self._mode = mode
+            self._channel = None                                # Start with a new sequence
+            self.LOCK.release()
+        else:
+            raise ValueError('mode {} is not allowed'.format(mode))
 
     def getFlags(self):
         """Return device mode."""
@@ -321,6 +404,12 @@ class ADS1015:
         """Set device flag."""
         raise ValueError('flag is not implemented')
 
+    def getPeriod(self):
+        """Return device period in seconds, in the 'Sequenced' mode the period of a channel."""
+        if self._mode == 'Sequenced':
+            return self._period / ADS1015_CHANNELS
+        return self._period
+
     def getFrequency(self):
         """Return device frequency."""
         return self._frequency
@@ -328,8 +417,11 @@ class ADS1015:
     def setFrequency(self, frequency):
         """Set device frequency."""
         if (frequency in self._settings['frequencies']):
+            if self._mode == 'Single Shot' and int(frequency[:-3]) > SINGLE_SHOT_MAX:
+                raise ValueError('frequency {} is not allowed in mode {}'.format(frequency, self._mode))
             self._frequency = frequency
             self._period = 1./int(self._frequency[:-3])
+            self._updateDataRate()                              # Follow with the data rate
         else:
             raise ValueError('frequency {} is not allowed'.format(frequency))
 
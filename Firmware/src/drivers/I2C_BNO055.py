@@ -7,10 +7,14 @@ with the device via I2C and implements the basic functions for integrating into
 the SoftWEAR package.
 """
 import time                                                     # Imported for delay reasons
+import struct                                                   # Decoding of the burst read
 import drivers._BNO055 as BNO055_DRIVER                         # Import official driver
+from HardwareModule import I2C                                  # SoftWEAR Hardware module.
 import threading                                                # Threading class for the threads
 
 from MuxModule import GetMux                                    # SoftWEAR MUX module.
+from BufferModule import SampleBuffer                           # SoftWEAR sample ring buffer.
+from SchedulerModule import Ticker, loopJitter                  # SoftWEAR monotonic loop deadlines.
 
 # Mux Module to switch channels
 MuxModule = GetMux()
@@ -23,6 +27,31 @@ IDENTIFIER = BNO055_DRIVER.BNO055_ID
 BNO055_ADDRESS    = [0x28, 0x29]
 BNO055_BUSNUM     = [1, 2]
 
+# Read all data registers in one transaction instead of one per sensor
+BURST_READ = True
+
+# Data registers 0x08 - 0x34: acc, mag, gyr, eul, qua (w, x, y, z), lia and grv (skipped), temp
+BURST_ADDRESS = BNO055_DRIVER.BNO055_ACCEL_DATA_X_LSB_ADDR
+BURST_FORMAT = struct.Struct('<3h3h3h3h4h12xb')
+
+# Byte ranges of the sensors in the burst
+BURST_ACC = (0, 6)
+BURST_MAG = (6, 12)
+BURST_GYR = (12, 18)
+BURST_EUL = (18, 24)
+BURST_QUA = (24, 32)
+BURST_TEM = (44, 45)
+
+# Scales of the raw register values
+QUA_SCALE = 1.0 / (1 << 14)
+
+# Modes providing the sensors
+ACC_MODES = ['ACCONLY', 'ACCMAG', 'ACCGYRO', 'AMG', 'IMU', 'COMPASS', 'M4G', 'NDOF_FMC_OFF', 'NDOF']
+MAG_MODES = ['MAGONLY', 'ACCMAG', 'MAGGYRO', 'AMG', 'COMPASS', 'M4G', 'NDOF_FMC_OFF', 'NDOF']
+GYR_MODES = ['GYRONLY', 'ACCGYRO', 'MAGGYRO', 'AMG', 'IMU', 'NDOF_FMC_OFF', 'NDOF']
+EUL_MODES = ['IMU', 'COMPASS', 'M4G', 'NDOF_FMC_OFF', 'NDOF', '*EULONLY']
+QUA_MODES = ['IMU', 'COMPASS', 'M4G', 'NDOF_FMC_OFF', 'NDOF', '*QUATONLY']
+
 
 # Mode Map
 MODE_MAP = {
@@ -123,6 +152,10 @@ class BNO055:
     # Data range for values
     _dataRange = []
 
+    # Resolution of the values (step of the raw register values of every dimension)
+    _dataResolution = [1 / 100., 1 / 100., 1 / 100., 1 / 16., 1 / 16., 1 / 16., 1 / 900., 1 / 900., 1 / 900.,
+                       1 / 16., 1 / 16., 1 / 16., QUA_SCALE, QUA_SCALE, QUA_SCALE, QUA_SCALE, 1.]
+
     # Value to set
     _currentValue = 0
 
@@ -153,6 +186,12 @@ class BNO055:
     # Duration needed for an update cycle
     _cycleDuration = 0
 
+    # Byte range of the burst read for the active mode and flags
+    _burstRange = (0, BURST_FORMAT.size)
+
+    # Buffer for the burst read
+    _burst = None
+
     # Address of the driver
     _address = None
 
@@ -178,16 +217,18 @@ class BNO055:
             self._muxName = muxName                                 # Set mux name
             self._muxedChannel = muxedChannel                       # Set muxed pin
 
-            self._values = []                                       # Set empty values array
+            self._values = SampleBuffer(self._dim)                  # Set empty sample buffer
 
             self._mode = self._settings['modes'][0]                 # Set default mode
             #########################################################
             # self._mode = self._settings['modes'][<NDOF_INDEX>]    # USE THIS LINE FOR NDOF
             #########################################################
             self._flags = []                                        # Set default flag list
+            self._burst = bytearray(BURST_FORMAT.size)              # Set burst buffer
+            self._updateBurstRange()                                # Set burst range for the mode
             # self._bno = BNO055_DRIVER.BNO055(rst='P9_12')         # Use that line for hardware reset pin
                                                                     # otherwise software reset is used
-            self._bno = BNO055_DRIVER.BNO055(address=self._address,busnum=self._busnum) # Create the driver object
+            self._bno = BNO055_DRIVER.BNO055(address=self._address,busnum=self._busnum,i2c=I2C) # Create the driver object
 
             self._connected = self._bno.begin()                     # Connect to the device
             #####################################################
@@ -223,7 +264,7 @@ class BNO055:
         self.LOCK.release()                                     # Release driver
         return self._connected
 
-    def configureDevice(self):
+    def configureDevice(self, startThread=True):
         """Once the device is connected, it must be configured."""
         try:
             if (self._muxedChannel != None):
@@ -236,69 +277,111 @@ class BNO055:
                 MuxModule.deactivate(self._muxName)             # Deactivate mux
             raise IOError('Error on i2c device while switching mode')
         self._threadActive = True                               # Set thread active flag
-        self._thread = threading.Thread(target=self._loop, name=self._name) # Create thread
-        self._thread.daemon = True                              # Set thread as daemonic
-        self._thread.start()                                    # Start thread
+        if startThread:                                         # Otherwise the bus scheduler calls update()
+            self._thread = threading.Thread(target=self._loop, name=self._name) # Create thread
+            self._thread.daemon = True                          # Set thread as daemonic
+            self._thread.start()                                # Start thread
 
     def _loop(self):
         """Inner loop of the driver."""
+        ticker = Ticker(self._period, jitter=loopJitter)        # Deadlines of the loop
         while True:
-            beginT = time.time()                                # Save start time of loop cycle
-            deltaT = 0
+            self.update()                                       # Read/write the device
 
-            self.LOCK.acquire()                                 # Lock the driver for loop
-            if (self._muxedChannel != None):
-                MuxModule.activate(self._muxName, self._muxedChannel) # Activate mux channel
-            try:
-                acc = [None,None,None]
-                mag = [None,None,None]
-                gyr = [None,None,None]
-                eul = [None,None,None]
-                qua = [None,None,None,None]
-                tem = [None]
-                if self._mode in ['ACCONLY', 'ACCMAG', 'ACCGYRO', 'AMG', 'IMU', 'COMPASS', 'M4G', 'NDOF_FMC_OFF', 'NDOF']:
+            ticker.setPeriod(self._period)                      # Follow frequency changes
+            ticker.wait()                                       # Sleep until the next deadline
+
+            if not self._threadActive:                          # Stop the thread
+                return
+
+    def update(self):
+        """Read/write the device once, used by the inner loop or the bus scheduler. Return the time used."""
+        beginT = time.time()                                    # Save start time of loop cycle
+        deltaT = 0
+
+        self.LOCK.acquire()                                     # Lock the driver for loop
+        if (self._muxedChannel != None):
+            MuxModule.activate(self._muxName, self._muxedChannel) # Activate mux channel
+        try:
+            acc = [None,None,None]
+            mag = [None,None,None]
+            gyr = [None,None,None]
+            eul = [None,None,None]
+            qua = [None,None,None,None]
+            tem = [None]
+            if BURST_READ:
+                start, end = self._burstRange
+                data = self._bno.read_burst(BURST_ADDRESS + start, end - start) # Read all data at once
+                if len(data) != end - start:
+                    raise IOError('Incomplete burst read')
+                self._burst[start:end] = data
+                raw = BURST_FORMAT.unpack_from(self._burst)     # Decode all registers
+                if self._mode in ACC_MODES:
+                    acc = [raw[0] / 100., raw[1] / 100., raw[2] / 100.]
+                if self._mode in MAG_MODES:
+                    mag = [raw[3] / 16., raw[4] / 16., raw[5] / 16.]
+                if self._mode in GYR_MODES:
+                    gyr = [raw[6] / 900., raw[7] / 900., raw[8] / 900.]
+                if self._mode in EUL_MODES:
+                    eul = [raw[9] / 16., raw[10] / 16., raw[11] / 16.]
+                if self._mode in QUA_MODES:                     # Same order as read_quaternion: x, y, z, w
+                    qua = [raw[13] * QUA_SCALE, raw[14] * QUA_SCALE, raw[15] * QUA_SCALE, raw[12] * QUA_SCALE]
+                if 'TEMPERATURE' in self._flags:
+                    tem = [raw[16]]
+            else:
+                if self._mode in ACC_MODES:
                     acc = list(self._bno.read_accelerometer())  # Get acc data
-                if self._mode in ['MAGONLY', 'ACCMAG', 'MAGGYRO', 'AMG', 'COMPASS', 'M4G', 'NDOF_FMC_OFF', 'NDOF']:
+                if self._mode in MAG_MODES:
                     mag = list(self._bno.read_magnetometer())   # Get mag data
-                if self._mode in ['GYRONLY', 'ACCGYRO', 'MAGGYRO', 'AMG', 'IMU', 'NDOF_FMC_OFF', 'NDOF']:
+                if self._mode in GYR_MODES:
                     gyr = list(self._bno.read_gyroscope())      # Get gyr data
-                if self._mode in ['IMU', 'COMPASS', 'M4G', 'NDOF_FMC_OFF', 'NDOF', '*EULONLY']:
+                if self._mode in EUL_MODES:
                     eul = list(self._bno.read_euler())          # Get eul data
-                if self._mode in ['IMU', 'COMPASS', 'M4G', 'NDOF_FMC_OFF', 'NDOF', '*QUATONLY']:
+                if self._mode in QUA_MODES:
                     qua = list(self._bno.read_quaternion())     # Get qua data
                 if 'TEMPERATURE' in self._flags:
                     tem = [self._bno.read_temp()]               # Get tem data
-                self._currentValue = acc + mag + gyr + eul + qua + tem
+            self._currentValue = acc + mag + gyr + eul + qua + tem
 
-                self._values.append([time.time(), self._currentValue]) # Save timestamp and value
+            self._values.append(time.time(), self._currentValue) # Save timestamp and value
 
-                endT = time.time()                              # Save start time of loop cycle
-                deltaT = endT - beginT                          # Calculate time used for loop cycle
-                self._cycleDuration = deltaT                    # Save time needed for a cycle
-
-            except:
-                self._connected = False                         # Device disconnected
-
-            if (self._muxedChannel != None):
-                MuxModule.deactivate(self._muxName)             # Deactivate mux
-            self.LOCK.release()                                 # Release driver
+            endT = time.time()                                  # Save start time of loop cycle
+            deltaT = endT - beginT                              # Calculate time used for loop cycle
+            self._cycleDuration = deltaT                        # Save time needed for a cycle
 
+        except:
+            self._connected = False                             # Device disconnected
 
-            if (deltaT < self._period):
-                time.sleep(self._period - deltaT)               # Sleep until next loop period
+        if (self._muxedChannel != None):
+            MuxModule.deactivate(self._muxName)                 # Deactivate mux
+        self.LOCK.release()                                     # Release driver
 
-
-            if not self._threadActive:                          # Stop the thread
-                return
+        return deltaT
+
+    def _updateBurstRange(self):
+        """Limit the burst read to the registers needed by the mode and flags."""
+        ranges = []
+        if self._mode in ACC_MODES:
+            ranges.append(BURST_ACC)
+        if self._mode in MAG_MODES:
+            ranges.append(BURST_MAG)
+        if self._mode in GYR_MODES:
+            ranges.append(BURST_GYR)
+        if self._mode in EUL_MODES:
+            ranges.append(BURST_EUL)
+        if self._mode in QUA_MODES:
+            ranges.append(BURST_QUA)
+        if 'TEMPERATURE' in self._flags:
+            ranges.append(BURST_TEM)
+        if len(ranges) == 0:
+            ranges.append(BURST_ACC)
+        self._burstRange = (min([r[0] for r in ranges]), max([r[1] for r in ranges]))
 
     def getValues(self, clear=True):
         """Get values for the i2c device."""
         if self._values == None:                                # Return empty array for no values
             return []
-        values = self._values[:]                                # Get the values
-        if clear:
-            self._values = []                                   # Reset values
-        return values                                           # Return the values
+        return self._values.take(clear)                         # Return the values (columnar copy)
 
 
     def getDevice(self):
@@ -339,7 +422,8 @@ class BNO055:
             'dimMap': self._dimMap[:],
             'dimUnit': self._dimUnit[:],
             'dataType': self._dataType,
-            'dataRange': self._dataRange[:]
+            'dataRange': self._dataRange[:],
+            'dataResolution': self._dataResolution[:]
         }
 
     def getSettings(self):
@@ -358,6 +442,7 @@ class BNO055:
         """Set device mode."""
         if (mode in self._settings['modes']):
             self._mode = mode
+            self._updateBurstRange()                                # Adapt burst read to the mode
             try:
                 if (self._muxedChannel != None):
                     MuxModule.activate(self._muxName, self._muxedChannel) # Activate mux channel
@@ -386,9 +471,14 @@ class BNO055:
                 self._flags.append(flag)                            # Add the flag
             else:
                 self._flags.remove(flag)                            # Remove the flag
+            self._updateBurstRange()                                # Adapt burst read to the flags
         else:
             raise ValueError('flag {} is not allowed'.format(flag))
 
+    def getPeriod(self):
+        """Return device period in seconds."""
+        return self._period
+
     def getFrequency(self):
         """Return device frequency."""
         return self._frequency
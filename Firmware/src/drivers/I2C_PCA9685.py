@@ -5,12 +5,19 @@
 Driver file for the PCA9685 16-channel PWM controller. Communicates
 with the device via I2C and implements the basic functions for integrating into
 the SoftWEAR package.
+
+    Only the channels changed since the last write are written. Consecutive channels
+    are written in one auto-increment block transfer and equal duties on all channels
+    with a single write of the ALL_LED registers.
 """
 import time                                                     # Imported for delay reasons
 import drivers._PCA9685 as PCA9685_DRIVER                       # Import official driver
+from HardwareModule import I2C                                  # SoftWEAR Hardware module.
 import threading                                                # Threading class for the threads
 
 from MuxModule import GetMux                                    # SoftWEAR MUX module.
+from BufferModule import SampleBuffer                           # SoftWEAR sample ring buffer.
+from SchedulerModule import Ticker, loopJitter                  # SoftWEAR monotonic loop deadlines.
 
 # Mux Module to switch channels
 MuxModule = GetMux()
@@ -18,6 +25,9 @@ MuxModule = GetMux()
 # Constants
 PCA9685_ADDRESS    = [0x40]
 PCA9685_BUSNUM     = [1, 2]
+PCA9685_CHANNELS   = 16
+PCA9685_RESOLUTION = 4096
+PCA9685_FULL       = 0x1000                                     # Full on/off bit of the ON/OFF registers
 
 
 
@@ -104,8 +114,8 @@ class PCA9685:
     # Value history
     _values = None
 
-    # Flag whether the values needs to be updated
-    _update = True
+    # Flags whether the value of a channel needs to be written
+    _dirty = None
 
     # Mode
     _mode = None
@@ -156,13 +166,14 @@ class PCA9685:
             self._muxName = muxName                             # Set mux name
 
             self._currentValue = [0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0] # Initialize current value
-            self._values = []                                   # Set empty values array
+            self._dirty = [True] * PCA9685_CHANNELS             # Write all channels once
+            self._values = SampleBuffer(self._dim)              # Set empty sample buffer
 
             self._dutyFrequency = self._settings['dutyFrequencies'][7] # Set default dutyFrequency
             #self._mode = self._settings['modes'][0]             # Set default mode
             self._flags = []                                    # Set default flag list
 
-            self._pca = PCA9685_DRIVER.PCA9685(address=self._address,busnum=self._busnum) # Create the driver object
+            self._pca = PCA9685_DRIVER.PCA9685(address=self._address,busnum=self._busnum,i2c=I2C) # Create the driver object
             if (muxedChannel != None):
                 MuxModule.deactivate(muxName)                   # Deactivate mux
         except:
@@ -197,69 +208,76 @@ class PCA9685:
             self.LOCK.release()                                 # Release driver
         return self._connected
 
-    def configureDevice(self):
+    def configureDevice(self, startThread=True):
         """Once the device is connected, it must be configured."""
         # Device gets configured already at initialization, therefore no need to configure further
         self._threadActive = True                               # Set thread active flag
-        self._thread = threading.Thread(target=self._loop, name=self._name) # Create thread
-        self._thread.daemon = True                              # Set thread as daemonic
-        self._thread.start()                                    # Start thread
+        if startThread:                                         # Otherwise the bus scheduler calls update()
+            self._thread = threading.Thread(target=self._loop, name=self._name) # Create thread
+            self._thread.daemon = True                          # Set thread as daemonic
+            self._thread.start()                                # Start thread
 
     def _loop(self):
         """Inner loop of the driver."""
+        ticker = Ticker(self._period, jitter=loopJitter)        # Deadlines of the loop
         while True:
-            beginT = time.time()                                # Save start time of loop cycle
+            self.update()                                       # Read/write the device
 
-            try:
-                self.LOCK.acquire()                             # Lock the driver for loop
-                if (self._muxedChannel != None):
-                    MuxModule.activate(self._muxName, self._muxedChannel) # Activate mux channel
-                if self._update:
-                    if 'INVERSE_PARITY' in self._flags:         # Check for parity flag
-                        for i, val in enumerate(self._currentValue): # Loop all values
-                            setDuty(self._pca, i, 100. - val)   # Set duty for channel
-                    else:
-                        for i, val in enumerate(self._currentValue): # Loop all values
-                            setDuty(self._pca, i, val)          # Set duty for channel
+            ticker.setPeriod(self._period)                      # Follow frequency changes
+            ticker.wait()                                       # Sleep until the next deadline
 
+            if not self._threadActive:                          # Stop the thread
+                return
 
-                    self._update = False                        # Clear update flag
-
-                self._values.append([time.time(), self._currentValue]) # Save timestamp and value
-
-                endT = time.time()                              # Save start time of loop cycle
-                deltaT = endT - beginT                          # Calculate time used for loop cycle
-                self._cycleDuration = deltaT                    # Save time needed for a cycle
+    def update(self):
+        """Read/write the device once, used by the inner loop or the bus scheduler. Return the time used."""
+        beginT = time.time()                                    # Save start time of loop cycle
+        deltaT = 0
 
-                if (self._muxedChannel != None):
-                    MuxModule.deactivate(self._muxName)         # Deactivate mux
-                self.LOCK.release()                             # Release driver
-            except:
-                self._connected = False                         # Device disconnected
-                if (self._muxedChannel != None):
-                    MuxModule.deactivate(self._muxName)         # Deactivate mux
-                self.LOCK.release()                             # Release driver
+        try:
+            self.LOCK.acquire()                                 # Lock the driver for loop
+            if (self._muxedChannel != None):
+                MuxModule.activate(self._muxName, self._muxedChannel) # Activate mux channel
+            channels = [i for i, dirty in enumerate(self._dirty) if dirty] # Channels changed since the last write
+            if len(channels) > 0:
+                for i in channels:
+                    self._dirty[i] = False                      # Values set from now on are written next time
+                if 'INVERSE_PARITY' in self._flags:             # Check for parity flag
+                    duties = [100. - val for val in self._currentValue]
+                else:
+                    duties = self._currentValue[:]
+                setDuties(self._pca, channels, duties)          # Write the changed channels
+
+            self._values.append(time.time(), self._currentValue) # Save timestamp and value
+
+            endT = time.time()                                  # Save start time of loop cycle
+            deltaT = endT - beginT                              # Calculate time used for loop cycle
+            self._cycleDuration = deltaT                        # Save time needed for a cycle
 
-            if (deltaT < self._period):
-                time.sleep(self._period - deltaT)               # Sleep until next loop period
+            if (self._muxedChannel != None):
+                MuxModule.deactivate(self._muxName)             # Deactivate mux
+            self.LOCK.release()                                 # Release driver
+        except:
+            self._connected = False                             # Device disconnected
+            self._dirty = [True] * PCA9685_CHANNELS             # Write all channels again once reconnected
+            if (self._muxedChannel != None):
+                MuxModule.deactivate(self._muxName)             # Deactivate mux
+            self.LOCK.release()                                 # Release driver
 
-            if not self._threadActive:                          # Stop the thread
-                return
+        return deltaT
 
     def getValues(self, clear=True):
         """Get values for the i2c device."""
         if self._values == None:                                # Return empty array for no values
             return []
-        values = self._values[:]                                # Get the values
-        if clear:
-            self._values = []                                   # Reset values
-        return values                                           # Return the values
+        return self._values.take(clear)                         # Return the values (columnar copy)
 
     def setValue(self, dim, value):
         """Set values for the i2c device."""
-        self._currentValue[dim] = min(100., max(0., value))     # Get the value and update the dim current value of the driver
-                                                                # Value is limited to range [0,100]
-        self._update = True                                     # Raise update flag
+        value = min(100., max(0., value))                       # Value is limited to range [0,100]
+        if value != self._currentValue[dim]:
+            self._currentValue[dim] = value                     # Update the dim current value of the driver
+            self._dirty[dim] = True                             # Mark the channel for the next write
 
 
     def getDevice(self):
@@ -334,10 +352,14 @@ class PCA9685:
                 self._flags.append(flag)                            # Add the flag
             else:
                 self._flags.remove(flag)                            # Remove the flag
-            self._update = True                                     # Raise update flag
+            self._dirty = [True] * PCA9685_CHANNELS                 # Write all channels
         else:
             raise ValueError('flag {} is not allowed'.format(flag))
 
+    def getPeriod(self):
+        """Return device period in seconds."""
+        return self._period
+
     def getFrequency(self):
         """Return device frequency."""
         return self._frequency
@@ -362,7 +384,7 @@ class PCA9685:
                     MuxModule.activate(self._muxName, self._muxedChannel) # Activate mux channel
                 self._dutyFrequency = dutyFrequency
                 self._pca.set_pwm_freq(int(self._dutyFrequency[:-3]))
-                self._update = True                             # Raise update flag
+                self._dirty = [True] * PCA9685_CHANNELS         # Write all channels
                 if (self._muxedChannel != None):
                     MuxModule.deactivate(self._muxName)         # Deactivate mux
             except:
@@ -383,9 +405,21 @@ class PCA9685:
                 muxedChannel == self._muxedChannel)
 
 
-def setDuty(pca, channel, duty):
-    """Help function to make setting a duty width simpler."""
-    res = 4096                                                      # 12 bits of resolution
-    on = 0                                                          # Duty on
-    off = int(duty / 100. * res)                                    # Duty off
-    pca.set_pwm(channel, on, off)                                   # Send the values to the pca
+def dutyCounts(duty):
+    """Return the (on, off) counts of a duty in percent."""
+    off = int(duty / 100. * PCA9685_RESOLUTION)                     # Duty off
+    if off >= PCA9685_RESOLUTION:
+        return (PCA9685_FULL, 0)                                    # Full on, a count of 4096 would switch it off
+    return (0, off)
+
+def setDuties(pca, channels, duties):
+    """Write the duties of the sorted channels, consecutive channels in one block and equal duties at once."""
+    counts = [dutyCounts(duty) for duty in duties]
+    if len(channels) > 1 and counts.count(counts[0]) == len(counts): # All channels have the same duty
+        pca.set_all_pwm(*counts[0])
+        return
+    start = 0
+    for i in range(1, len(channels) + 1):
+        if i == len(channels) or channels[i] != channels[i - 1] + 1: # End of a run of consecutive channels
+            pca.set_pwm_block(channels[start], counts[channels[start]:channels[i - 1] + 1])
+            start = i
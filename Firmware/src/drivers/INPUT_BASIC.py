@@ -4,13 +4,21 @@
 """
 Driver file for the BASIC INPUT. Read the value from a input pin for integrating into
 the SoftWEAR package.
+
+    The 'State', 'Rising Edge' and 'Falling Edge' modes sample the pin periodically at
+    the frequency. The 'Edges' mode uses the edge detection of the pin instead: every
+    debounced edge is recorded immediately with its timestamp and new level, and the
+    thread of the driver sleeps as long as the pin does not change.
 """
 #import Adafruit_GPIO.AdafruitBBIOAdapter as AdafruitBBIOAdapter # Main peripheral class. Implements GPIO read out
-import Adafruit_BBIO.GPIO as GPIO
+from HardwareModule import GPIO                                 # SoftWEAR Hardware module.
+from Config import GPIO_DEBOUNCE                                # SoftWEAR Config module.
 import threading                                                # Threading class for the threads
 import time                                                     # Required for controllng the sampling period
 
 from MuxModule import GetMux                                    # SoftWEAR MUX module.
+from BufferModule import SampleBuffer                           # SoftWEAR sample ring buffer.
+from SchedulerModule import Ticker, loopJitter                  # SoftWEAR monotonic loop deadlines.
 
 # Create a MUX shadow instance as there is only one Mux
 MuxModule = GetMux()
@@ -63,7 +71,7 @@ class InputBasic:
             '60 Hz',
             '100 Hz'
         ],
-        'modes': ['State', 'Rising Edge', 'Falling Edge']
+        'modes': ['State', 'Rising Edge', 'Falling Edge', 'Edges']
     }
 
     # Data type of values
@@ -99,6 +107,12 @@ class InputBasic:
     # Thread for the inner loop
     _thread = None
 
+    # Event waking the thread when the mode changes or the driver is cleaned up
+    _wake = None
+
+    # Lock for the sample buffer, the edges are recorded from the callback thread
+    _lock = None
+
     # Duration needed for an update cycle
     _cycleDuration = 0
 
@@ -108,13 +122,18 @@ class InputBasic:
         self._pin = pin                                         # Set pin
         self._muxedPin = muxedPin                               # Set muxed pin
         self._muxName = muxName                                 # Set mux name
-        self._values = []                                       # Set empty values array
+        self._values = SampleBuffer(self._dim)                  # Set empty sample buffer
         self._mode = self._settings['modes'][0]                 # Set default mode
         self._flags = []                                        # Set default flag list
+        self._wake = threading.Event()                          # Set wake event
+        self._lock = threading.Lock()                           # Set buffer lock
 
     def cleanup(self):
         """Clean up driver when no longer needed."""
         self._threadActive = False                              # Unset thread active flag
+        if self._mode == 'Edges':
+            GPIO.remove_event_detect(self._pin)                 # No more edges for this driver
+        self._wake.set()                                        # Wake the thread to terminate
 
 
     def getDeviceConnected(self):
@@ -131,7 +150,16 @@ class InputBasic:
 
     def _loop(self):
         """Inner loop of the driver."""
+        ticker = Ticker(self._period, jitter=loopJitter)        # Deadlines of the loop
         while True:
+            if self._mode == 'Edges':                           # Edges are recorded by the callback
+                self._wake.wait()                               # Sleep until the mode changes
+                self._wake.clear()
+                if not self._threadActive:                      # Stop the thread
+                    return
+                ticker = Ticker(self._period, jitter=loopJitter) # Restart the deadlines
+                continue
+
             beginT = time.time()                                # Save start time of loop cycle
 
             if self._mode == 'State':
@@ -146,25 +174,32 @@ class InputBasic:
                 else:
                     self._currentValue = 0                      # Return 0 for no event
 
-            self._values.append([time.time(), [self._currentValue]]) # Save timestamp and value
+            with self._lock:
+                if self._mode != 'Edges':                       # The callback records from now on
+                    self._values.append(time.time(), [self._currentValue]) # Save timestamp and value
 
             endT = time.time()                                  # Save start time of loop cycle
             deltaT = endT - beginT                              # Calculate time used for loop cycle
             self._cycleDuration = deltaT                        # Save time needed for a cycle
-            if (deltaT < self._period):
-                time.sleep(self._period - deltaT)               # Sleep until next loop period
+            ticker.setPeriod(self._period)                      # Follow frequency changes
+            ticker.wait()                                       # Sleep until the next deadline
 
             if not self._threadActive:                          # Stop the thread
                 return
 
+    def _edge(self, pin):
+        """Record the timestamp and new level of a debounced edge (called by the edge detection)."""
+        with self._lock:                                        # Timestamps stay ordered with the loop
+            beginT = time.time()                                # Timestamp of the edge
+            self._currentValue = GPIO.input(self._pin)          # Level after the edge
+            self._values.append(beginT, [self._currentValue])   # Save timestamp and value
+        self._cycleDuration = time.time() - beginT              # Save time needed to record the edge
+
     def getValues(self, clear=True):
         """Get values for the basic input device."""
         if self._values == None:                                # Return empty array for no values
             return []
-        values = self._values[:]                                # Get the values
-        if clear:
-            self._values = []                                   # Reset values
-        return values                                           # Return the values
+        return self._values.take(clear)                         # Return the values (columnar copy)
 
 
 
@@ -222,8 +257,11 @@ class InputBasic:
 
     def setMode(self, mode):
         """Set device mode."""
+        if mode == 'Edges' and self._muxedPin != None:          # Edges of muxed pins can not be detected
+            raise ValueError('mode {} is not allowed'.format(mode))
         if (mode in self._settings['modes']):
             self._mode = mode
+            self._wake.set()                                    # Wake the thread to follow the mode
             if mode == 'State':
                 GPIO.remove_event_detect(self._pin)                 # Remove event detection
             elif mode == 'Rising Edge':
@@ -232,6 +270,10 @@ class InputBasic:
             elif mode == 'Falling Edge':
                 GPIO.remove_event_detect(self._pin)                 # Remove event detection
                 GPIO.add_event_detect(self._pin, GPIO.FALLING)      # Set falling edge detection
+            elif mode == 'Edges':
+                GPIO.remove_event_detect(self._pin)                 # Remove event detection
+                self._edge(self._pin)                               # Record the current level
+                GPIO.add_event_detect(self._pin, GPIO.BOTH, callback=self._edge, bouncetime=GPIO_DEBOUNCE) # Set debounced edge detection
         else:
             raise ValueError('mode {} is not allowed'.format(mode))
 
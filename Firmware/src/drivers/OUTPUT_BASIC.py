@@ -4,10 +4,13 @@
 """
 Driver file for the BASIC OUTPUT. Set the value of a output pin for integrating into the SoftWEAR package.
 """
-import Adafruit_BBIO.GPIO as GPIO
+from HardwareModule import GPIO                                 # SoftWEAR Hardware module.
 import threading                                                # Threading class for the threads
 import time                                                     # Required for controllng the sampling period
 
+from BufferModule import SampleBuffer                           # SoftWEAR sample ring buffer.
+from SchedulerModule import Ticker, loopJitter                  # SoftWEAR monotonic loop deadlines.
+
 
 class OutputBasic:
     """Driver for BASIC OUTPUT."""
@@ -95,7 +98,7 @@ class OutputBasic:
     def __init__(self, pin):
         """Device supports a pin."""
         self._pin = pin                                         # Set pin
-        self._values = []                                       # Set empty values array
+        self._values = SampleBuffer(self._dim)                  # Set empty sample buffer
         self._flags = []                                        # Set default flag list
 
     def cleanup(self):
@@ -118,6 +121,7 @@ class OutputBasic:
 
     def _loop(self):
         """Inner loop of the driver."""
+        ticker = Ticker(self._period, jitter=loopJitter)        # Deadlines of the loop
         while True:
             beginT = time.time()                                # Save start time of loop cycle
 
@@ -127,13 +131,13 @@ class OutputBasic:
                 else:                                           # Set output to LOW
                     GPIO.output(self._pin, GPIO.LOW)
                 self._update = False
-            self._values.append([time.time(), [self._currentValue]]) # Save timestamp and value
+            self._values.append(time.time(), [self._currentValue]) # Save timestamp and value
 
             endT = time.time()                                  # Save start time of loop cycle
             deltaT = endT - beginT                              # Calculate time used for loop cycle
             self._cycleDuration = deltaT                        # Save time needed for a cycle
-            if (deltaT < self._period):
-                time.sleep(self._period - deltaT)               # Sleep until next loop period
+            ticker.setPeriod(self._period)                      # Follow frequency changes
+            ticker.wait()                                       # Sleep until the next deadline
 
             if not self._threadActive:                          # Stop the thread
                 return
@@ -142,10 +146,7 @@ class OutputBasic:
         """Get values for the basic output device."""
         if self._values == None:                                # Return empty array for no values
             return []
-        values = self._values[:]                                # Get the values
-        if clear:
-            self._values = []                                   # Reset values
-        return values                                           # Return the values
+        return self._values.take(clear)                         # Return the values (columnar copy)
 
     def setValue(self, dim, value):
         """Set values for the basic output device."""
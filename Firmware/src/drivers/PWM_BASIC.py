@@ -4,10 +4,13 @@
 """
 Driver file for the BASIC PWM. Set the value of a pwm pin for integrating into the SoftWEAR package.
 """
-import Adafruit_BBIO.PWM as PWM
+from HardwareModule import PWM                                  # SoftWEAR Hardware module.
 import threading                                                # Threading class for the threads
 import time                                                     # Required for controllng the sampling period
 
+from BufferModule import SampleBuffer                           # SoftWEAR sample ring buffer.
+from SchedulerModule import Ticker, loopJitter                  # SoftWEAR monotonic loop deadlines.
+
 class PWMBasic:
     """Driver for BASIC PWM."""
 
@@ -117,7 +120,7 @@ class PWMBasic:
     def __init__(self, pin, changeDutyFrequency):
         """Device supports a pin."""
         self._pin = pin                                         # Set pin
-        self._values = []                                       # Set empty values array
+        self._values = SampleBuffer(self._dim)                  # Set empty sample buffer
         self._dutyFrequency = self._settings['dutyFrequencies'][-1] # Set default duty frequency
         self._flags = []                                        # Set default flag list
         self._changeDutyFrequency = changeDutyFrequency         # Test if change duty frequency is available
@@ -144,6 +147,7 @@ class PWMBasic:
 
     def _loop(self):
         """Inner loop of the driver."""
+        ticker = Ticker(self._period, jitter=loopJitter)        # Deadlines of the loop
         while True:
             beginT = time.time()                                # Save start time of loop cycle
 
@@ -154,13 +158,13 @@ class PWMBasic:
                     PWM.set_duty_cycle(self._pin, self._currentValue) # Set duty cycle
                 self._update = False
 
-            self._values.append([time.time(), [self._currentValue]]) # Save timestamp and value
+            self._values.append(time.time(), [self._currentValue]) # Save timestamp and value
 
             endT = time.time()                                  # Save start time of loop cycle
             deltaT = endT - beginT                              # Calculate time used for loop cycle
             self._cycleDuration = deltaT                        # Save time needed for a cycle
-            if (deltaT < self._period):
-                time.sleep(self._period - deltaT)               # Sleep until next loop period
+            ticker.setPeriod(self._period)                      # Follow frequency changes
+            ticker.wait()                                       # Sleep until the next deadline
 
             if not self._threadActive:                          # Stop the thread
                 return
@@ -169,10 +173,7 @@ class PWMBasic:
         """Get values for the basic pwm device."""
         if self._values == None:                                # Return empty array for no values
             return []
-        values = self._values[:]                                # Get the values
-        if clear:
-            self._values = []                                   # Reset values
-        return values                                           # Return the values
+        return self._values.take(clear)                         # Return the values (columnar copy)
 
     def setValue(self, dim, value):
         """Set values for the basic pwm device."""
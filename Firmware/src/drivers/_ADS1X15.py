@@ -102,9 +102,9 @@ class ADS1x15(object):
         """
         raise NotImplementedError('Subclass must implement _conversion_value function!')
 
-    def _read(self, mux, gain, data_rate, mode):
-        """Perform an ADC read with the provided mux, gain, data_rate, and mode
-        values.  Returns the signed integer result of the read.
+    def _config(self, mux, gain, data_rate, mode):
+        """Build the config register value starting a conversion with the
+        provided mux, gain, data_rate, and mode values.
         """
         config = ADS1x15_CONFIG_OS_SINGLE  # Go out of power-down mode for conversion.
         # Specify mux value.
@@ -123,6 +123,15 @@ class ADS1x15(object):
         # between ADS1015 and ADS1115).
         config |= self._data_rate_config(data_rate)
         config |= ADS1x15_CONFIG_COMP_QUE_DISABLE  # Disble comparator mode.
+        return config
+
+    def _read(self, mux, gain, data_rate, mode):
+        """Perform an ADC read with the provided mux, gain, data_rate, and mode
+        values.  Returns the signed integer result of the read.
+        """
+        config = self._config(mux, gain, data_rate, mode)
+        if data_rate is None:
+            data_rate = self._data_rate_default()
         # Send the config value to start the ADC conversion.
         # Explicitly break the 16-bit value down to a big endian pair of bytes.
         self._device.writeList(ADS1x15_POINTER_CONFIG, [(config >> 8) & 0xFF, config & 0xFF])
@@ -191,6 +200,22 @@ class ADS1x15(object):
         # the highest bit (bit 3) set.
         return self._read(channel + 0x04, gain, data_rate, ADS1x15_CONFIG_MODE_SINGLE)
 
+    def start_conversion(self, channel, gain=1, data_rate=None):
+        """Start a single shot conversion on the channel (0-3) without waiting
+        for it.  Poll conversion_ready() and read the result with
+        get_last_result() once it is finished.
+        """
+        assert 0 <= channel <= 3, 'Channel must be a value within 0-3!'
+        config = self._config(channel + 0x04, gain, data_rate, ADS1x15_CONFIG_MODE_SINGLE)
+        self._device.writeList(ADS1x15_POINTER_CONFIG, [(config >> 8) & 0xFF, config & 0xFF])
+
+    def conversion_ready(self):
+        """Return True if no conversion is in progress (OS bit of the config
+        register).
+        """
+        result = self._device.readList(ADS1x15_POINTER_CONFIG, 2)
+        return (result[0] & 0x80) != 0
+
     def read_adc_difference(self, differential, gain=1, data_rate=None):
         """Read the difference between two ADC channels and return the ADC value
         as a signed integer result.  Differential must be one of:
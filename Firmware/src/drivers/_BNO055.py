@@ -24,7 +24,10 @@ import logging
 import struct
 import time
 
-import serial
+try:
+    import serial
+except ImportError:
+    serial = None  # Only needed for the UART interface.
 
 
 # I2C addresses
@@ -684,6 +687,12 @@ class BNO055(object):
         scale = (1.0 / (1<<14))
         return (x*scale, y*scale, z*scale, w*scale)
 
+    def read_burst(self, address, length):
+        """Return length bytes of consecutive registers starting at address,
+        read in a single transaction.
+        """
+        return self._read_bytes(address, length)
+
     def read_temp(self):
         """Return the current temperature in Celsius."""
         return self._read_signed_byte(BNO055_TEMP_ADDR)
@@ -40,10 +40,12 @@ ALL_LED_ON_L       = 0xFA
 ALL_LED_ON_H       = 0xFB
 ALL_LED_OFF_L      = 0xFC
 ALL_LED_OFF_H      = 0xFD
+BLOCK_SIZE         = 32  # Longest I2C block write (SMBus)
 
 # Bits:
 RESTART            = 0x80
 SLEEP              = 0x10
+AI                 = 0x20
 ALLCALL            = 0x01
 INVRT              = 0x10
 OUTDRV             = 0x04
@@ -62,9 +64,9 @@ class PCA9685:
             import Adafruit_GPIO.I2C as I2C
             i2c = I2C
         self._device = i2c.get_i2c_device(address, **kwargs)
-        self.set_all_pwm(0, 0)
         self._device.write8(MODE2, OUTDRV)
-        self._device.write8(MODE1, ALLCALL)
+        self._device.write8(MODE1, ALLCALL | AI)  # auto-increment for block writes
+        self.set_all_pwm(0, 0)
         time.sleep(0.005)  # wait for oscillator
         mode1 = self._device.readU8(MODE1)
         mode1 = mode1 & ~SLEEP  # wake up (reset sleep)
@@ -105,9 +107,14 @@ class PCA9685:
         self._device.write8(LED0_OFF_L+4*channel, off & 0xFF)
         self._device.write8(LED0_OFF_H+4*channel, off >> 8)
 
+    def set_pwm_block(self, channel, values):
+        """Set consecutive PWM channels from channel on to the (on, off) values in block writes."""
+        data = []
+        for on, off in values:
+            data += [on & 0xFF, on >> 8, off & 0xFF, off >> 8]
+        for start in range(0, len(data), BLOCK_SIZE):
+            self._device.writeList(LED0_ON_L+4*channel+start, data[start:start+BLOCK_SIZE])
+
     def set_all_pwm(self, on, off):
         """Set all PWM channels."""
-        self._device.write8(ALL_LED_ON_L, on & 0xFF)
-        self._device.write8(ALL_LED_ON_H, on >> 8)
-        self._device.write8(ALL_LED_OFF_L, off & 0xFF)
-        self._device.write8(ALL_LED_OFF_H, off >> 8)
+        self._device.writeList(ALL_LED_ON_L, [on & 0xFF, on >> 8, off & 0xFF, off >> 8])
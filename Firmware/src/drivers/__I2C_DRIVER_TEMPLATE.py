@@ -15,6 +15,8 @@ import time                                                     # Imported for d
 #################################################################import threading                                                # Threading class for the threads
 
 from MuxModule import GetMux                                    # SoftWEAR MUX module.
+from BufferModule import SampleBuffer                           # SoftWEAR sample ring buffer.
+from SchedulerModule import Ticker, loopJitter                  # SoftWEAR monotonic loop deadlines.
 
 # Mux Module to switch channels
 MuxModule = GetMux()
@@ -116,6 +118,9 @@ class <DRIVER>:
     # Data range for values
     _dataRange = <List of lower and upper bounds for the values ([]|[min,max])>
 
+    # Resolution of the values (optional, quantization step of every dimension)
+    _dataResolution = <List of the smallest value change of every dimension ([]|[step,...])>
+
     # Value to set
     _currentValue = 0
 
@@ -171,7 +176,7 @@ class <DRIVER>:
             self._muxName = muxName                                 # Set mux name
             self._muxedChannel = muxedChannel                       # Set muxed pin
 
-            self._values = []                                       # Set empty values array
+            self._values = SampleBuffer(self._dim)                  # Set empty sample buffer
 
             #########################################################
             # Depending on which types of settings are enabled uncomment lines
@@ -227,7 +232,7 @@ class <DRIVER>:
         self.LOCK.release()                                     # Release driver
         return self._connected
 
-    def configureDevice(self):
+    def configureDevice(self, startThread=True):
         """Once the device is connected, it must be configured."""
         try:
             if (self._muxedChannel != None):
@@ -244,59 +249,62 @@ class <DRIVER>:
                 MuxModule.deactivate(self._muxName)             # Deactivate mux
             raise IOError('<What Error?>')
         self._threadActive = True                               # Set thread active flag
-        self._thread = threading.Thread(target=self._loop, name=self._name) # Create thread
-        self._thread.daemon = True                              # Set thread as daemonic
-        self._thread.start()                                    # Start thread
+        if startThread:                                         # Otherwise the bus scheduler calls update()
+            self._thread = threading.Thread(target=self._loop, name=self._name) # Create thread
+            self._thread.daemon = True                          # Set thread as daemonic
+            self._thread.start()                                # Start thread
 
     def _loop(self):
         """Inner loop of the driver."""
+        ticker = Ticker(self._period, jitter=loopJitter)        # Deadlines of the loop
         while True:
-            beginT = time.time()                                # Save start time of loop cycle
-            deltaT = 0
+            self.update()                                       # Read/write the device
 
-            try:
-                self.LOCK.acquire()                             # Lock the driver for loop
-                if (self._muxedChannel != None):
-                    MuxModule.activate(self._muxName, self._muxedChannel) # Activate mux channel
+            ticker.setPeriod(self._period)                      # Follow frequency changes
+            ticker.wait()                                       # Sleep until the next deadline
 
-                #####################################################
-                # TODO:
-                # Implement data read/write function and store the value in self._currentValue
-                # You can use the flag self._update to check if new data is available
-                # Consider using try: .. except: ..
-                #####################################################
+            if not self._threadActive:                          # Stop the thread
+                return
 
-                self._values.append([time.time(), self._currentValue]) # Save timestamp and value
+    def update(self):
+        """Read/write the device once, used by the inner loop or the bus scheduler. Return the time used."""
+        beginT = time.time()                                    # Save start time of loop cycle
+        deltaT = 0
 
-                endT = time.time()                              # Save start time of loop cycle
-                deltaT = endT - beginT                          # Calculate time used for loop cycle
-                self._cycleDuration = deltaT                    # Save time needed for a cycle
+        try:
+            self.LOCK.acquire()                                 # Lock the driver for loop
+            if (self._muxedChannel != None):
+                MuxModule.activate(self._muxName, self._muxedChannel) # Activate mux channel
 
-                if (self._muxedChannel != None):
-                    MuxModule.deactivate(self._muxName)         # Deactivate mux
-                self.LOCK.release()                             # Release driver
-            except:
-                self._connected = False                         # Device disconnected
-                if (self._muxedChannel != None):
-                    MuxModule.deactivate(self._muxName)         # Deactivate mux
-                self.LOCK.release()                             # Release driver
+            #####################################################
+            # TODO:
+            # Implement data read/write function and store the value in self._currentValue
+            # You can use the flag self._update to check if new data is available
+            # Consider using try: .. except: ..
+            #####################################################
 
+            self._values.append(time.time(), self._currentValue) # Save timestamp and value
 
-            if (deltaT < self._period):
-                time.sleep(self._period - deltaT)               # Sleep until next loop period
+            endT = time.time()                                  # Save start time of loop cycle
+            deltaT = endT - beginT                              # Calculate time used for loop cycle
+            self._cycleDuration = deltaT                        # Save time needed for a cycle
 
+            if (self._muxedChannel != None):
+                MuxModule.deactivate(self._muxName)             # Deactivate mux
+            self.LOCK.release()                                 # Release driver
+        except:
+            self._connected = False                             # Device disconnected
+            if (self._muxedChannel != None):
+                MuxModule.deactivate(self._muxName)             # Deactivate mux
+            self.LOCK.release()                                 # Release driver
 
-            if not self._threadActive:                          # Stop the thread
-                return
+        return deltaT
 
     def getValues(self, clear=True):
         """Get values for the i2c device."""
         if self._values == None:                                # Return empty array for no values
             return []
-        values = self._values[:]                                # Get the values
-        if clear:
-            self._values = []                                   # Reset values
-        return values                                           # Return the values
+        return self._values.take(clear)                         # Return the values (columnar copy)
 
 
     def getDevice(self):
@@ -337,7 +345,8 @@ class <DRIVER>:
             'dimMap': self._dimMap[:],
             'dimUnit': self._dimUnit[:],
             'dataType': self._dataType,
-            'dataRange': self._dataRange[:]
+            'dataRange': self._dataRange[:],
+            'dataResolution': self._dataResolution[:]
         }
 
     def getSettings(self):
@@ -390,6 +399,10 @@ class <DRIVER>:
         else:
             raise ValueError('flag {} is not allowed'.format(flag))
 
+    def getPeriod(self):
+        """Return device period in seconds."""
+        return self._period
+
     def getFrequency(self):
         """Return device frequency."""
         ############################################################
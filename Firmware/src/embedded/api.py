@@ -8,6 +8,8 @@ Wearable Software Embedded API module. The Embedded API provided by this class i
 import json                                                     # Serializing class. All objects sent are serialized
 import logging                                                  # This class logs all info - so logging is imported
 import time                                                     # For delays in the background thread
+import ProtocolModule                                           # SoftWEAR Protocol module for the message queues
+from Config import SEND_QUEUE_SIZE, QUEUE_POLICY                # SoftWEAR Config module.
 
 class APIConnection():
     """API connection."""
@@ -27,16 +29,16 @@ class APIConnection():
     # The Application Port
     _port = 12345
 
-    # In Messages
+    # In Messages (from the Firmware, bounded for the data messages)
     _inMessages = None
 
-    # Out Messages
+    # Out Messages (to the Firmware)
     _outMessages = None
 
     def __init__(self):
         """Class constructor."""
-        self._inMessages = []
-        self._outMessages = []
+        self._inMessages = ProtocolModule.MessageQueue(SEND_QUEUE_SIZE, QUEUE_POLICY)
+        self._outMessages = ProtocolModule.MessageQueue()
 
 
     def __del__(self):
@@ -70,13 +72,23 @@ class APIConnection():
 
     def sendMessages(self, messages):
         """Send a data object to the remote host."""
-        self._outMessages = self._outMessages + messages
+        self._outMessages.putAll(messages)
 
     def getMessages(self):
         """Get a list of all the messages that have been recieved since the last call of this function."""
-        messages = self._inMessages
-        self._inMessages = []
-        return messages
+        return list(map(ProtocolModule.toJSON, self._inMessages.takeAll()))
+
+    def putMessages(self, messages):
+        """Queue messages of the Firmware (JSON strings or message dicts) for the loop."""
+        self._inMessages.putAll(messages)
+
+    def takeMessages(self):
+        """Take the messages of the loop for the Firmware."""
+        return self._outMessages.takeAll()
+
+    def getDropped(self):
+        """Get the number of data messages and samples dropped by the full queue."""
+        return self._inMessages.dropped()
 
     def getState(self):
         """Get the connection state."""
@@ -4,7 +4,7 @@
 """
 Driver file for the BASIC MUX. Switch for 8 mux channels.
 """
-import Adafruit_BBIO.GPIO as GPIO
+from HardwareModule import GPIO                                 # SoftWEAR Hardware module.
 import threading                                                # Threading class for the threads
 
 # Constants
@@ -41,6 +41,15 @@ class BasicMux8:
     # Detect pin
     _DETECT = None
 
+    # Selected channel (cached select pins)
+    _selectedChannel = None
+
+    # Number of select pin updates
+    _switches = 0
+
+    # Number of select pin updates elided because the channel was already selected
+    _elided = 0
+
     def __init__(self, pinConfig):
         """Initialize mux with pins (A,B,C,DETECT)."""
         if "A" not in pinConfig or pinConfig["A"] == None:
@@ -63,6 +72,9 @@ class BasicMux8:
         GPIO.setup(self._C, GPIO.OUT)                               # Init third select pin as output
         GPIO.output(self._C, GPIO.LOW)                              # Init third select pin to low
         GPIO.setup(self._DETECT, GPIO.IN, GPIO.PUD_DOWN)            # Init the detect pin and set it as input with pull down
+        self._selectedChannel = 0                                   # Select pins are low
+        self._switches = 0
+        self._elided = 0
 
     def cleanup(self):
         """Clean up driver when no longer needed."""
@@ -84,10 +96,15 @@ class BasicMux8:
     def activate(self, muxedPin):
         """Activate a MUX pin (0-#). Any future operations will happen on this selected channel."""
         # TODO: CHECK IF IT IS NEEDED TO WAIT A BIT
-        self.LOCK.acquire()
-
         if muxedPin < 0 or muxedPin > self._range - 1:          # Test parameter validity
             raise ValueError("Parameter error: the MUX has only 8 channels (0-7)")
+        self.LOCK.acquire()
+
+        if muxedPin == self._selectedChannel:                   # Channel is already selected
+            self._elided += 1
+            return
+        self._selectedChannel = muxedPin                        # Set channel
+        self._switches += 1
         if muxedPin & 4 == 4:                                   # Test MSB bit set?
             GPIO.output(self._C, GPIO.HIGH)                     # Reflect change on pin C (MSB)
         else:
@@ -108,6 +125,10 @@ class BasicMux8:
         # TODO: UNLOCK
         self.LOCK.release()
 
+    def getSwitchStats(self):
+        """Return the number of performed and elided channel switches."""
+        return {'switches': self._switches, 'elided': self._elided}
+
     def getName(self):
         """Return mux name."""
         return '{}@MUX[{},{},{}]'.format(self._name, self._A, self._B, self._C)
@@ -4,8 +4,7 @@
 """
 Driver file for the I2C TCA9548A MUX. Switch for 8 mux channels.
 """
-import Adafruit_GPIO.I2C as I2C
-import Adafruit_BBIO.GPIO as GPIO
+from HardwareModule import GPIO, I2C                            # SoftWEAR Hardware module.
 import threading                                                # Threading class for the threads
 import time                                                     # Time class for the waits
 
@@ -36,9 +35,18 @@ class I2CTCA9548AMux8:
     # Lock for the mux – One lock is created for all mux instances because they share all the same pins
     LOCK = threading.Lock()
 
-    # Selected channel
+    # Mux with an enabled channel for each bus num, only one mux per bus may have a channel enabled
+    ENABLED = {}
+
+    # Selected channel (cached control register, None if all channels are disabled or unknown)
     _selectedChannel = None
 
+    # Number of control register writes
+    _switches = 0
+
+    # Number of control register writes elided because the channel was already selected
+    _elided = 0
+
     # Device
     _device = None
 
@@ -58,16 +66,20 @@ class I2CTCA9548AMux8:
 
         self._device = I2C.get_i2c_device(self._address, self._busnum) # Init the I2C connection
         self._device.writeRaw8(0x0)                             # Test to write something
+        self._selectedChannel = None                            # All channels are disabled
+        self._switches = 0
+        self._elided = 0
         GPIO.setup(self._DETECT, GPIO.IN, GPIO.PUD_DOWN)        # Init the detect pin and set it as input with pull down
         time.sleep(0.005)                                       # Wait a bit
 
     def cleanup(self):
         """Clean up driver when no longer needed."""
+        self.LOCK.acquire()
         try:
-            self._device.writeRaw8(0x00)                        # Disable
+            self._disable()                                     # Disable
         except:
             print('Exception in i2c mux cleanup')
-            return
+        self.LOCK.release()
 
 
     def getMuxConnected(self):
@@ -85,28 +97,43 @@ class I2CTCA9548AMux8:
     def activate(self, muxedPin):
         """Activate a MUX pin (0-#). Any future operations will happen on this selected channel."""
         # TODO: CHECK IF IT IS NEEDED TO WAIT A BIT
-        self.LOCK.acquire()
-
         if muxedPin < 0 or muxedPin > self._range - 1:          # Test parameter validity
             raise ValueError("Parameter error: the MUX has only 8 channels (0-7)")
-        self._selectedChannel = muxedPin                        # Set channel
+        self.LOCK.acquire()
+
         try:
-            self._device.writeRaw8(0x01 << self._selectedChannel) # Set register
+            enabled = self.ENABLED.get(self._busnum)            # Mux with an enabled channel on the same bus
+            if enabled != None and enabled is not self:
+                enabled._disable()                              # Other mux could shadow the same addresses
+            if self._selectedChannel == muxedPin:               # Channel is already selected
+                self._elided += 1
+            else:
+                self._selectedChannel = None                    # Unknown state until the write succeeded
+                self._device.writeRaw8(0x01 << muxedPin)        # Set register
+                self._selectedChannel = muxedPin                # Set channel
+                self._switches += 1
+            self.ENABLED[self._busnum] = self
         except:
             print('Exception in i2c mux activate')
             pass
 
     def deactivate(self):
-        """Deactivate the previously activated MUX pin."""
+        """Deactivate the previously activated MUX pin. The channel stays selected until another one is activated."""
         # TODO: UNLOCK
-        try:
-            self._device.writeRaw8(0x00)
-        except:
-            print('Exception in i2c mux deactivate')
-            pass                                                # Try to deactivate if possible
-        self._selectedChannel = None
         self.LOCK.release()
 
+    def _disable(self):
+        """Disable all channels of the mux (lock needs to be held)."""
+        if self.ENABLED.get(self._busnum) is self:
+            del self.ENABLED[self._busnum]
+        self._selectedChannel = None                            # Unknown state until the write succeeded
+        self._device.writeRaw8(0x00)
+        self._switches += 1
+
+    def getSwitchStats(self):
+        """Return the number of performed and elided channel switches."""
+        return {'switches': self._switches, 'elided': self._elided}
+
     def getName(self):
         """Return mux name."""
         return '{}@MUX[{},{}]'.format(self._name, self._address, self._busnum)
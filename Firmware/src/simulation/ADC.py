@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+# Author: Cyrill Lippuner
+# Date: October 2018
+"""
+Simulated Adafruit_BBIO.ADC.
+
+    Analog pins listed in SIMULATION['ADC'] read a smooth synthetic signal, all other
+    pins read 0 (no sensor connected).
+"""
+
+import math                                                     # Synthetic signals
+import time                                                     # Time base and access latency
+
+from Config import SIMULATION                                   # SoftWEAR Config module.
+
+LATENCY = SIMULATION.get('ADC_LATENCY', 0.)                     # Latency of a conversion in seconds
+RAW_RANGE = 1800.                                               # Raw value of the full range (mV)
+
+# Connected analog pins: pin -> phase of the signal, or fixed value
+_signals = dict((pin, float(index)) for index, pin in enumerate(SIMULATION.get('ADC', [])))
+
+# Fixed values set by the simulation: pin -> value (0-1)
+_values = {}
+
+_setup = False                                                  # Flag whether the ADC has been set up
+
+
+def setup():
+    """Enable the ADC."""
+    global _setup
+    _setup = True
+
+def read(pin):
+    """Return the normalized value (0-1) of an analog pin."""
+    if not _setup:
+        raise RuntimeError('ADC not set up')
+    if LATENCY > 0:
+        time.sleep(LATENCY)
+    if pin in _values:
+        return _values[pin]
+    if pin not in _signals:
+        return 0.
+    return 0.5 + 0.4 * math.sin(2 * math.pi * 0.25 * time.time() + _signals[pin])
+
+def read_raw(pin):
+    """Return the raw value of an analog pin."""
+    return read(pin) * RAW_RANGE
+
+def connect(pin):
+    """Connect a sensor to an analog pin."""
+    _signals[pin] = float(len(_signals))
+
+def disconnect(pin):
+    """Disconnect the sensor of an analog pin."""
+    _signals.pop(pin, None)
+    _values.pop(pin, None)
+
+def setValue(pin, value):
+    """Set a fixed value (0-1) for a pin, None returns to the synthetic signal."""
+    if value is None:
+        _values.pop(pin, None)
+    else:
+        _values[pin] = value
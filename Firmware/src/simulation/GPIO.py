@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+# Author: Cyrill Lippuner
+# Date: October 2018
+"""
+Simulated Adafruit_BBIO.GPIO.
+
+    Virtual pins: outputs keep the written value, inputs read the level driven by
+    the simulation (SIMULATION['GPIO'] or setLevel) or else their pull resistor.
+    Edges driven by setLevel are detected like on the board: callbacks are called
+    for every edge not within the bouncetime of the last accepted one.
+"""
+
+import threading                                                # Lock for the pin states
+import time                                                     # Access latency
+
+from Config import SIMULATION                                   # SoftWEAR Config module.
+
+HIGH = 1
+LOW = 0
+IN = 0
+OUT = 1
+PUD_OFF = 0
+PUD_DOWN = 1
+PUD_UP = 2
+RISING = 1
+FALLING = 2
+BOTH = 3
+
+LATENCY = SIMULATION.get('GPIO_LATENCY', 0.)                    # Latency of a pin access in seconds
+
+# Configured pins: pin -> {'direction', 'pull', 'value'}
+_pins = {}
+
+# Levels driven by the simulated devices: pin -> value
+_levels = dict(SIMULATION.get('GPIO', {}))
+
+# Edge detection: pin -> {'edge', 'detected', 'callbacks', 'bouncetime', 'last'}
+_events = {}
+
+# Lock for the pin states
+_lock = threading.Lock()
+
+
+def _access():
+    """Wait for the access latency."""
+    if LATENCY > 0:
+        time.sleep(LATENCY)
+
+def _level(pin):
+    """Return the current level of a pin."""
+    if pin in _levels:
+        return _levels[pin]
+    state = _pins.get(pin)
+    if state is None:
+        return LOW
+    if state['direction'] == OUT:
+        return state['value']
+    return HIGH if state['pull'] == PUD_UP else LOW
+
+def setup(pin, direction, pull_up_down=PUD_OFF, initial=None, delay=0):
+    """Configure a pin as input or output."""
+    with _lock:
+        _pins[pin] = {'direction': direction, 'pull': pull_up_down, 'value': initial if initial is not None else LOW}
+
+def input(pin):
+    """Read the level of a pin."""
+    _access()
+    with _lock:
+        return _level(pin)
+
+def output(pin, value):
+    """Write the level of an output pin."""
+    _access()
+    with _lock:
+        state = _pins.get(pin)
+        if state is None or state['direction'] != OUT:
+            raise RuntimeError('The GPIO channel has not been setup as an OUTPUT')
+        state['value'] = HIGH if value else LOW
+
+def add_event_detect(pin, edge, callback=None, bouncetime=0):
+    """Enable edge detection on a pin, the callback is called with the pin for every edge."""
+    with _lock:
+        if pin in _events:
+            raise RuntimeError('Edge detection already enabled for this GPIO channel')
+        _events[pin] = {'edge': edge, 'detected': False, 'callbacks': [] if callback is None else [callback],
+                        'bouncetime': bouncetime / 1000., 'last': None}
+
+def add_event_callback(pin, callback, bouncetime=0):
+    """Add a callback to the edge detection of a pin."""
+    with _lock:
+        event = _events.get(pin)
+        if event is None:
+            raise RuntimeError('Add event detection using add_event_detect first before adding a callback')
+        event['callbacks'].append(callback)
+
+def remove_event_detect(pin):
+    """Disable edge detection on a pin."""
+    with _lock:
+        _events.pop(pin, None)
+
+def event_detected(pin):
+    """Return True once if an edge has been detected since the last call."""
+    with _lock:
+        event = _events.get(pin)
+        if event is None or not event['detected']:
+            return False
+        event['detected'] = False
+        return True
+
+def cleanup():
+    """Reset all pins."""
+    with _lock:
+        _pins.clear()
+        _events.clear()
+
+def setLevel(pin, value):
+    """Drive a pin from the simulation (None releases it). Records the edges for the edge detection."""
+    callbacks = []
+    with _lock:
+        before = _level(pin)
+        if value is None:
+            _levels.pop(pin, None)
+        else:
+            _levels[pin] = HIGH if value else LOW
+        after = _level(pin)
+        event = _events.get(pin)
+        if event is not None and before != after:
+            if event['edge'] == BOTH or (event['edge'] == RISING and after == HIGH) or (event['edge'] == FALLING and after == LOW):
+                now = time.time()
+                if event['last'] is None or now - event['last'] >= event['bouncetime']: # Ignore bouncing edges
+                    event['last'] = now
+                    event['detected'] = True
+                    callbacks = event['callbacks'][:]
+    for callback in callbacks:                                  # Called without the lock, callbacks may read the pin
+        callback(pin)
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+# Author: Cyrill Lippuner
+# Date: October 2018
+"""
+Simulated Adafruit_GPIO.I2C.
+
+    Every bus holds the simulated devices of SIMULATION['I2C']. A device behind a
+    TCA9548A mux only answers while the channel of its mux is enabled, missing devices
+    raise the same IOError as the Linux I2C driver. Transfers are serialized per bus and
+    take I2C_LATENCY plus I2C_BYTE_LATENCY for every transferred byte.
+"""
+
+import threading                                                # Lock for the buses
+import time                                                     # Transfer latency
+
+from Config import SIMULATION                                   # SoftWEAR Config module.
+from simulation.I2C_DEVICES import DEVICES                      # Simulated register maps
+
+DEFAULT_BUSNUM = 1                                              # Default bus of the BBGW
+LATENCY = SIMULATION.get('I2C_LATENCY', 0.)                     # Latency of a transfer in seconds
+BYTE_LATENCY = SIMULATION.get('I2C_BYTE_LATENCY', 0.)           # Latency of every transferred byte in seconds
+EREMOTEIO = 121                                                 # Errno of a missing acknowledge
+BLOCK_SIZE = 32                                                 # Longest SMBus block transfer
+
+
+class Bus:
+    """Simulated I2C bus with attached devices."""
+
+    # Bus num
+    busnum = None
+
+    # Attached devices: [(address, mux address, mux channel, device)]
+    _devices = None
+
+    # Lock for the bus, only one transfer at a time
+    _lock = None
+
+    def __init__(self, busnum):
+        """Create an empty bus."""
+        self.busnum = busnum
+        self._devices = []
+        self._lock = threading.Lock()
+
+    def attach(self, address, device, mux=None, channel=None):
+        """Attach a device, optionally behind the channel of a mux."""
+        self._devices.append((address, mux, channel, device))
+
+    def detach(self, address, mux=None, channel=None):
+        """Detach the devices at the address (and mux channel)."""
+        self._devices = [entry for entry in self._devices if entry[0:3] != (address, mux, channel)]
+
+    def _find(self, address):
+        """Return the device answering on the address (lock needs to be held)."""
+        for devAddress, mux, channel, device in self._devices:
+            if devAddress != address:
+                continue
+            if mux == None:                                     # Device is not muxed
+                return device
+            for muxAddress, _, _, muxDevice in self._devices:
+                if muxAddress == mux and muxDevice.NAME == 'TCA9548A' and muxDevice.getChannels() & (0x01 << channel):
+                    return device
+        raise IOError(EREMOTEIO, 'Remote I/O error')
+
+    def transfer(self, address, length, operation, *args):
+        """Run the operation on the device at the address, length is the number of transferred bytes."""
+        with self._lock:
+            delay = LATENCY + (length + 1) * BYTE_LATENCY       # Address byte and data bytes
+            if delay > 0:
+                time.sleep(delay)
+            return getattr(self._find(address), operation)(*args)
+
+
+class Device:
+    """Class for communicating with a simulated I2C device, same interface as Adafruit_GPIO.I2C.Device."""
+
+    # Address of the device
+    _address = None
+
+    # Bus of the device
+    _bus = None
+
+    def __init__(self, address, busnum, i2c_interface=None):
+        """Create the device on the bus."""
+        self._address = address
+        self._bus = getBus(busnum)
+
+    def writeRaw8(self, value):
+        """Write an 8-bit value on the bus (without register)."""
+        self._bus.transfer(self._address, 1, 'writeRaw', value & 0xFF)
+
+    def write8(self, register, value):
+        """Write an 8-bit value to the specified register."""
+        self._bus.transfer(self._address, 2, 'write', register, [value & 0xFF])
+
+    def write16(self, register, value):
+        """Write a 16-bit value to the specified register (little endian)."""
+        self._bus.transfer(self._address, 3, 'write', register, [value & 0xFF, (value >> 8) & 0xFF])
+
+    def writeList(self, register, data):
+        """Write bytes to the specified register."""
+        if len(data) > BLOCK_SIZE:                              # Same limit as the SMBus block write
+            raise OverflowError('Third argument must be a list of at most 32 elements.')
+        self._bus.transfer(self._address, 1 + len(data), 'write', register, list(data))
+
+    def readList(self, register, length):
+        """Read a length number of bytes from the specified register."""
+        return self._bus.transfer(self._address, 1 + length, 'read', register, length)
+
+    def readRaw8(self):
+        """Read an 8-bit value on the bus (without register)."""
+        return self._bus.transfer(self._address, 1, 'readRaw') & 0xFF
+
+    def readU8(self, register):
+        """Read an unsigned byte from the specified register."""
+        return self.readList(register, 1)[0]
+
+    def readS8(self, register):
+        """Read a signed byte from the specified register."""
+        result = self.readU8(register)
+        return result - 256 if result > 127 else result
+
+    def readU16(self, register, little_endian=True):
+        """Read an unsigned 16-bit value from the specified register."""
+        data = self.readList(register, 2)
+        return data[0] | (data[1] << 8) if little_endian else (data[0] << 8) | data[1]
+
+    def readS16(self, register, little_endian=True):
+        """Read a signed 16-bit value from the specified register."""
+        result = self.readU16(register, little_endian)
+        return result - 65536 if result > 32767 else result
+
+    def readU16LE(self, register):
+        """Read an unsigned 16-bit value from the specified register (little endian)."""
+        return self.readU16(register, little_endian=True)
+
+    def readU16BE(self, register):
+        """Read an unsigned 16-bit value from the specified register (big endian)."""
+        return self.readU16(register, little_endian=False)
+
+    def readS16LE(self, register):
+        """Read a signed 16-bit value from the specified register (little endian)."""
+        return self.readS16(register, little_endian=True)
+
+    def readS16BE(self, register):
+        """Read a signed 16-bit value from the specified register (big endian)."""
+        return self.readS16(register, little_endian=False)
+
+
+# Simulated buses by bus num
+_buses = {}
+
+# Lock for the bus dictionary
+_lock = threading.Lock()
+
+
+def getBus(busnum):
+    """Return the simulated bus, it is created if needed."""
+    with _lock:
+        if busnum not in _buses:
+            _buses[busnum] = Bus(busnum)
+        return _buses[busnum]
+
+def connect(name, address, busnum=DEFAULT_BUSNUM, mux=None, channel=None):
+    """Attach a new simulated device of type name, return the device."""
+    if name not in DEVICES:
+        raise ValueError('Device {} is not allowed'.format(name))
+    bus = getBus(busnum)
+    device = DEVICES[name](phase=0.37 * len(bus._devices))      # Shift the signals of every device
+    with bus._lock:
+        bus.attach(address, device, mux, channel)
+    return device
+
+def disconnect(address, busnum=DEFAULT_BUSNUM, mux=None, channel=None):
+    """Detach a simulated device."""
+    bus = getBus(busnum)
+    with bus._lock:
+        bus.detach(address, mux, channel)
+
+def setup(devices):
+    """Attach the simulated devices of the list of configs {'DEVICE', 'ADDRESS', 'BUSNUM', 'MUX', 'CHANNEL'}."""
+    for config in devices:
+        connect(config['DEVICE'], config['ADDRESS'], config.get('BUSNUM', DEFAULT_BUSNUM),
+                config.get('MUX'), config.get('CHANNEL'))
+
+def get_default_bus():
+    """Return the default bus num."""
+    return DEFAULT_BUSNUM
+
+def get_i2c_device(address, busnum=None, i2c_interface=None, **kwargs):
+    """Return a simulated I2C device for the address on the bus."""
+    if busnum is None:
+        busnum = get_default_bus()
+    return Device(address, busnum, i2c_interface)
+
+def require_repeated_start():
+    """Repeated start is always supported by the simulated bus."""
+    pass
+
+
+setup(SIMULATION.get('I2C', []))                                # Build the configured buses
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+# Author: Cyrill Lippuner
+# Date: October 2018
+"""
+Register maps of the simulated I2C devices.
+
+    Every device implements the register level transfers of the simulated bus:
+    read(register, length), write(register, data), readRaw() and writeRaw(value).
+    Sensor registers are filled with smooth synthetic signals when they are read.
+"""
+
+import math                                                     # Synthetic sensor signals
+import struct                                                   # Packing of the registers
+import time                                                     # Time base of the signals
+
+
+class SimDevice:
+    """Plain register file with a register pointer."""
+
+    # Name of the device type
+    NAME = ''
+
+    # Size of the register file
+    SIZE = 256
+
+    # Register file
+    _registers = None
+
+    # Register pointer set by the last transfer
+    _pointer = 0
+
+    # Phase shift of the synthetic signals in seconds
+    _phase = 0.
+
+    def __init__(self, phase=0.):
+        """Reset the registers, phase shifts the synthetic signals."""
+        self._phase = phase
+        self._pointer = 0
+        self.reset()
+
+    def reset(self):
+        """Set the registers to their power on values."""
+        self._registers = bytearray(self.SIZE)
+
+    def read(self, register, length):
+        """Return length bytes starting at register."""
+        self._pointer = register
+        return bytearray(self._registers[register:register + length])
+
+    def write(self, register, data):
+        """Write the bytes starting at register."""
+        self._pointer = register
+        for offset, value in enumerate(data):
+            if register + offset < self.SIZE:
+                self._registers[register + offset] = value & 0xFF
+
+    def readRaw(self):
+        """Return the register at the pointer."""
+        return self._registers[self._pointer]
+
+    def writeRaw(self, value):
+        """Set the register pointer."""
+        self._pointer = value & 0xFF
+
+
+class SimBNO055(SimDevice):
+    """BNO055 absolute orientation sensor (page 0)."""
+
+    NAME = 'BNO055'
+    SIZE = 0x80
+
+    # Chip identification registers 0x00 - 0x06
+    IDENTIFICATION = [0xA0, 0xFB, 0x32, 0x0F, 0x11, 0x03, 0x15]
+
+    DATA_START = 0x08                                           # First data register (accelerometer)
+    DATA_END = 0x35                                             # End of the data registers (after temperature)
+    DATA_FORMAT = struct.Struct('<3h3h3h3h4h3h3hb')             # acc, mag, gyr, eul, qua, lia, grv, tem
+    CALIB_STAT = 0x35
+    SELFTEST_RESULT = 0x36
+    SYS_STAT = 0x39
+    SYS_ERR = 0x3A
+    OPR_MODE = 0x3D
+    PWR_MODE = 0x3E
+    SYS_TRIGGER = 0x3F
+    MODE_CONFIG = 0x00
+    MODE_FUSION = 0x08                                          # Modes from IMU on run the fusion
+
+    def reset(self):
+        """Set the registers to their power on values."""
+        SimDevice.reset(self)
+        self._registers[0:len(self.IDENTIFICATION)] = bytearray(self.IDENTIFICATION)
+        self._registers[self.CALIB_STAT] = 0xFF
+        self._registers[self.SELFTEST_RESULT] = 0x0F
+        self._registers[self.OPR_MODE] = self.MODE_CONFIG
+        self._updateStatus()
+
+    def _updateStatus(self):
+        """Update the system status for the operation mode."""
+        mode = self._registers[self.OPR_MODE] & 0x0F
+        if mode == self.MODE_CONFIG:
+            self._registers[self.SYS_STAT] = 0                  # Idle
+        elif mode >= self.MODE_FUSION:
+            self._registers[self.SYS_STAT] = 5                  # Fusion running
+        else:
+            self._registers[self.SYS_STAT] = 6                  # Running without fusion
+
+    def _sample(self):
+        """Fill the data registers with the synthetic motion at the current time."""
+        t = time.time() + self._phase
+        heading = (t * 36.) % 360.                              # Slow rotation around the vertical axis
+        roll = 10. * math.sin(t)
+        pitch = 5. * math.cos(t)
+        acc = [2. * math.sin(t), 2. * math.cos(t), 9.81]
+        grv = [0., 0., 9.81]
+        values = [acc[0] * 100, acc[1] * 100, acc[2] * 100,    # 1 m/s^2 = 100 LSB
+                  20. * math.cos(t) * 16, 20. * math.sin(t) * 16, -40. * 16, # 1 uT = 16 LSB
+                  30. * math.cos(t) * 16, -30. * math.sin(t) * 16, 5. * 16, # 1 dps = 16 LSB
+                  heading * 16, roll * 16, pitch * 16,          # 1 deg = 16 LSB
+                  math.cos(math.radians(heading) / 2) * 16384, 0., 0., math.sin(math.radians(heading) / 2) * 16384,
+                  (acc[0] - grv[0]) * 100, (acc[1] - grv[1]) * 100, (acc[2] - grv[2]) * 100,
+                  grv[0] * 100, grv[1] * 100, grv[2] * 100]
+        values = [max(-32768, min(32767, int(value))) for value in values]
+        self._registers[self.DATA_START:self.DATA_END] = bytearray(self.DATA_FORMAT.pack(*(values + [25])))
+
+    def read(self, register, length):
+        """Return length bytes starting at register, sampling the sensors if data is read."""
+        if (register < self.DATA_END and register + length > self.DATA_START and
+                self._registers[self.OPR_MODE] & 0x0F != self.MODE_CONFIG):
+            self._sample()
+        return SimDevice.read(self, register, length)
+
+    def write(self, register, data):
+        """Write the bytes starting at register, handling mode changes and resets."""
+        if register == self.SYS_TRIGGER and len(data) > 0 and data[0] & 0x20:
+            self.reset()                                        # Software reset
+            return
+        SimDevice.write(self, register, data)
+        if register <= self.OPR_MODE < register + len(data):
+            self._updateStatus()
+
+
+class SimADS1015(SimDevice):
+    """ADS1015 12-bit analog to digital converter."""
+
+    NAME = 'ADS1015'
+    SIZE = 4
+
+    CONVERSION = 0x00
+    CONFIG = 0x01
+    OS_SINGLE = 0x8000
+
+    # Full scale range in V for the gain bits
+    FSR = [6.144, 4.096, 2.048, 1.024, 0.512, 0.256, 0.256, 0.256]
+
+    # Data rates in samples per second for the data rate bits
+    DR = [128, 250, 490, 920, 1600, 2400, 3300, 3300]
+
+    # 16-bit registers: conversion, config, low and high threshold
+    _words = None
+
+    # Time the running single shot conversion is finished
+    _ready = 0.
+
+    # Result of the running single shot conversion
+    _result = 0
+
+    def reset(self):
+        """Set the registers to their power on values."""
+        self._words = [0x0000, 0x8583, 0x8000, 0x7FFF]
+        self._ready = 0.
+
+    def _voltage(self, channel):
+        """Return the synthetic voltage of an input channel."""
+        return 1.65 + 1.5 * math.sin(2 * math.pi * 0.5 * (time.time() + self._phase) + channel)
+
+    def _convert(self, config):
+        """Run a conversion for the config register."""
+        mux = (config >> 12) & 0x07
+        fsr = self.FSR[(config >> 9) & 0x07]
+        if mux >= 4:                                            # Single ended
+            voltage = self._voltage(mux - 4)
+        else:                                                   # Differential
+            pairs = [(0, 1), (0, 3), (1, 3), (2, 3)]
+            voltage = self._voltage(pairs[mux][0]) - self._voltage(pairs[mux][1])
+        code = max(-2048, min(2047, int(voltage / fsr * 2048)))
+        return (code & 0xFFF) << 4
+
+    def _finish(self):
+        """Complete the running single shot conversion once its conversion time has passed."""
+        if self._ready and time.time() >= self._ready:
+            self._words[self.CONVERSION] = self._result
+            self._words[self.CONFIG] |= self.OS_SINGLE          # Conversion done
+            self._ready = 0.
+
+    def read(self, register, length):
+        """Return the big endian register words."""
+        self._pointer = register
+        self._finish()
+        if register == self.CONVERSION and not (self._words[self.CONFIG] & 0x0100): # Continuous mode
+            self._words[self.CONVERSION] = self._convert(self._words[self.CONFIG])
+        data = bytearray()
+        while len(data) < length:
+            data += bytearray(struct.pack('>H', self._words[register & 0x03]))
+        return data[:length]
+
+    def write(self, register, data):
+        """Write a big endian register word."""
+        self._pointer = register & 0x03
+        if len(data) < 2:
+            return
+        value = ((data[0] & 0xFF) << 8) | (data[1] & 0xFF)
+        if self._pointer == self.CONFIG:
+            if not (value & 0x0100):                            # Start a continuous conversion
+                self._words[self.CONVERSION] = self._convert(value)
+                value |= self.OS_SINGLE
+            elif value & self.OS_SINGLE:                        # Start a single conversion, done after 1/DR
+                self._result = self._convert(value)
+                self._ready = time.time() + 1. / self.DR[(value >> 5) & 0x07]
+                value &= ~self.OS_SINGLE
+            else:
+                value |= self.OS_SINGLE
+        if self._pointer != self.CONVERSION:
+            self._words[self._pointer] = value
+
+    def readRaw(self):
+        """Return the high byte of the register at the pointer."""
+        return self._words[self._pointer] >> 8
+
+
+class SimPCA9685(SimDevice):
+    """PCA9685 16 channel PWM controller."""
+
+    NAME = 'PCA9685'
+
+    MODE1 = 0x00
+    MODE2 = 0x01
+    AI = 0x20
+    LED0 = 0x06
+    ALL_LED = 0xFA
+    PRESCALE = 0xFE
+
+    def reset(self):
+        """Set the registers to their power on values."""
+        SimDevice.reset(self)
+        self._registers[self.MODE1] = 0x11
+        self._registers[self.MODE2] = 0x04
+        self._registers[self.PRESCALE] = 0x1E
+
+    def write(self, register, data):
+        """Write the bytes starting at register, the ALL_LED registers are copied to every channel."""
+        if len(data) > 1 and not self._registers[self.MODE1] & self.AI: # Without auto-increment all bytes go to the register
+            data = data[-1:]
+        SimDevice.write(self, register, data)
+        for offset in range(len(data)):
+            address = register + offset
+            if self.ALL_LED <= address < self.ALL_LED + 4:
+                for channel in range(16):
+                    self._registers[self.LED0 + 4 * channel + address - self.ALL_LED] = data[offset] & 0xFF
+        if register == self.MODE1:
+            self._registers[self.MODE1] &= 0x7F                 # Restart bit clears itself
+
+    def getChannel(self, channel):
+        """Return the (on, off) counts of a channel."""
+        on, off = struct.unpack_from('<HH', bytes(self._registers), self.LED0 + 4 * channel)
+        return on, off
+
+
+class SimTCA9548A(SimDevice):
+    """TCA9548A 8 channel I2C multiplexer with a single control register."""
+
+    NAME = 'TCA9548A'
+    SIZE = 1
+
+    def read(self, register, length):
+        """Every read returns the control register."""
+        return bytearray([self._registers[0]] * length)
+
+    def write(self, register, data):
+        """The register byte is the control register."""
+        self._registers[0] = register & 0xFF
+
+    def readRaw(self):
+        """Return the enabled channels."""
+        return self._registers[0]
+
+    def writeRaw(self, value):
+        """Enable the channels of the bitmask."""
+        self._registers[0] = value & 0xFF
+
+    def getChannels(self):
+        """Return the bitmask of the enabled channels."""
+        return self._registers[0]
+
+
+# Simulated devices by type name
+DEVICES = dict((device.NAME, device) for device in [SimBNO055, SimADS1015, SimPCA9685, SimTCA9548A])
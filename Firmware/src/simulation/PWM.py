@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+# Author: Cyrill Lippuner
+# Date: October 2018
+"""
+Simulated Adafruit_BBIO.PWM.
+
+    Keeps the duty cycle and frequency of every started pin.
+"""
+
+import threading                                                # Lock for the pin states
+import time                                                     # Access latency
+
+from Config import SIMULATION                                   # SoftWEAR Config module.
+
+LATENCY = SIMULATION.get('GPIO_LATENCY', 0.)                    # Latency of a pin access in seconds
+
+# Started pins: pin -> {'duty', 'frequency', 'polarity'}
+_pins = {}
+
+# Lock for the pin states
+_lock = threading.Lock()
+
+
+def _access():
+    """Wait for the access latency."""
+    if LATENCY > 0:
+        time.sleep(LATENCY)
+
+def start(pin, duty_cycle, frequency=2000, polarity=0):
+    """Start the PWM on a pin."""
+    if duty_cycle < 0 or duty_cycle > 100:
+        raise ValueError('duty_cycle must have a value from 0.0 to 100.0')
+    _access()
+    with _lock:
+        _pins[pin] = {'duty': float(duty_cycle), 'frequency': frequency, 'polarity': polarity}
+
+def stop(pin):
+    """Stop the PWM on a pin."""
+    _access()
+    with _lock:
+        _pins.pop(pin, None)
+
+def set_duty_cycle(pin, duty_cycle):
+    """Change the duty cycle (0-100) of a started pin."""
+    if duty_cycle < 0 or duty_cycle > 100:
+        raise ValueError('duty_cycle must have a value from 0.0 to 100.0')
+    _access()
+    with _lock:
+        if pin not in _pins:
+            raise RuntimeError('You must start() the PWM channel first')
+        _pins[pin]['duty'] = float(duty_cycle)
+
+def set_frequency(pin, frequency):
+    """Change the frequency of a started pin."""
+    if frequency <= 0:
+        raise ValueError('frequency must be greater than 0')
+    _access()
+    with _lock:
+        if pin not in _pins:
+            raise RuntimeError('You must start() the PWM channel first')
+        _pins[pin]['frequency'] = frequency
+
+def cleanup():
+    """Stop all pins."""
+    with _lock:
+        _pins.clear()
+
+def getState(pin):
+    """Return the state of a started pin or None."""
+    with _lock:
+        state = _pins.get(pin)
+        return dict(state) if state is not None else None
@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+# Author: Cyrill Lippuner
+# Date: October 2018
+"""
+Simulated hardware of the SoftWEAR Firmware.
+
+    Drop-in replacements for the Adafruit modules used on the BBGW (GPIO, ADC, PWM
+    and I2C) with virtual pins, analog channels and an I2C bus with simulated
+    BNO055, ADS1015, PCA9685 and TCA9548A register maps. The virtual hardware is
+    described by SIMULATION in Config and selected with HARDWARE = 'simulation'.
+"""
@@ -27,7 +27,11 @@ class BeagleboneGreenWirelessBoard(Board):
 
     def unserializeMessage(self, messageString):
         """Return parsed message as dict."""
-        d = json.loads(messageString)
+        return self.parsedMessage(json.loads(messageString))
+
+    def parsedMessage(self, messageDict):
+        """Return message from an already parsed dict."""
+        d = messageDict
         if ('name' not in d):
             d['name'] = self._name
         return Message(d['type'], d['name'], d)
@@ -5,10 +5,20 @@
 A representation of the connection to the physical board.
 
 Abstract definition of a connection to the physical board representation
+
+The past values of a device are kept in a preallocated NumPy ring buffer (History).
+Every sample is stored twice, at i and i + capacity, so the samples ordered from the
+oldest to the newest are always a contiguous slice and are copied in one pass.
+
+The devices of a board are updated by the ingest thread and drawn by the GUI, both
+hold the lock of the board while they access the devices. The plots keep the arrays
+they are given until the next paint, so the GUI only gets copies of the history.
 """
 
 import datetime                                                 # Time and date keeping package
 import logging                                                  # This class logs all info - so logging is imported
+import threading                                                # Lock shared by the ingest thread and the GUI
+import numpy as np                                              # Number utility package
 
 """Globals"""
 # Allowed directions for the dataflow
@@ -20,6 +30,89 @@ LOG_LEVEL_PRINT = logging.WARN
 LOG_LEVEL_SAVE = logging.DEBUG
 
 
+class History():
+    """Preallocated ring buffer of the past timestamps and values of a device."""
+
+    # Number of samples kept
+    _capacity = MAX_POINTS
+    # Dimension of the values
+    _dim = 1
+    # Timestamps (2 * capacity)
+    _timestamps = None
+    # Values (dim x 2 * capacity)
+    _values = None
+    # Total number of samples written
+    _written = 0
+
+
+    def __init__(self, dim, capacity=MAX_POINTS):
+        """Allocate an empty history."""
+        self._dim = dim
+        self._capacity = capacity
+        self._timestamps = np.zeros(2 * capacity)
+        self._values = np.zeros((dim, 2 * capacity))
+        self._written = 0
+
+    def __len__(self):
+        """Return the number of samples kept."""
+        return min(self._written, self._capacity)
+
+    def capacity(self):
+        """Return the number of samples kept at most."""
+        return self._capacity
+
+    def _range(self):
+        """Return the slice of the ordered samples."""
+        end = self._written % self._capacity + self._capacity   # Newest samples are in the second half
+        return slice(end - len(self), end)
+
+    def timestamps(self):
+        """Return the ordered timestamps (view)."""
+        return self._timestamps[self._range()]
+
+    def values(self):
+        """Return the ordered values as dim x samples array (view)."""
+        return self._values[:, self._range()]
+
+    def append(self, timestamp, values):
+        """Append a sample."""
+        i = self._written % self._capacity
+        self._timestamps[i] = self._timestamps[i + self._capacity] = timestamp
+        self._values[:, i] = self._values[:, i + self._capacity] = values
+        self._written += 1
+
+    def extend(self, timestamps, values):
+        """Append a block of samples, timestamps as array (n) and values as array (n x dim)."""
+        if len(timestamps) > self._capacity:                    # Only the newest samples are kept
+            self._written += len(timestamps) - self._capacity
+            timestamps = timestamps[-self._capacity:]
+            values = values[-self._capacity:]
+        i = self._written % self._capacity
+        first = min(len(timestamps), self._capacity - i)        # Samples until the end of the ring
+        for offset in (0, self._capacity):
+            self._timestamps[offset + i:offset + i + first] = timestamps[:first]
+            self._values[:, offset + i:offset + i + first] = values[:first].T
+            self._timestamps[offset:offset + len(timestamps) - first] = timestamps[first:] # Wrapped samples
+            self._values[:, offset:offset + len(timestamps) - first] = values[first:].T
+        self._written += len(timestamps)
+
+    def resize(self, capacity):
+        """Change the capacity in place, the newest samples are kept."""
+        if capacity == self._capacity:
+            return
+        timestamps = self.timestamps()[-capacity:].copy()
+        values = self.values()[:, -capacity:].T.copy()
+        self._capacity = capacity
+        self._timestamps = np.zeros(2 * capacity)
+        self._values = np.zeros((self._dim, 2 * capacity))
+        self._written = 0
+        self.extend(timestamps, values)
+
+    def clear(self):
+        """Drop all samples."""
+        self._written = 0
+
+
 class Device():
     """Representation of a physical device."""
 
@@ -35,10 +128,8 @@ class Device():
     _data = None
     # timestamp (Accessible by the 'friend' object board)
     _timestamp = None
-    # Past data values
-    _pastData = None
-    # Past timestamps
-    _pastTimestamps = None
+    # Past timestamps and values (Accessible by the 'friend' object board)
+    _history = None
     # Cycle duration
     _cycleDuration = 0
     # About the device
@@ -103,11 +194,10 @@ class Device():
 
         # Set data fields in respect to provided dimension
         self._data = []
-        self._pastData = [[] for x in range(data['dim'])]
+        self._history = History(data['dim'])
 
         # Set timestamp fields
         self._timestamp = None
-        self._pastTimestamps = []
 
         # Get about
         if 'about' in data:                                     # Check if device provides any settings
@@ -157,12 +247,12 @@ class Device():
         return self._timestamp
 
     def pastData(self):
-        """Return a shallow copy of the past data lists."""
-        return self._pastData.copy()
+        """Return the past values of every dimension, oldest first (copy of the history)."""
+        return list(self._history.values().copy())
 
     def pastTimestamps(self):
-        """Return a shallow copy of the past timestamp list."""
-        return self._pastTimestamps.copy()
+        """Return the past timestamps, oldest first (copy of the history)."""
+        return self._history.timestamps().copy()
 
     def duration(self):
         """Return the dim."""
@@ -211,11 +301,8 @@ class Device():
         if (self._dir != 'out'):                                # Set data is only available for out devices
             raise ValueError('device has now permission to send data')
         else:
-            for i, dataI in enumerate(self._data):              # Store new data
-                self._pastData[i].append(dataI)                 # Add current data to past data
-                while (MAX_POINTS < len(self._pastData[i])):     # Create overflow for past data
-                    self._pastData[i].pop(0)
-
+            if len(self._data) == self._dim:                    # Add current data to past data
+                self._history.append(self._timestamp, self._data)
             self._data = data                                   # Set most recent data
 
     def setFileName(self, fileName):
@@ -230,6 +317,10 @@ class Device():
         """Set the hide flag."""
         self._hide = hide
 
+    def setMaxPoints(self, maxPoints):
+        """Set the number of past points kept."""
+        self._history.resize(maxPoints)
+
 
 
 
@@ -278,8 +369,14 @@ class Board():
     _defaultPort = None
     # devices
     _deviceList = None
+    # devices by name
+    _devices = None
     # Save to file
     _fileName = None
+    # Max past points stored for every device
+    _maxPoints = MAX_POINTS
+    # Lock for the devices
+    _lock = None
     # The logger
     _logger = None
 
@@ -300,6 +397,8 @@ class Board():
         self._defaultIp = defaultIp
         self._defaultPort = defaultPort
         self._deviceList = []                                   # Clear device list
+        self._devices = {}                                      # Clear device index
+        self._lock = threading.RLock()                          # Reentrant, the GUI draws while holding it
 
 
     def name(self):
@@ -326,9 +425,22 @@ class Board():
         """Return parsed message as dict."""
         return None
 
+    def parsedMessage(self, messageDict):
+        """Return message from an already parsed dict."""
+        return None
+
     def deviceList(self):
         """Return a shallow copy of the device list."""
-        return self._deviceList.copy()
+        with self._lock:
+            return self._deviceList.copy()
+
+    def device(self, name):
+        """Return the registered device with the name or None."""
+        return self._devices.get(name)
+
+    def lock(self):
+        """Return the lock to hold while accessing the devices."""
+        return self._lock
 
     def fileName(self):
         """Return the file name."""
@@ -342,58 +454,53 @@ class Board():
         """Register a device to the board."""
         if (not isinstance(device, Device)):                    # Only device objects can be registered
             raise ValueError('object is not a device')
-        else:
-            for registeredDevice in self._deviceList:           # Check for device to register
-                if (registeredDevice.name() == device.name()):
-                    break                                       # Device already registered
-            else:
+        with self._lock:
+            if (device.name() not in self._devices):            # Check for device already registered
+                device.setMaxPoints(self._maxPoints)            # Keep as many points as the other devices
                 self._deviceList.append(device)                 # Register device
+                self._devices[device.name()] = device
 
     def deregisterDevice(self, device):
         """Register a device to the board."""
         if (not isinstance(device, Device)):                    # Only device objects can be deregistered
             raise ValueError('object is not a device')
-        else:
-            for registeredDevice in self._deviceList:           # Check for device to deregister
-                if (registeredDevice.name() == device.name()):
-                    self._deviceList.remove(registeredDevice)   # Remove from boards device lists
-                    break
+        with self._lock:
+            registeredDevice = self._devices.pop(device.name(), None) # Check for device to deregister
+            if (registeredDevice != None):
+                self._deviceList.remove(registeredDevice)       # Remove from boards device lists
             else:                                               # Tried to deregister a non-registered device
                 self._logger.debug('device {} is not registered'.format(device.name()))
 
     def updateData(self, name, data, timestamp, cycleDuration):
         """Update data of a device."""
-        for registeredDevice in self._deviceList:
-            if (registeredDevice.name() == name):
-                for i, dataI in enumerate(data):
-                    if data[i] == None:
-                        data[i] = 0                             # Map None to 0
-                        registeredDevice._activeDim[i] = False  # Deactivate dim
-                    else:
-                        registeredDevice._activeDim[i] = True   # Activate dim
-                                                                # Add current timestamp to past timestamps of 'friend' object
-                registeredDevice._pastTimestamps.append(registeredDevice._timestamp)
-                registeredDevice._cycleDuration = cycleDuration # Add the cycle duration of the device of 'friend' object
-                while (MAX_POINTS < len(registeredDevice._pastTimestamps)): # Create overflow for past timestamps of 'friend' object
-                    registeredDevice._pastTimestamps.pop(0)
-                for i, dataI in enumerate(registeredDevice._data): # Access private field of 'friend' object
-                    registeredDevice._pastData[i].append(dataI) # Add current data to past data of 'friend' object
-                    while (MAX_POINTS < len(registeredDevice._pastData[i])): # Create overflow for past values of 'friend' object
-                        registeredDevice._pastData[i].pop(0)
-
-                registeredDevice._data = data                   # Set most recent data
-                registeredDevice._timestamp = timestamp         # Set most recent timestamp
-
+        self.updateBlock(name, [[timestamp, data]], cycleDuration)
 
-                break
-        else:                                                   # Tried to update data for a non-registered device
+    def updateBlock(self, name, values, cycleDuration):
+        """Update data of a device with a block of samples [[timestamp, [values]]]."""
+        registeredDevice = self._devices.get(name)
+        if (registeredDevice == None):                          # Tried to update data for a non-registered device
             self._logger.debug('device {} is not registered'.format(name))
+        elif (len(values) > 0):
+            timestamps = np.array([value[0] for value in values], dtype=float)
+            block = np.array([value[1] for value in values], dtype=float).reshape(len(values), registeredDevice._dim) # None becomes NaN
+            missing = np.isnan(block)
+            block[missing] = 0                                  # Map None to 0
+            with self._lock:                                    # Only hold the lock to store the converted block
+                registeredDevice._activeDim = [not el for el in missing[-1]] # Dims without value are deactivated
+                registeredDevice._history.extend(timestamps, block) # Add the samples to the history of 'friend' object
+                registeredDevice._cycleDuration = cycleDuration # Add the cycle duration of the device of 'friend' object
+                registeredDevice._data = block[-1].tolist()     # Set most recent data
+                registeredDevice._timestamp = values[-1][0]     # Set most recent timestamp
 
     def setMaxPoints(self, maxPoints):
-        """Set the max points."""
-        global MAX_POINTS
-        MAX_POINTS = maxPoints                                  # Set the max points
+        """Set the max points of every device, the histories are resized in place."""
+        with self._lock:
+            self._maxPoints = maxPoints                         # Set the max points
+            for device in self._deviceList:
+                device.setMaxPoints(maxPoints)
 
     def reset(self):
         """Reset the board to default."""
-        self._deviceList = []                                   # Clear device list
+        with self._lock:
+            self._deviceList = []                               # Clear device list
+            self._devices = {}                                  # Clear device index
@@ -7,17 +7,25 @@ i.e. there is a background thread doing all the work and calls are non-blocking.
 """
 
 import socket as sock                                           # Standard socket API. Communication is over TCP/IP
+import struct                                                   # Errors of packets that cannot be unpacked
 import threading                                                # Threading class for the background thread
 import json                                                     # Serializing class. All objects sent are serialized
-from collections import deque                                   # Queues will be used for recieving and sending
 import logging                                                  # This class logs all info - so logging is imported
 import time                                                     # For delays in the background thread
 from connections.connection import Connection
+from connections import protocol                                # Framing of the messages (shared with the Firmware)
 
 
 LOG_LEVEL_PRINT = logging.WARN
 LOG_LEVEL_SAVE = logging.DEBUG
 
+RECV_QUEUE_SIZE = 1000                                          # Received data messages kept until the GUI takes them
+QUEUE_POLICY = protocol.QUEUE_DROP_OLDEST                       # Policy of the full receive queue (control messages are kept)
+COMPRESSION = protocol.COMPRESSIONS                              # Compressions offered to the board (binary protocol)
+UDP_STREAM = False                                              # Request the data messages over UDP (lowest latency, no reliability)
+UDP_PORT = 12347                                                # Local port of the UDP data stream
+UDP_BUFFER_SIZE = 65536                                         # Largest datagram received
+
 
 class BeagleboneGreenWirelessConnection(Connection):
     """BeagleboneGreenWirelessConnection connection."""
@@ -26,10 +34,10 @@ class BeagleboneGreenWirelessConnection(Connection):
     _timeout = 0.1
 
     # Send queue
-    _sendQueue = deque()
+    _sendQueue = None
 
-    # Recv queue
-    _recvQueue = deque()
+    # Recv queue (bounded for the data messages)
+    _recvQueue = None
 
     # Logger object used by the class to create the log file
     _logger = logging.getLogger('BeagleboneGreenWireless')
@@ -52,6 +60,18 @@ class BeagleboneGreenWirelessConnection(Connection):
     # The logger
     _logger = None
 
+    # The protocol negotiated with the board (json, binary)
+    _protocol = protocol.PROTOCOL_JSON
+
+    # Decoder splitting the received stream into messages
+    _decoder = None
+
+    # The UDP socket of the data stream, None if the data is received over TCP
+    _udp = None
+
+    # Loss and reordering statistics of the UDP data stream
+    _streamStats = None
+
     def __init__(self):
         """
         Class constructor.
@@ -61,8 +81,11 @@ class BeagleboneGreenWirelessConnection(Connection):
         super().__init__('BeagleboneGreenWirelessConnection')
 
         self._commsThreadRun = True                             # Initialize the thread enable boolean
-        self._sendQueue = deque()                               # Initialize the send queue
-        self._recvQueue = deque()                               # Initialize the recieve queue
+        self._sendQueue = protocol.MessageQueue()               # Initialize the send queue
+        self._recvQueue = protocol.MessageQueue(RECV_QUEUE_SIZE, QUEUE_POLICY) # Initialize the recieve queue
+        self._protocol = protocol.PROTOCOL_JSON                 # Talk JSON until a binary protocol is negotiated
+        self._decoder = protocol.Decoder()                      # Initialize the stream decoder
+        self._streamStats = protocol.PacketStats()              # Initialize the UDP stream statistics
 
         # Configure the logger
         self._logger = logging.getLogger('BeagleboneGreenWirelessConnection')
@@ -99,34 +122,21 @@ class BeagleboneGreenWirelessConnection(Connection):
 
     def _innerThread(self):
         """Inner thread function, does all socket sending and recieving."""
-        remainder = ""                                          # Remainder mechanism for TCP incomplete transmissions
         while True:                                             # While loop dedicated to recieving and sending data
             if (self._s == None):                               # Check if a socket is created
                 time.sleep(0.5);                                # Wait a bit
                 continue;                                       # Retry on next loop
             try:                                                # Socket timeout will throw an exception
-                data = self._s.recv(1024)
-                if not data: break                              # This means remote location closed socket
-                self._logger.debug("Recieved RAW data: " + str(data))
-                m_list = (remainder + data.decode("utf-8")).split("}")  # Add the recieved data to the previous remainder
-                remainder = ""
-                while len(m_list) > 0:                          # After it's split, go through all sub-messages to compose a complete message
-                                                                # If we have a message stub and it's imbalanced (more '{' than '}')
-                    if remainder and remainder.count("{") > remainder.count("}"):
-                        remainder += m_list.pop(0)              # Add the next sub-message
-                        if len(m_list) > 0:
-                            remainder += "}"                    # Add terminator only if the split indicates we recieved it
-                    elif remainder:                             # If we have a message and it's balanced -> we have a complete message
-                        self._recvQueue.append(json.loads(remainder))
-                        self._logger.info("Recieved data: " + str(remainder))
-                        remainder = ""                          # After the recieve reset the remainder
-                                                                # If we have no message and the list is almost empty - only "" remains
-                    elif len(m_list) == 1 and m_list[0] == "":
-                         m_list.pop(0)                          # Empty it
-                    else:                                       # If we have no message and the list is not empty -> start a new sub-message
-                        remainder += m_list.pop(0)
-                        if len(m_list) > 0:
-                            remainder += "}"                    # Add terminator only if the split indicates we recieved it
+                count = self._decoder.recvInto(self._s)         # Receive directly into the decoder buffer
+                if not count: break                             # This means remote location closed socket
+                self._logger.debug("Recieved RAW data: " + str(count) + " bytes")
+                for message in self._decoder.decode():          # Decode all completed messages
+                    if message['type'] == 'Hello':              # Answer to the protocol negotiation
+                        self._protocol = protocol.negotiate([message.get('protocol')])
+                        self._logger.info("Negotiated protocol: " + self._protocol + " " + str(message.get('compression', [])))
+                    else:
+                        self._recvQueue.put(message)            # May drop old data if the GUI falls behind
+                        self._logger.debug("Recieved data: %s", message) # Only formatted if logged
             except sock.timeout:                                # We expect timeouts, as we have non-blocking calls
                 pass
             except sock.error as exc:                           # Socket error occured. Log it and mark the disconnect
@@ -135,14 +145,28 @@ class BeagleboneGreenWirelessConnection(Connection):
                 self._state = 'Disconnected'
                 break
             except Exception as exc:                            # Log generic errors
-                self._logger.error('General Error occurred: ' + str(exc) + ' rem: ' + str(remainder))
-            while len(self._sendQueue) > 0:                     # Pop all elements from the sending queue and send them all
-                send_message = self._sendQueue.popleft()
-                self._s.sendall(str.encode(send_message))
+                self._logger.error('General Error occurred: ' + str(exc))
+            for send_message in self._sendQueue.takeAll():      # Pop all elements from the sending queue and send them all
+                self._s.sendall(protocol.encodeMessage(send_message, self._protocol))
                 self._logger.info("Sent message: " + str(send_message))
             if not self._commsThreadRun:                        # Terminate the background thread
                 return
 
+    def _streamThread(self, udp):
+        """Stream thread function, receives the data packets of the UDP stream."""
+        while self._udp is udp and self._commsThreadRun:        # Terminate when the stream is closed
+            try:
+                datagram, addr = udp.recvfrom(UDP_BUFFER_SIZE)
+                sequence, timestamp, message = protocol.decodePacket(datagram)
+                if self._streamStats.update(sequence):          # Drop duplicated packets
+                    self._recvQueue.put(message)                # May drop old data if the GUI falls behind
+            except sock.timeout:                                # We expect timeouts, as we have non-blocking calls
+                pass
+            except (ValueError, struct.error) as exc:           # Drop packets that cannot be decoded
+                self._logger.error('Invalid packet: ' + str(exc))
+            except sock.error as exc:                           # Socket closed by the disconnect
+                self._logger.error('UDP Error occurred: ' + str(exc))
+                return
 
 
     def connect(self):
@@ -153,17 +177,39 @@ class BeagleboneGreenWirelessConnection(Connection):
             self._s.settimeout(0.1)                         # Timeout is for blocking calls
             self._s.connect((self._ip, self._port))         # Specify ip/port of the socket
             self._logger.info("Connected to: " + str(self._ip))
+            self._protocol = protocol.PROTOCOL_JSON         # Every new connection starts with JSON
+            self._decoder.reset()                           # Drop data of previous connections
+            self._sendQueue.put(protocol.helloMessage(compression=COMPRESSION), front=True) # Offer the supported protocols to the board
+            if UDP_STREAM:
+                self._openStream()                          # Receive the data over UDP
             self._state = 'Connected'                       # Report new state
         except sock.timeout:                                # Since we've set the timeout to 100ms, it's Ok to timeout
             self._state = 'Disconnected'
             raise ConnectionRefusedError('Could not established TCP/IP connection')
 
 
+    def _openStream(self):
+        """Open the UDP socket and request the data stream from the board."""
+        udp = sock.socket(sock.AF_INET, sock.SOCK_DGRAM)    # Create a UDP socket and set it's timeout
+        udp.setsockopt(sock.SOL_SOCKET, sock.SO_REUSEADDR, 1)
+        udp.settimeout(0.1)                                 # Timeout is for blocking calls
+        udp.bind(('', UDP_PORT))
+        self._streamStats.reset()                           # Sequence numbers start over with every stream
+        self._udp = udp
+        streamThread = threading.Thread(target=self._streamThread, args=(udp,), name="StreamThread")
+        streamThread.daemon = True                          # Set thread as daemonic
+        streamThread.start()
+        self._sendQueue.put(protocol.streamMessage(UDP_PORT)) # Request the data over UDP
+        self._logger.info("Streaming on port: " + str(UDP_PORT))
+
     def disconnect(self):
         """Close the connection and stop the communication thread."""
         if (self._s != None):                               # Close socket if open
             self._s.close()
         self._s = None
+        if (self._udp != None):                             # Close UDP socket if open
+            self._udp.close()
+        self._udp = None
         time.sleep(0.5)
         self._state = 'Disconnected'
         self._logger.info("Disconneted from: " + str(self._ip))
@@ -178,18 +224,39 @@ class BeagleboneGreenWirelessConnection(Connection):
     def sendMessages(self, messages):
         """Send a data object to the remote host."""
         for message in messages:
-            self._sendQueue.append(message)
+            self._sendQueue.put(message)
             self._logger.debug('Message added to send queue: ' + str(message))
 
     def getMessages(self):
         """Get a list of all the messages that have been recieved since the last call of this function."""
-        messages = []                                           # return object initialized as an empty list
-        while len(self._recvQueue) > 0:                         # Pop all messages from the recieve queue and add them to the return list
-            message = self._recvQueue.popleft()
-            self._logger.debug('Message removed from rcv queue: ' + str(message))
-            messages.append(message)
+        messages = self._recvQueue.takeAll()                    # Pop all messages from the recieve queue
+        self._logger.debug('Messages removed from rcv queue: ' + str(len(messages)))
         return list(map(lambda x: json.dumps(x), messages))     # Messages returned need to be stringified JSON objects
 
+    def getParsedMessages(self):
+        """Get the messages that have been recieved since the last call of this function as parsed dicts."""
+        messages = self._recvQueue.takeAll()                    # Pop all messages from the recieve queue
+        self._logger.debug('Messages removed from rcv queue: ' + str(len(messages)))
+        return messages                                         # Already decoded by the communication thread
+
+    def waitMessages(self, timeout):
+        """Wait until messages have been recieved or the timeout (s) expired, return True for recieved messages."""
+        return self._recvQueue.wait(timeout)
+
+    def getThroughput(self):
+        """Get the received bytes and messages per second since the last call of this function."""
+        return self._decoder.throughput()
+
+    def getDropped(self):
+        """Get the number of data messages and samples dropped by the full receive queue."""
+        return self._recvQueue.dropped()
+
+    def getStreamStats(self):
+        """Get the received, lost, reordered and duplicated packets of the UDP stream or None without stream."""
+        if (self._udp == None):
+            return None
+        return self._streamStats.stats()
+
     def getState(self):
         """Get the connection state."""
         return self._state
@@ -7,15 +7,17 @@ Representation of a connection to the physical board
 Abstract definition of a physical board connection representation
 """
 
+import json
+import time
 from abc import ABC, abstractmethod
 
 """Globals"""
 # Possible connection states
 possibleStatusTypes = ['Disconnected', 'Connected', 'Corrupted']
 # Ingoing message types
-possibleIncomingMessageTypes = ['Register', 'Deregister', 'D', 'CycleDuration', 'Ping']
+possibleIncomingMessageTypes = ['Register', 'Deregister', 'D', 'CycleDuration', 'Ping', 'Hello']
 # Outgoing message types
-possibleOutgoingMessageTypes = ['DeviceList', 'Set', 'Settings', 'Scan', 'Ping']
+possibleOutgoingMessageTypes = ['DeviceList', 'Set', 'Settings', 'Scan', 'Ping', 'Hello', 'Subscribe', 'Stream']
 
 class Message():
     """Message coming form the board."""
@@ -83,11 +85,28 @@ class Connection(ABC):
         """Get a list of all the messages that have been recieved since the last call of this function."""
         pass
 
+    def getParsedMessages(self):
+        """Get the messages that have been recieved since the last call as parsed dicts (instead of JSON strings)."""
+        return list(map(lambda x: json.loads(x), self.getMessages()))
+
+    def waitMessages(self, timeout):
+        """Wait until messages have been recieved or the timeout (s) expired, return True for recieved messages."""
+        time.sleep(timeout)
+        return True
+
     @abstractmethod
     def sendMessages(self, messages):
         """Send a list of messages."""
         pass
 
+    def getDropped(self):
+        """Get the number of data messages and samples dropped by the receive queue."""
+        return {'messages': 0, 'samples': 0}
+
+    def getStreamStats(self):
+        """Get the statistics of the UDP data stream, None if the data is not streamed."""
+        return None
+
     def type(self):
         """Get the type."""
         return self._type
@@ -0,0 +1,904 @@
+# -*- coding: utf-8 -*-
+# Author: Cyrill Lippuner
+# Date: October 2018
+"""
+SoftWEAR Protocol module.
+
+    Serialization and framing of the messages exchanged between the Firmware and
+    the Interface. Two protocols are available:
+
+    'json'   Every message is a bare JSON object, no delimiter (original protocol).
+    'binary' Every message is wrapped in a length-prefixed frame. 'D' messages
+             are packed as binary sample blocks (float64 timestamps, float32
+             values), all other messages are JSON payloads.
+
+    With the 'binary' protocol the 'Hello' may also negotiate a compression (frame
+    flags): 'quantize' packs the samples of the registered devices as fixed-point
+    integers (step per dimension from the 'dataResolution' or 'dataRange' of the
+    'Register' message) delta encoded across the samples of a block, 'zlib'
+    deflates larger frame payloads. Both ends learn the steps from the 'Register'
+    messages passing by, the frames describe themselves with their flags.
+
+    Optionally the 'D' messages are streamed over UDP ('Stream' message): every
+    datagram is a single packet frame holding a sequence number, the send time
+    and as many sample blocks as fit into PACKET_SIZE bytes.
+
+    The protocol is negotiated with a 'Hello' message right after connecting.
+    A peer that does not answer the 'Hello' keeps on talking 'json'. Decoders
+    accept both formats at any time, the negotiation only affects the sender.
+
+    This file is shared by the Firmware (src/ProtocolModule.py) and the Interface
+    (src/connections/protocol.py). Keep both copies identical.
+"""
+
+import json                                                     # Serializing class for the JSON payloads
+import struct                                                   # Packing of the binary frames
+import zlib                                                     # Compression of the frame payloads
+import time                                                     # Timing of the throughput counters
+import threading                                                # Condition of the message queues
+from collections import deque, OrderedDict                      # Storage of the message queues and encoded blocks
+
+PROTOCOL_JSON = 'json'                                          # Bare JSON messages
+PROTOCOL_BINARY = 'binary'                                      # Length-prefixed frames
+PROTOCOLS = [PROTOCOL_BINARY, PROTOCOL_JSON]                    # Supported protocols ordered by preference
+
+# Frame header: magic, frame type, flags, payload length
+FRAME_MAGIC = b'SW'
+FRAME_HEADER = struct.Struct('<2sBBI')
+
+# Frame types
+FRAME_JSON = 0x01                                               # Payload is an utf-8 encoded JSON message
+FRAME_DATA = 0x02                                               # Payload is a packed 'D' message
+FRAME_PACKET = 0x03                                             # Payload is a sequence-numbered packed 'D' message (UDP)
+
+# Frame flags
+FLAG_COMPACT = 0x01                                             # Every block of the data frame starts with its block type
+FLAG_ZLIB = 0x02                                                # Payload is deflated
+
+# Compressions of the 'binary' protocol
+COMPRESS_QUANTIZE = 'quantize'                                  # Fixed-point and delta encoded data blocks
+COMPRESS_ZLIB = 'zlib'                                          # Deflated frame payloads
+COMPRESSIONS = [COMPRESS_QUANTIZE, COMPRESS_ZLIB]
+
+# Data frame layout: block count, then for each block the name (length prefixed),
+# cycle duration, sample count and dimension followed by the timestamps and the
+# value columns (one column per dimension)
+DATA_HEADER = struct.Struct('<H')
+BLOCK_NAME = struct.Struct('<B')
+BLOCK_HEADER = struct.Struct('<fHB')
+
+# Block types of compact data frames
+BLOCK_RAW = 0x00                                                # Block as in a data frame
+BLOCK_QUANTIZED = 0x01                                          # Block of fixed-point values
+BLOCK_TYPE = struct.Struct('<B')
+
+# Quantized block layout after the block header: first timestamp and integer width, then
+# the int32 timestamp deltas in TIMESTAMP_STEP units and the delta encoded integer columns.
+# The smallest integer of the width stands for 'None' and leaves the running value as is.
+QUANTIZED_HEADER = struct.Struct('<dB')
+QUANTIZED_WIDTHS = [(1, 'b', 0x7F), (2, 'h', 0x7FFF), (4, 'i', 0x7FFFFFFF)] # Width, format and limit of the integers
+QUANTIZE_LEVELS = 32767                                         # Steps of a data range without explicit resolution
+TIMESTAMP_STEP = 1e-6                                           # Resolution of the quantized timestamps in seconds
+ENCODING_QUANTIZED = 'quantized'                                # Encoding of the quantized blocks in the cache
+
+ZLIB_LEVEL = 1                                                  # Fast compression, the BBGW has little CPU to spare
+ZLIB_MIN_SIZE = 256                                             # Smaller payloads are not deflated
+
+# Packet header of the UDP data stream: sequence number, send timestamp
+PACKET_HEADER = struct.Struct('<Id')
+PACKET_SIZE = 1400                                              # Default size of a datagram (fits into an Ethernet frame)
+PACKET_WINDOW = 1024                                            # Recent sequence numbers kept to detect duplicates
+
+JSON_OPEN = ord('{')                                            # First byte of a JSON message
+FRAME_OPEN = ord(FRAME_MAGIC[0:1])                              # First byte of a frame
+
+NAN = float('nan')                                              # Placeholder for 'None' values in binary blocks
+
+QUEUE_DROP_OLDEST = 'dropoldest'                                # Drop the oldest data message of a full queue
+QUEUE_KEEP_LATEST = 'latest'                                    # Keep the latest sample of every device in a full queue
+QUEUE_BLOCK = 'block'                                           # Block the producer of a full queue
+QUEUE_POLICIES = [QUEUE_DROP_OLDEST, QUEUE_KEEP_LATEST, QUEUE_BLOCK]
+QUEUE_SIZE = 100                                                # Default number of data messages of a queue
+
+CACHE_SIZE = 1024                                               # Default number of blocks kept encoded per protocol
+
+RECV_SIZE = 4096                                                # Bytes requested per receive call
+BUFFER_SIZE = 65536                                             # Initial size of the receive buffer
+
+
+def toBytes(string):
+    """Return the utf-8 encoded bytes of a string."""
+    if isinstance(string, bytes):
+        return string
+    return string.encode('utf-8')
+
+def _serializable(obj):
+    """Return a JSON serializable representation of sample blocks."""
+    if hasattr(obj, 'toList'):
+        return obj.toList()
+    raise TypeError('{} is not JSON serializable'.format(type(obj)))
+
+def toJSON(message):
+    """Return the JSON string of a message (dict or already serialized string)."""
+    if isinstance(message, dict):
+        return json.dumps(message, default=_serializable)
+    return message
+
+def helloMessage(protocols=PROTOCOLS, compression=None):
+    """Return the message offering the protocols (and compressions) to the remote location."""
+    message = {'type': 'Hello', 'name': '', 'protocols': list(protocols)}
+    if compression is not None:
+        message['compression'] = list(compression)
+    return message
+
+def subscribeMessage(names=None):
+    """Return the message subscribing to the data of the device names (None for all devices)."""
+    return {'type': 'Subscribe', 'name': '', 'names': None if names is None else list(names)}
+
+def streamMessage(port=None):
+    """Return the message requesting the data over UDP to the port (None to go back to TCP)."""
+    return {'type': 'Stream', 'name': '', 'port': port}
+
+def negotiate(protocols):
+    """Return the protocol to use for the offered protocols (first supported offer wins)."""
+    for protocol in protocols:
+        if protocol in PROTOCOLS:
+            return protocol
+    return PROTOCOL_JSON
+
+def negotiateCompression(offered, supported=COMPRESSIONS):
+    """Return the offered compressions that are supported."""
+    return [compression for compression in supported if compression in offered]
+
+def resolution(register):
+    """Return the quantization step of every dimension of a 'Register' message, None if not quantizable."""
+    about = register.get('about') or {}
+    dim = register.get('dim', 0)
+    steps = about.get('dataResolution') or None                 # Empty if unknown
+    if steps is None and about.get('dataType') == 'On/Off':
+        steps = [1.] * dim
+    if steps is None and len(about.get('dataRange', [])) == 2:
+        low, high = about['dataRange']
+        steps = [float(high - low) / QUANTIZE_LEVELS] * dim
+    if steps is None or dim == 0 or len(steps) != dim or min(steps) <= 0:
+        return None
+    return [float(step) for step in steps]
+
+def trackResolutions(resolutions, message):
+    """Update the quantization steps by device name with a 'Register' or 'Deregister' message (dict or JSON string)."""
+    if not isinstance(message, dict):                           # Only parse the strings of (de)register messages
+        if '"Register"' not in message and '"Deregister"' not in message:
+            return
+        message = json.loads(message)
+    if message.get('type') == 'Register':
+        steps = resolution(message)
+        if steps is not None:
+            resolutions[message['name']] = steps
+        else:
+            resolutions.pop(message['name'], None)
+    elif message.get('type') == 'Deregister':
+        resolutions.pop(message['name'], None)
+
+def encodeFrame(frameType, payload, flags=0):
+    """Return a frame with header for the payload."""
+    return FRAME_HEADER.pack(FRAME_MAGIC, frameType, flags, len(payload)) + payload
+
+def encodeBlock(block):
+    """Pack a data block: {'name', 'values': [[timestamp, [values]]] or SampleBlock, 'cycle'}."""
+    name = toBytes(block['name'])
+    values = block['values']
+    count = len(values)
+    if hasattr(values, 'packColumns'):                          # Sample blocks pack their columns at once
+        dim = values.dim() if count > 0 else 0
+    else:
+        dim = len(values[0][1]) if count > 0 else 0
+    parts = [BLOCK_NAME.pack(len(name)), name, BLOCK_HEADER.pack(block['cycle'], count, dim)]
+    if count == 0:
+        return b''.join(parts)
+    if hasattr(values, 'packColumns'):
+        parts.append(values.packTimestamps())
+        parts.append(values.packColumns())
+    else:
+        parts.append(struct.pack('<%dd' % count, *[sample[0] for sample in values]))
+        if any(len(sample[1]) != dim for sample in values):     # All samples of a block need the same dimension
+            raise struct.error('ragged block {}'.format(block['name']))
+        flat = [NAN if sample[1][i] is None else sample[1][i] for i in range(dim) for sample in values]
+        parts.append(struct.pack('<%df' % len(flat), *flat))
+    return b''.join(parts)
+
+def encodeQuantizedBlock(block, steps):
+    """Pack a data block as fixed-point integers of the steps, delta encoded. None if it cannot be quantized."""
+    samples = list(block['values'])
+    count = len(samples)
+    dim = len(steps)
+    if count == 0 or any(len(sample[1]) != dim for sample in samples):
+        return None
+    start = samples[0][0]
+    timestamps = []
+    previous = 0
+    for sample in samples[1:]:
+        value = int(round((sample[0] - start) / TIMESTAMP_STEP)) # Offset to the first sample, no rounding drift
+        timestamps.append(value - previous)
+        previous = value
+    integers = []
+    for i in range(dim):                                        # One column per dimension
+        step = steps[i]
+        previous = 0
+        for sample in samples:
+            value = sample[1][i]
+            if value is None or value != value:                 # None and NaN are marked, see below
+                integers.append(None)
+                continue
+            value = int(round(value / step))
+            integers.append(value - previous)
+            previous = value
+    if any(abs(value) > QUANTIZED_WIDTHS[-1][2] for value in timestamps):
+        return None
+    limit = max([abs(value) for value in integers if value is not None] + [0])
+    for width, fmt, maximum in QUANTIZED_WIDTHS:
+        if limit <= maximum:
+            break
+    else:
+        return None
+    integers = [-maximum - 1 if value is None else value for value in integers]
+    name = toBytes(block['name'])
+    return b''.join([BLOCK_TYPE.pack(BLOCK_QUANTIZED), BLOCK_NAME.pack(len(name)), name,
+                     BLOCK_HEADER.pack(block['cycle'], count, dim), QUANTIZED_HEADER.pack(start, width),
+                     struct.pack('<%di' % (count - 1), *timestamps), struct.pack('<%d%s' % (count * dim, fmt), *integers)])
+
+def encodeData(data, encodedBlocks=None):
+    """Pack the data blocks of a 'D' message, encodedBlocks are the already packed blocks."""
+    if encodedBlocks is None:
+        encodedBlocks = [encodeBlock(block) for block in data]
+    return DATA_HEADER.pack(len(data)) + b''.join(encodedBlocks)
+
+def encodePackets(data, sequence, cache=None, size=PACKET_SIZE):
+    """Pack the data blocks into datagrams of at most size bytes numbered from sequence (larger blocks are sent alone)."""
+    blocks = cache.encodeAll(data, PROTOCOL_BINARY) if cache is not None else [encodeBlock(block) for block in data]
+    overhead = FRAME_HEADER.size + PACKET_HEADER.size + DATA_HEADER.size
+    timestamp = time.time()
+    packets = []
+    start = 0
+    length = overhead
+    for index, block in enumerate(blocks):
+        if index > start and length + len(block) > size:        # Close the packet before it gets too large
+            packets.append(_encodePacket(sequence + len(packets), timestamp, blocks[start:index]))
+            start = index
+            length = overhead
+        length += len(block)
+    if len(blocks) > start:
+        packets.append(_encodePacket(sequence + len(packets), timestamp, blocks[start:]))
+    return packets
+
+def _encodePacket(sequence, timestamp, blocks):
+    """Return the packet frame of the encoded blocks."""
+    payload = PACKET_HEADER.pack(sequence & 0xFFFFFFFF, timestamp) + DATA_HEADER.pack(len(blocks)) + b''.join(blocks)
+    return encodeFrame(FRAME_PACKET, payload)
+
+def decodePacket(datagram):
+    """Return the sequence number, send timestamp and 'D' message of a datagram."""
+    magic, frameType, flags, length = FRAME_HEADER.unpack_from(datagram, 0)
+    if magic != FRAME_MAGIC or frameType != FRAME_PACKET or length != len(datagram) - FRAME_HEADER.size:
+        raise ValueError('invalid packet')
+    sequence, timestamp = PACKET_HEADER.unpack_from(datagram, FRAME_HEADER.size)
+    return sequence, timestamp, {'type': 'D', 'data': decodeData(datagram, FRAME_HEADER.size + PACKET_HEADER.size)}
+
+def decodeData(payload, offset=0, compact=False, resolutions=None):
+    """Unpack the data blocks of a 'D' message starting at offset, quantized blocks need the resolutions by name."""
+    data = []
+    (blockCount,) = DATA_HEADER.unpack_from(payload, offset)
+    offset += DATA_HEADER.size
+    for _ in range(blockCount):
+        blockType = BLOCK_RAW
+        if compact:
+            (blockType,) = BLOCK_TYPE.unpack_from(payload, offset)
+            offset += BLOCK_TYPE.size
+        (nameLength,) = BLOCK_NAME.unpack_from(payload, offset)
+        offset += BLOCK_NAME.size
+        name = bytes(payload[offset:offset + nameLength]).decode('utf-8')
+        offset += nameLength
+        cycle, count, dim = BLOCK_HEADER.unpack_from(payload, offset)
+        offset += BLOCK_HEADER.size
+        if blockType == BLOCK_QUANTIZED:
+            values, offset = _decodeQuantized(payload, offset, count, dim, (resolutions or {}).get(name))
+            data.append({'name': name, 'values': values, 'cycle': cycle})
+            continue
+        timestamps = struct.unpack_from('<%dd' % count, payload, offset)
+        offset += 8 * count
+        columns = struct.unpack_from('<%df' % (count * dim), payload, offset)
+        offset += 4 * count * dim
+        columns = [None if value != value else value for value in columns] # Map NaN back to None
+        values = [[timestamps[i], columns[i::count]] for i in range(count)]
+        data.append({'name': name, 'values': values, 'cycle': cycle})
+    return data
+
+def _decodeQuantized(payload, offset, count, dim, steps):
+    """Unpack the samples of a quantized block. Returns the samples and the offset behind the block."""
+    if steps is None or len(steps) != dim:
+        raise ValueError('quantized block of an unregistered device')
+    start, width = QUANTIZED_HEADER.unpack_from(payload, offset)
+    offset += QUANTIZED_HEADER.size
+    formats = [(fmt, maximum) for w, fmt, maximum in QUANTIZED_WIDTHS if w == width]
+    if len(formats) == 0:
+        raise ValueError('quantized width {} is not supported'.format(width))
+    fmt, maximum = formats[0]
+    deltas = struct.unpack_from('<%di' % (count - 1), payload, offset)
+    offset += 4 * (count - 1)
+    integers = struct.unpack_from('<%d%s' % (count * dim, fmt), payload, offset)
+    offset += width * count * dim
+    timestamps = [start]
+    value = 0
+    for delta in deltas:
+        value += delta
+        timestamps.append(start + value * TIMESTAMP_STEP)
+    columns = []
+    for i in range(dim):
+        value = 0
+        column = []
+        for delta in integers[i * count:(i + 1) * count]:
+            if delta == -maximum - 1:                           # Marked 'None'
+                column.append(None)
+                continue
+            value += delta
+            column.append(value * steps[i])
+        columns.append(column)
+    return [[timestamps[j], [column[j] for column in columns]] for j in range(count)], offset
+
+def encodeMessage(message, protocol=PROTOCOL_JSON, cache=None):
+    """Serialize a message (dict or JSON string) to bytes for the protocol, data blocks are taken from the cache."""
+    if protocol == PROTOCOL_BINARY:
+        if isData(message):
+            try:
+                blocks = cache.encodeAll(message['data'], PROTOCOL_BINARY) if cache is not None else None
+                return encodeFrame(FRAME_DATA, encodeData(message['data'], blocks))
+            except struct.error:                                # Ragged or non numeric samples are sent as JSON
+                pass
+        return encodeFrame(FRAME_JSON, encodeMessage(message, PROTOCOL_JSON, cache))
+    if isData(message) and cache is not None:                   # Join the blocks encoded once for all connections
+        return b'{"type": "D", "data": [' + b', '.join(cache.encodeAll(message['data'], PROTOCOL_JSON)) + b']}'
+    return toBytes(toJSON(message))
+
+def isData(message):
+    """Return True for data ('D') messages, which may be dropped by full queues."""
+    return isinstance(message, dict) and message.get('type') == 'D'
+
+def countSamples(message):
+    """Return the number of samples of a data message."""
+    return sum([len(block['values']) for block in message['data']])
+
+def coalesce(messages):
+    """Merge consecutive 'D' messages into one, the order to the other messages is kept."""
+    coalesced = []
+    for message in messages:
+        if (isinstance(message, dict) and message['type'] == 'D' and len(coalesced) > 0 and
+                isinstance(coalesced[-1], dict) and coalesced[-1]['type'] == 'D'):
+            coalesced[-1] = {'type': 'D', 'data': coalesced[-1]['data'] + message['data']}
+        else:
+            coalesced.append(message)
+    return coalesced
+
+def decodeFrame(frameType, flags, payload, start=0, end=None, resolutions=None):
+    """Return the message contained in the frame payload[start:end]."""
+    if flags & FLAG_ZLIB:
+        try:
+            payload = zlib.decompress(bytes(payload[start:end]))
+        except zlib.error as exc:
+            raise ValueError('invalid deflated payload: {}'.format(exc))
+        start = 0
+        end = len(payload)
+    if frameType == FRAME_DATA:
+        return {'type': 'D', 'data': decodeData(payload, start, flags & FLAG_COMPACT, resolutions)}
+    if frameType == FRAME_PACKET:
+        return {'type': 'D', 'data': decodeData(payload, start + PACKET_HEADER.size)}
+    if frameType == FRAME_JSON:
+        return json.loads(bytes(payload[start:end]).decode('utf-8'))
+    raise ValueError('frame type {} is not supported'.format(frameType))
+
+
+class Decoder:
+    """
+    Split a received byte stream into messages. Bare JSON messages and frames may be mixed.
+
+    The bytes are received into a reusable buffer; only the part between _start and _end
+    is pending. Partially received messages are kept and resumed without re-scanning.
+    """
+
+    # Receive buffer, reused for the whole connection
+    _buffer = None
+
+    # Start of the pending bytes in the buffer
+    _start = 0
+
+    # End of the pending bytes in the buffer
+    _end = 0
+
+    # Position up to which the braces of a pending JSON message have been counted
+    _scan = 0
+
+    # Brace depth of the pending JSON message
+    _depth = 0
+
+    # Number of bytes received
+    bytesReceived = 0
+
+    # Number of messages decoded
+    messagesDecoded = 0
+
+    # Number of messages that could not be decoded
+    errors = 0
+
+    # Counters and time of the last throughput call
+    _lastThroughput = (0., 0, 0)
+
+    # Quantization steps of the registered devices by name
+    _resolutions = None
+
+    def __init__(self, size=BUFFER_SIZE):
+        """Create an empty decoder."""
+        self._buffer = bytearray(size)
+        self.reset()
+
+    def reset(self):
+        """Drop all pending bytes and counters, used when a new connection is established."""
+        self._start = 0
+        self._end = 0
+        self._scan = 0
+        self._depth = 0
+        self.bytesReceived = 0
+        self.messagesDecoded = 0
+        self.errors = 0
+        self._lastThroughput = (time.time(), 0, 0)
+        self._resolutions = {}
+
+    def pending(self):
+        """Return the number of received bytes not yet decoded."""
+        return self._end - self._start
+
+    def throughput(self):
+        """Return the received bytes and decoded messages per second since the last call."""
+        now = time.time()
+        last, bytesReceived, messagesDecoded = self._lastThroughput
+        self._lastThroughput = (now, self.bytesReceived, self.messagesDecoded)
+        duration = max(now - last, 1e-6)
+        return {'bytes': (self.bytesReceived - bytesReceived) / duration,
+                'messages': (self.messagesDecoded - messagesDecoded) / duration}
+
+    def recvInto(self, s, size=RECV_SIZE):
+        """Receive from the socket directly into the buffer. Returns the number of bytes (0 if closed)."""
+        self._reserve(size)
+        view = memoryview(self._buffer)
+        try:
+            count = s.recv_into(view[self._end:])
+        finally:
+            view = None                                         # Release the buffer so it may be resized
+        self._end += count
+        self.bytesReceived += count
+        return count
+
+    def feed(self, data):
+        """Add received bytes and return the list of completed messages."""
+        count = len(data)
+        self._reserve(count)
+        self._buffer[self._end:self._end + count] = data
+        self._end += count
+        self.bytesReceived += count
+        return self.decode()
+
+    def decode(self):
+        """Return the list of messages completed by the received bytes."""
+        messages = []
+        while True:
+            try:
+                complete, message = self._next()
+            except (ValueError, struct.error):                  # Drop messages that cannot be decoded
+                self.errors += 1
+                continue
+            if not complete:
+                if self._start == self._end:                    # Everything consumed, rewind for free
+                    self._start = self._end = self._scan = 0
+                self.messagesDecoded += len(messages)
+                return messages
+            messages.append(message)
+            trackResolutions(self._resolutions, message)        # Steps of the quantized blocks that follow
+
+    def _reserve(self, size):
+        """Make room for size bytes behind the pending bytes."""
+        if len(self._buffer) - self._end >= size:
+            return
+        pending = self._end - self._start
+        if self._start > 0:                                     # Move the pending bytes to the front
+            self._buffer[0:pending] = self._buffer[self._start:self._end]
+            self._scan = max(self._scan - self._start, 0)
+            self._start = 0
+            self._end = pending
+        if len(self._buffer) - self._end < size:                # Grow for messages larger than the buffer
+            self._buffer.extend(bytearray(max(size, len(self._buffer))))
+
+    def _next(self):
+        """Consume the next complete message from the buffer. Returns (complete, message)."""
+        buf = self._buffer
+        end = self._end
+        start = self._start
+        while start < end and buf[start] != JSON_OPEN and buf[start] != FRAME_OPEN:
+            start += 1                                          # Skip delimiters between messages
+        self._start = start
+        if start == end:
+            return False, None
+
+        if buf[start] == FRAME_OPEN:                            # Length-prefixed frame
+            if end - start < FRAME_HEADER.size:
+                return False, None
+            magic, frameType, flags, length = FRAME_HEADER.unpack_from(buf, start)
+            if magic != FRAME_MAGIC:
+                self._start = start + 1                         # Resynchronize on the next byte
+                raise ValueError('invalid frame magic')
+            frameEnd = start + FRAME_HEADER.size + length
+            if frameEnd > end:
+                return False, None
+            self._start = frameEnd
+            return True, decodeFrame(frameType, flags, buf, start + FRAME_HEADER.size, frameEnd, self._resolutions)
+
+        if self._scan <= start:                                 # New JSON message, count braces up to the closing one
+            self._scan = start
+            self._depth = 0
+        while True:
+            close = buf.find(b'}', self._scan, end)
+            if close < 0:                                       # Incomplete, resume after the counted bytes
+                self._depth += buf.count(b'{', self._scan, end)
+                self._scan = end
+                return False, None
+            self._depth += buf.count(b'{', self._scan, close) - 1
+            self._scan = close + 1
+            if self._depth < 0:                                 # Unbalanced message, drop it
+                self._start = self._scan
+                self._depth = 0
+                raise ValueError('unbalanced JSON message')
+            if self._depth == 0:
+                self._start = self._scan
+                return True, json.loads(bytes(buf[start:close + 1]).decode('utf-8'))
+
+class Encoder:
+    """
+    Serialize the messages of a connection for the negotiated protocol and compression.
+
+    The quantization steps of the devices are learned from the 'Register' messages
+    sent on the connection, so the remote decoder knows them before the first
+    quantized block of a device. Blocks of unknown devices are sent raw.
+    """
+
+    # The protocol negotiated with the remote location (json, binary)
+    protocol = PROTOCOL_JSON
+
+    # The compressions negotiated with the remote location (binary protocol only)
+    compression = []
+
+    # Quantization steps of the devices registered on the connection by name
+    _resolutions = None
+
+    # Encoded data blocks shared with the other connections
+    _cache = None
+
+    def __init__(self, cache=None):
+        """Create an encoder talking JSON until a protocol is negotiated."""
+        self._cache = cache
+        self.reset()
+
+    def reset(self):
+        """Go back to JSON without compression, used when a new connection is established."""
+        self.protocol = PROTOCOL_JSON
+        self.compression = []
+        self._resolutions = {}
+
+    def setProtocol(self, protocol, compression=None):
+        """Set the negotiated protocol and compressions."""
+        self.protocol = protocol
+        self.compression = list(compression or [])
+
+    def encode(self, message):
+        """Serialize a message (dict or JSON string) to bytes."""
+        trackResolutions(self._resolutions, message)
+        if self.protocol != PROTOCOL_BINARY or len(self.compression) == 0:
+            return encodeMessage(message, self.protocol, self._cache)
+        flags = 0
+        frameType = FRAME_JSON
+        if isData(message):
+            try:
+                if COMPRESS_QUANTIZE in self.compression:
+                    payload = encodeData(message['data'], [self._encodeCompact(block) for block in message['data']])
+                    flags |= FLAG_COMPACT
+                else:
+                    blocks = self._cache.encodeAll(message['data'], PROTOCOL_BINARY) if self._cache is not None else None
+                    payload = encodeData(message['data'], blocks)
+                frameType = FRAME_DATA
+            except struct.error:                                # Ragged or non numeric samples are sent as JSON
+                flags = 0
+                payload = encodeMessage(message, PROTOCOL_JSON, self._cache)
+        else:
+            payload = toBytes(toJSON(message))
+        if COMPRESS_ZLIB in self.compression and len(payload) >= ZLIB_MIN_SIZE:
+            deflated = zlib.compress(payload, ZLIB_LEVEL)
+            if len(deflated) < len(payload):                    # Keep the payload if it does not shrink
+                payload = deflated
+                flags |= FLAG_ZLIB
+        return encodeFrame(frameType, payload, flags)
+
+    def _encodeCompact(self, block):
+        """Return the block of a compact data frame, quantized if the steps of the device are known."""
+        steps = self._resolutions.get(block['name'])
+        if steps is None:
+            if self._cache is not None:
+                return BLOCK_TYPE.pack(BLOCK_RAW) + self._cache.encode(block, PROTOCOL_BINARY)
+            return BLOCK_TYPE.pack(BLOCK_RAW) + encodeBlock(block)
+        if self._cache is not None:
+            return self._cache.encode(block, ENCODING_QUANTIZED, steps)
+        encoded = encodeQuantizedBlock(block, steps)
+        return encoded if encoded is not None else BLOCK_TYPE.pack(BLOCK_RAW) + encodeBlock(block)
+
+
+class MessageQueue:
+    """
+    Bounded queue of messages. Only data ('D') messages count against the size; control
+    messages (Register, Deregister, Hello, ...) are never dropped nor block the producer.
+
+    A full queue applies its policy to the new data message:
+    'dropoldest' drops the oldest queued data message, 'latest' merges all queued data
+    messages into one holding only the latest sample of every device and 'block'
+    blocks the producer until the consumer made room (or the queue is cleared).
+    """
+
+    # Maximum number of queued data messages
+    _size = QUEUE_SIZE
+
+    # Policy applied when the queue is full
+    _policy = QUEUE_DROP_OLDEST
+
+    # Queued messages
+    _queue = None
+
+    # Number of queued data messages
+    _data = 0
+
+    # Number of dropped data messages and samples
+    _dropped = None
+
+    # Incremented when the queue is cleared, releases the blocked producers
+    _generation = 0
+
+    # Condition guarding the queue, notified when messages are taken
+    _condition = None
+
+    def __init__(self, size=QUEUE_SIZE, policy=QUEUE_DROP_OLDEST):
+        """Create an empty queue."""
+        if policy not in QUEUE_POLICIES:
+            raise ValueError('Policy {} is not allowed'.format(policy))
+        if size < 1:
+            raise ValueError('Size {} is not allowed'.format(size))
+        self._size = size
+        self._policy = policy
+        self._queue = deque()
+        self._data = 0
+        self._dropped = {'messages': 0, 'samples': 0}
+        self._generation = 0
+        self._condition = threading.Condition()
+
+    def __len__(self):
+        """Return the number of queued messages."""
+        return len(self._queue)
+
+    def put(self, message, front=False):
+        """Queue a message (dict or JSON string), control messages may be put in front."""
+        with self._condition:
+            if isData(message):
+                if self._data >= self._size:
+                    if self._policy == QUEUE_BLOCK:
+                        generation = self._generation
+                        while self._data >= self._size and generation == self._generation:
+                            self._condition.wait()              # Wait until messages are taken or cleared
+                    elif self._policy == QUEUE_KEEP_LATEST:
+                        self._keepLatest()
+                    else:
+                        self._dropOldest()
+                self._data += 1
+            if front:
+                self._queue.appendleft(message)
+            else:
+                self._queue.append(message)
+            self._condition.notify_all()                        # Wake the waiting consumer
+
+    def putAll(self, messages):
+        """Queue a list of messages."""
+        for message in messages:
+            self.put(message)
+
+    def wait(self, timeout=None):
+        """Wait until a message is queued or the timeout (s) expired, return True for queued messages."""
+        with self._condition:
+            if len(self._queue) == 0:
+                self._condition.wait(timeout)
+            return len(self._queue) > 0
+
+    def takeAll(self):
+        """Return and remove all queued messages."""
+        with self._condition:
+            messages = list(self._queue)
+            self._queue.clear()
+            self._data = 0
+            self._condition.notify_all()
+        return messages
+
+    def clear(self):
+        """Drop all queued messages without counting them and release blocked producers."""
+        with self._condition:
+            self._queue.clear()
+            self._data = 0
+            self._generation += 1                               # Release the blocked producers
+            self._condition.notify_all()
+
+    def dropped(self):
+        """Return the number of dropped data messages and samples."""
+        with self._condition:
+            return dict(self._dropped)
+
+    def _dropOldest(self):
+        """Drop the oldest queued data message (lock needs to be held)."""
+        for index, message in enumerate(self._queue):
+            if isData(message):
+                del self._queue[index]
+                self._data -= 1
+                self._dropped['messages'] += 1
+                self._dropped['samples'] += countSamples(message)
+                return
+
+    def _keepLatest(self):
+        """Merge the queued data messages into one with the latest sample of every device (lock needs to be held)."""
+        latest = {}                                             # Latest block of every device
+        order = []                                              # Devices in order of appearance
+        messages = []                                           # Queued control messages
+        position = 0                                            # The merged message replaces the last data message
+        for message in self._queue:
+            if not isData(message):
+                messages.append(message)
+                continue
+            position = len(messages)
+            self._dropped['messages'] += 1
+            for block in message['data']:
+                name = block['name']
+                if name not in latest:
+                    order.append(name)
+                    latest[name] = {'name': name, 'values': [], 'cycle': block['cycle']}
+                count = len(block['values'])
+                if count > 0:                                   # Keep the last sample, drop the older ones
+                    self._dropped['samples'] += count - 1 + len(latest[name]['values'])
+                    latest[name] = {'name': name, 'values': [block['values'][count - 1]], 'cycle': block['cycle']}
+        self._dropped['messages'] -= 1                          # The merged message stays queued
+        messages.insert(position, {'type': 'D', 'data': [latest[name] for name in order]})
+        self._queue = deque(messages)
+        self._data = 1
+
+
+class BlockCache:
+    """
+    Encoded data blocks shared by the connections of a fan-out server. Every block is
+    serialized once per protocol, no matter to how many connections it is sent.
+
+    Blocks are identified by the object, the cache keeps a reference so the identity
+    stays unique while the block is cached. The oldest blocks are evicted first.
+    """
+
+    # Maximum number of cached blocks
+    _size = CACHE_SIZE
+
+    # Cached blocks: id(block) -> (block, {protocol: bytes})
+    _blocks = None
+
+    # Number of block encodings and reused encodings
+    _stats = None
+
+    # Lock shared by the writers of the connections
+    _lock = None
+
+    def __init__(self, size=CACHE_SIZE):
+        """Create an empty cache."""
+        if size < 1:
+            raise ValueError('Size {} is not allowed'.format(size))
+        self._size = size
+        self._blocks = OrderedDict()
+        self._stats = {'encoded': 0, 'reused': 0}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        """Return the number of cached blocks."""
+        return len(self._blocks)
+
+    def encode(self, block, protocol, steps=None):
+        """Return the encoded block for the protocol (binary block, JSON object or quantized block of the steps)."""
+        with self._lock:
+            entry = self._blocks.get(id(block))
+            if entry is not None and entry[0] is not block:     # Identity of an evicted block reused
+                del self._blocks[id(block)]
+                entry = None
+            if entry is None:
+                entry = (block, {})
+                self._blocks[id(block)] = entry
+                while len(self._blocks) > self._size:
+                    self._blocks.popitem(last=False)            # Evict the oldest block
+            encoded = entry[1].get(protocol)
+            if encoded is not None:
+                self._stats['reused'] += 1
+                return encoded
+            if protocol == PROTOCOL_BINARY:
+                encoded = encodeBlock(block)
+            elif protocol == ENCODING_QUANTIZED:                # Steps are the same for all connections
+                encoded = encodeQuantizedBlock(block, steps)
+                if encoded is None:                             # Not quantizable, sent as raw block
+                    encoded = BLOCK_TYPE.pack(BLOCK_RAW) + encodeBlock(block)
+            else:
+                encoded = toBytes(json.dumps(block, default=_serializable))
+            entry[1][protocol] = encoded
+            self._stats['encoded'] += 1
+            return encoded
+
+    def encodeAll(self, blocks, protocol):
+        """Return the list of encoded blocks for the protocol."""
+        return [self.encode(block, protocol) for block in blocks]
+
+    def stats(self):
+        """Return the number of block encodings and reused encodings."""
+        with self._lock:
+            return dict(self._stats)
+
+    def clear(self):
+        """Drop all cached blocks."""
+        with self._lock:
+            self._blocks.clear()
+
+
+class PacketStats:
+    """Loss, reordering and duplicates of the received packets of a UDP data stream."""
+
+    # Highest sequence number received
+    _highest = None
+
+    # Recent sequence numbers in order of reception
+    _recent = None
+
+    # Recent sequence numbers for the lookup
+    _recentSet = None
+
+    # Number of received, lost (not yet received), reordered and duplicated packets
+    _stats = None
+
+    def __init__(self):
+        """Create empty statistics."""
+        self.reset()
+
+    def reset(self):
+        """Drop the statistics, used when a new stream is started."""
+        self._highest = None
+        self._recent = deque()
+        self._recentSet = set()
+        self._stats = {'received': 0, 'lost': 0, 'reordered': 0, 'duplicates': 0}
+
+    def update(self, sequence):
+        """Account a received packet. Returns False for duplicates, which should be dropped."""
+        if sequence in self._recentSet:
+            self._stats['duplicates'] += 1
+            return False
+        if self._highest is None:
+            self._highest = sequence
+        elif sequence > self._highest:
+            self._stats['lost'] += sequence - self._highest - 1 # Packets skipped, until they arrive late
+            self._highest = sequence
+        else:
+            self._stats['reordered'] += 1                       # A packet counted as lost arrived late
+            self._stats['lost'] = max(self._stats['lost'] - 1, 0)
+        self._stats['received'] += 1
+        self._recent.append(sequence)
+        self._recentSet.add(sequence)
+        if len(self._recent) > PACKET_WINDOW:
+            self._recentSet.discard(self._recent.popleft())
+        return True
+
+    def stats(self):
+        """Return the number of received, lost, reordered and duplicated packets."""
+        return dict(self._stats)
@@ -289,14 +289,14 @@ class DeviceSettingsWidget(QWidget):
             # Flag setting
             if ('flags' in self._device.settings()):            # Check if flags are available
                 # Checkbox for flags
-                for flag in self._device.settings()['flags']:   # Loop all flags
+                for row, flag in enumerate(self._device.settings()['flags']): # Loop all flags, one row each
                     flagCheckboxWidget = QCheckBox(flag)
                     if flag in self._device.flags():            # Check if flag is raised
                         flagCheckboxWidget.setChecked(True)
                     else:
                         flagCheckboxWidget.setChecked(False)
                     flagCheckboxWidget.stateChanged.connect(functools.partial(self._onFlagChanged, flag))
-                    settingsLayout.addWidget(flagCheckboxWidget, 3, 0, Qt.AlignLeft)
+                    settingsLayout.addWidget(flagCheckboxWidget, 3 + row, 0, Qt.AlignLeft)
 
             bodyGridLayout.addLayout(settingsLayout,            3, 0, 1, 1, Qt.AlignLeft | Qt.AlignTop)
             self._logger.debug("Device settings created")
@@ -346,13 +346,13 @@ class DeviceSettingsWidget(QWidget):
 
         if (len(newData) > 0):                                  # Only update if new data is available
             for i, pastDataI in enumerate(self._device.pastData()): # Update every plot with past data from the device
-                self._plots[i].setData(y=np.asarray(pastDataI), x=np.arange(len(pastDataI))) # Plot values
+                self._plots[i].setData(y=pastDataI, x=np.arange(len(pastDataI))) # Plot values
                 if self._device.activeDim()[i] == False:        # Check if dimension is active
                     self._plots[i].setPen((0,0,0))              # Set pen to BLACK
                 else:
                     self._plots[i].setPen(standardColorSet[i])  # Set pen to default color
                 if self._popupPlots != None and len(self._popupPlots) > 0: # Check for open popup
-                    self._popupPlots[i].setData(y=np.asarray(pastDataI), x=np.arange(len(pastDataI))) # Plot values for popup
+                    self._popupPlots[i].setData(y=pastDataI, x=np.arange(len(pastDataI))) # Plot values for popup
 
 
     def saveFileDialog(self):
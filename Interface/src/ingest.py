@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# Author: Cyrill Lippuner
+# Date: October 2018
+"""
+Ingest thread of the interface.
+
+Takes the messages parsed by the connection, updates the devices of the board and
+feeds the data streams (file and UDP) off the GUI thread. The GUI is only told to
+refresh by throttled signals, a new refresh is not signaled before the previous one
+has been drawn, so heavy plots never hold back the data.
+"""
+
+import time                                                     # Timing of the refresh signals
+import logging                                                  # Logging package
+from PyQt5.QtCore import (  pyqtSignal,                         # Core functionality from Qt
+                            QThread)
+from boards.board import Device                                 # Board base class
+
+# Logging settings
+LOG_LEVEL_PRINT = logging.INFO                                  # Set print level for stout logging
+LOG_LEVEL_SAVE = logging.DEBUG                                  # Set print level for .log logging
+
+WAIT_TIMEOUT = 100                                              # Longest wait for new messages in [ms]
+REFRESH_PERIOD = 50                                             # Shortest time between two data refreshes in [ms]
+
+
+class IngestThread(QThread):
+    """Thread decoding the received messages into the devices of the board."""
+
+    # Signal for a registered device (name)
+    registered = pyqtSignal(str)
+    # Signal for a deregistered device (name)
+    deregistered = pyqtSignal(str)
+    # Signal for new cycle durations (values)
+    cycleDuration = pyqtSignal(dict)
+    # Signal for new data of the devices, throttled
+    dataUpdated = pyqtSignal()
+
+    # The board holding the devices
+    _board = None
+    # The connection of the board
+    _connection = None
+    # The UDP broadcast of the data stream
+    _broadcast = None
+    # The recorder of the file stream
+    _recorder = None
+    # Shortest time between two data refreshes in [s]
+    _refreshPeriod = REFRESH_PERIOD / 1000.
+    # Time of the last data refresh
+    _lastRefresh = 0
+    # Flag whether new data has not been signaled yet
+    _pending = False
+    # Flag whether the signaled refresh has not been drawn yet
+    _refreshing = False
+    # Flag whether the thread should keep running
+    _running = False
+    # Logger module
+    _logger = None
+
+
+    def __init__(self, refreshPeriod=REFRESH_PERIOD, parent=None):
+        """Initialize the ingest thread with the shortest time between two refreshes in [ms]."""
+        super().__init__(parent)
+
+        # Configure the logger
+        self._logger = logging.getLogger('IngestThread')
+        self._logger.setLevel(LOG_LEVEL_PRINT)                  # Only {LOG_LEVEL} level or above will be saved
+        # fh = logging.FileHandler('../Logs/IngestThread.log', 'w')
+        # formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
+        # fh.setFormatter(formatter)
+        # fh.setLevel(LOG_LEVEL_SAVE)                             # Only {LOG_LEVEL} level or above will be saved
+        # self._logger.addHandler(fh)
+
+        self._refreshPeriod = refreshPeriod / 1000.
+        self._lastRefresh = 0
+        self._pending = False
+        self._refreshing = False
+        self._running = False
+
+    def setBoard(self, board):
+        """Set the board holding the devices."""
+        self._board = board
+
+    def setConnection(self, connection):
+        """Set the connection the messages are taken from."""
+        self._connection = connection
+
+    def setBroadcast(self, broadcast):
+        """Set the UDP broadcast of the data stream, None stops the stream."""
+        self._broadcast = broadcast
+
+    def setRecorder(self, recorder):
+        """Set the recorder of the file stream, None stops the recording."""
+        self._recorder = recorder
+
+    def refreshed(self):
+        """Acknowledge that the GUI has drawn the last refresh."""
+        self._refreshing = False
+
+    def stop(self):
+        """Stop the thread after the current iteration."""
+        self._running = False
+
+    def run(self):
+        """Thread function, ingests the messages until stopped."""
+        self._running = True
+        while self._running:
+            board = self._board                                 # Use the same board and connection for the whole iteration
+            connection = self._connection
+            messages = []
+            connected = board != None and connection != None and connection.status() == 'Connected'
+            if (connected):
+                messages = connection.getParsedMessages()       # Decoded once by the connection
+            if (len(messages) == 0 and connected):              # Wait for new messages or the next refresh
+                connection.waitMessages(self._refreshPeriod if self._pending else WAIT_TIMEOUT / 1000.)
+            elif (len(messages) == 0):                          # Wait for a connection
+                self.msleep(WAIT_TIMEOUT)
+            for messageDict in messages:
+                try:
+                    self._ingest(board, board.parsedMessage(messageDict))
+                except Exception as exc:                        # Log generic errors, the thread keeps running
+                    self._logger.error('General Error occurred: ' + str(exc))
+            now = time.time()                                   # Signal the new data if the GUI is ready for it
+            if (self._pending and not self._refreshing and now - self._lastRefresh >= self._refreshPeriod):
+                self._pending = False
+                self._refreshing = True
+                self._lastRefresh = now
+                self.dataUpdated.emit()
+
+    def _ingest(self, board, message):
+        """Apply a message to the board."""
+        if (message.type == 'Register'):                        # Message to register a device
+            board.registerDevice(Device(message.name, message.data)) # Register device
+            self.registered.emit(message.name)
+        elif (message.type == 'Deregister'):                    # Message to deregister a device
+            board.deregisterDevice(Device(message.name))        # Deregister device
+            self.deregistered.emit(message.name)
+        elif (message.type == 'D'):
+            self._pending = True                                # Raise data refresh flag
+            for messageData in message.data['data']:            # Loop through all data blocks
+                name = messageData['name']                      # Name of the device
+                valuesArray = messageData['values']             # New values of the device
+                board.updateBlock(name, valuesArray, messageData['cycle']) # Add the whole block to the device
+                self._stream(board, name, valuesArray)
+        elif (message.type == 'CycleDuration'):                 # Cycle duration message
+            self.cycleDuration.emit(message.data['values'])
+        elif (message.type == 'Ping'):                          # Ping message
+            self._logger.debug('PING')
+        else:                                                   # Message with unknown type
+            self._logger.warn('Unknown message type: {}'.format(message.type))
+
+    def _stream(self, board, name, valuesArray):
+        """Stream a block of values of a device to file and UDP."""
+        device = board.device(name)                             # Look for correct device once per block
+                                                                # Check if it exists and should be ignored or is hidden
+        if (device == None or device.ignore() or device.hide()):
+            return
+        recorder = self._recorder
+        if (recorder != None):                                  # Stream data to file, written by the recorder thread
+            recorder.put(name, valuesArray)
+
+        entryName = name.replace(',','-')                       # Name used in the entries
+        broadcast = self._broadcast
+        if (broadcast != None):                                 # Stream data to UDP using same format as for the CSV files
+            for values in valuesArray:                          # Loop all new values (timestamp, [values])
+                for i in range(len(values[1])):                 # Loop through all dimensions
+                    broadcast.send(','.join([   entryName,      # Send data entry
+                                                str(i),
+                                                str(values[0]),
+                                                str(values[1][i])]))
@@ -254,10 +254,20 @@ class InterfaceWidget(QWidget):
             self._scanGifLabel.setVisible(False)
         self._logger.debug("Interface UI scan updated")
 
-    def setCycleDurationLabel(self, cycleDurations):
-        """Set cycle duration label and channel."""
+    def setCycleDurationLabel(self, cycleDurations, dropped=None, stream=None):
+        """Set cycle duration label and channel, dropped counts the samples dropped by the Interface, stream the UDP packets."""
         self._boardCycleDurations = cycleDurations
-        self._boardCycleDurationLabel.setText('Update <b>{:06.2f} ms</b> | Scan <b>{:06.2f} ms</b>'.format(cycleDurations['update'] * 1000, cycleDurations['scan'] * 1000))
+        text = 'Update <b>{:06.2f} ms</b> | Scan <b>{:06.2f} ms</b>'.format(cycleDurations['update'] * 1000, cycleDurations['scan'] * 1000)
+        if 'jitter' in cycleDurations:                          # Jitter percentiles of the device loops (newer firmware)
+            text += ' | Jitter p99 <b>{:06.2f} ms</b>'.format(cycleDurations['jitter']['p99'] * 1000)
+        samples = cycleDurations['dropped']['samples'] if 'dropped' in cycleDurations else 0 # Dropped by the Firmware
+        if dropped != None:
+            samples += dropped['samples']                       # Dropped by the Interface
+        if samples > 0:
+            text += ' | Dropped <b>{}</b> samples'.format(samples)
+        if stream != None:                                      # Packets of the UDP data stream
+            text += ' | UDP lost <b>{}</b> / reordered <b>{}</b> packets'.format(stream['lost'], stream['reordered'])
+        self._boardCycleDurationLabel.setText(text)
         self._logger.debug("Interface UI scan updated")
 
     def updateDeviceList(self, devices):
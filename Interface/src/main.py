@@ -31,7 +31,8 @@ import numpy as np                                              # Number utility
 from interface import InterfaceWidget                           # Custom interface widget
 from connectionDialog import ConnectionDialog                   # Dialog widget for connection settings
 from udpBroadcast import UDPBroadcast                           # UDP Broadcast functionality
-from boards.board import Device                                 # Board base class
+from ingest import IngestThread                                 # Decoding of the messages off the GUI thread
+import recorder                                                 # Recording of the data stream to a file
 from boards.beagleboneGreenWirelessBoard import BeagleboneGreenWirelessBoard # BBGW implementation
 from connections.connection import Message                      # Message class
 from connections.beagleboneGreenWirelessConnection import BeagleboneGreenWirelessConnection # BBGWConnection implementation
@@ -78,8 +79,14 @@ class MainWindow(QMainWindow):
     _port = None
     # The connection time
     _connectionIteratorTimer = None
+    # The thread ingesting the messages of the connection
+    _ingestThread = None
+    # Flag whether the UI needs a refresh for (de)registered devices
+    _uiPending = False
     # The UPD broadcast
     _broadcast = None
+    # The recorder of the file stream
+    _recorder = None
     # Flag whether hidden devices should be shown or hidden
     _showHiddenDevices = False
     # Popup with multi plot
@@ -119,6 +126,13 @@ class MainWindow(QMainWindow):
         self.connectionDialog = ConnectionDialog()
         self.connectionDialog.settingsChanged.connect(self._connectionSettingsChangedListener)
 
+        # Create the thread ingesting the messages
+        self._ingestThread = IngestThread(UPDATE_LOOP, self)
+        self._ingestThread.registered.connect(self._registeredListener)
+        self._ingestThread.deregistered.connect(self._deregisteredListener)
+        self._ingestThread.cycleDuration.connect(self._cycleDurationListener)
+        self._ingestThread.dataUpdated.connect(self._dataUpdatedListener)
+
         # Load default board
         self.loadBoard(availableBoards[0].name())
 
@@ -129,6 +143,9 @@ class MainWindow(QMainWindow):
         self._connectionIteratorTimer.start(UPDATE_LOOP)
         self._logger.debug("Start timer [{}ms] for update loop".format(UPDATE_LOOP))
 
+        # Start ingesting the messages
+        self._ingestThread.start()
+
         self._logger.info("Main initialized")
 
 
@@ -218,6 +235,14 @@ class MainWindow(QMainWindow):
         streamToFileAct.setStatusTip('Stream Incoming Data To File')
         streamToFileAct.triggered.connect(self._onStreamToFile)
         streamMenu.addAction(streamToFileAct)
+        streamToWideFileAct = QAction('File (&Wide .CSV)', self)
+        streamToWideFileAct.setStatusTip('Stream Incoming Data To File With One Row Per Sample')
+        streamToWideFileAct.triggered.connect(self._onStreamToWideFile)
+        streamMenu.addAction(streamToWideFileAct)
+        streamToNpyFileAct = QAction('File (&Binary .NPY)', self)
+        streamToNpyFileAct.setStatusTip('Stream Incoming Data To File In NumPy Chunks')
+        streamToNpyFileAct.triggered.connect(self._onStreamToNpyFile)
+        streamMenu.addAction(streamToNpyFileAct)
         streamToPortAct = QAction('&UDP Protocol', self)
         streamToPortAct.setStatusTip('Stream Incoming Data To UDP Service (Not Implemented)')
         streamToPortAct.triggered.connect(self._onStreamToUDP)
@@ -310,6 +335,7 @@ class MainWindow(QMainWindow):
 
         self._board = next((x for x in availableBoards if x.name() == name), None)
         self._board.setMaxPoints(PLOT_POINTS_SET[PLOT_POINTS])  # Set plot points
+        self._ingestThread.setBoard(self._board)                # Ingest the messages into the board
 
         # Throw for no board
         if (self._board == None):
@@ -344,6 +370,7 @@ class MainWindow(QMainWindow):
         # Set the ip and port
         self._connection.setIp(self._ip)
         self._connection.setPort(self._port)
+        self._ingestThread.setConnection(self._connection)      # Ingest the messages of the connection
 
         # Clear diag
         self._updateLoopDurations = []
@@ -398,6 +425,7 @@ class MainWindow(QMainWindow):
             self._connection.disconnect()
             self._board.reset()
             self._onStreamStop()
+            self._stopIngest()
             event.accept()
         # Ask for confirmation
         else:
@@ -410,6 +438,7 @@ class MainWindow(QMainWindow):
                 self._connection.disconnect()
                 self._board.reset()
                 self._onStreamStop()
+                self._stopIngest()
 
                 # Close app
                 event.accept()
@@ -417,6 +446,11 @@ class MainWindow(QMainWindow):
                 # Keep app open
                 event.ignore()
 
+    def _stopIngest(self):
+        """Stop the ingest thread and wait for it."""
+        self._ingestThread.stop()
+        self._ingestThread.wait()
+
 
 
 
@@ -481,22 +515,48 @@ class MainWindow(QMainWindow):
     @pyqtSlot()
     def _onStreamToFile(self):
         """Stream data to file."""
-        fileName = self.saveFileDialog()                        # Get file location
+        self.streamToFile(recorder.FORMAT_CSV)
+
+    @pyqtSlot()
+    def _onStreamToWideFile(self):
+        """Stream data to file with one row per sample."""
+        self.streamToFile(recorder.FORMAT_WIDE)
+
+    @pyqtSlot()
+    def _onStreamToNpyFile(self):
+        """Stream data to file in NumPy chunks."""
+        self.streamToFile(recorder.FORMAT_NPY)
+
+    def streamToFile(self, format):
+        """Stream data to file in the format."""
+        if (format == recorder.FORMAT_NPY):                     # Get file location
+            fileName = self.saveFileDialog('npy', "NumPy Files (*.npy)")
+        else:
+            fileName = self.saveFileDialog()
         if (fileName != None):                                  # Prepare file if one is selected
-            with open(fileName, "w") as fh:
-                self._logger.info("Stream data to file '{}'".format(fileName))
-                fh.write(','.join(['Device','Dimension','Date','Value']) + '\n')
-                self._board.setFileName(fileName)
-                self._streamMenu.menuAction().setVisible(False)
-                self._streamStopAct.setVisible(True)
-                shortFileName = (fileName[:32] and '...') + fileName[32:]
-                self._interface.setStreamLabel(True, '{}'.format(shortFileName))
+            self._logger.info("Stream data to file '{}'".format(fileName))
+            dim = max([recorder.WIDE_DIM] + [device.dim() for device in self._board.deviceList()]) # Columns of the wide format
+            self._recorder = recorder.Recorder(fileName, format, dim) # Keep the file open and write from the background
+            self._ingestThread.setRecorder(self._recorder)      # Record the ingested data
+            self._board.setFileName(fileName)
+            self._streamMenu.menuAction().setVisible(False)
+            self._streamStopAct.setVisible(True)
+            self.updateStreamLabel()
+
+    def updateStreamLabel(self):
+        """Update the stream label with the file and the recorder stats."""
+        fileName = self._recorder.fileName()
+        shortFileName = (fileName[:32] and '...') + fileName[32:]
+        stats = self._recorder.stats()
+        self._interface.setStreamLabel(True, '{} | {:.1f} kB/s | backlog {} samples'.format(
+            shortFileName, stats['bytesPerSecond'] / 1000., stats['backlog']))
 
     @pyqtSlot()
     def _onStreamToUDP(self):
         """Stream data to udp service."""
         self._logger.info("Stream data to port '{}'".format(UDP_PORT))
         self._broadcast = UDPBroadcast(UDP_IP, UDP_PORT)        # Create UDP data stream
+        self._ingestThread.setBroadcast(self._broadcast)        # Stream the ingested data
         self._streamMenu.menuAction().setVisible(False)
         self._streamStopAct.setVisible(True)
         self._interface.setStreamLabel(True, 'UDP {}:{}'.format(UDP_IP, UDP_PORT))
@@ -505,9 +565,13 @@ class MainWindow(QMainWindow):
     def _onStreamStop(self):
         """Stop streaming data."""
         if (self._broadcast != None):                           # Stop all streaming to UDP
+            self._ingestThread.setBroadcast(None)
             del self._broadcast
             self._broadcast = None
-        elif (self._board.fileName() != None):                  # Stop all streaming to file
+        elif (self._recorder != None):                          # Stop all streaming to file
+            self._ingestThread.setRecorder(None)
+            self._recorder.close()                              # Write the remaining data
+            self._recorder = None
             self._board.setFileName(None)
         self._logger.info("Data streaming has been stopped")
 
@@ -586,88 +650,12 @@ class MainWindow(QMainWindow):
     @pyqtSlot()
     def connectionIteration(self):
         """Next connection iteration listener."""
+        if (self._uiPending):                                   # Update UI once for all (de)registered devices
+            self._uiPending = False
+            self.updateUI()
+        if (self._recorder != None):                            # Show the throughput and backlog of the recording
+            self.updateStreamLabel()
         if (self._connection.status() == 'Connected'):          # Only do something when there is a connection
-                                                                # Get the new messages from the connection and unserialize them
-            messages = list(map(lambda x: self._board.unserializeMessage(x), self._connection.getMessages()))
-
-            data = False                                        # Data refresh flag
-            ui = False                                          # UI refresh flag
-            multiPlot = False                                   # Multiplot flag
-
-            if (messages != None and len(messages) > 0):
-                for message in messages:
-                    if (message.type == 'Register'):            # Message to register a device
-                        ui = True                               # Raise UI refresh flag
-                        self._board.registerDevice(Device(message.name, message.data)) # Register device
-                        self._logger.info('Register Device: {}'.format(message.name))
-                        self._statusBar.showMessage('Register Device: {}'.format(message.name))
-                    elif (message.type == 'Deregister'):        # Message to deregister a device
-                        ui = True                               # Raise UI refresh flag
-                        self._board.deregisterDevice(Device(message.name)) # Deregister device
-                        self._logger.info('Deregister Device: {}'.format(message.name))
-                        self._statusBar.showMessage('Deregister Device: {}'.format(message.name))
-                    elif (message.type == 'D'):
-                        data = True                             # Raise data refresh flag
-                                                                # Update the data
-                        for messageData in message.data['data']: # Loop through all data blocks
-                            name = messageData['name']          # Name of the device
-                            valuesArray = messageData['values'] # New values of the device
-                            for values in valuesArray:          # Loop all new values (timestamp, [values], cycleDuration)
-                                self._board.updateData(name, values[1], values[0], messageData['cycle'])
-                                if (self._board.fileName() != None): # Stream data to file
-                                    with open(self._board.fileName(), "a") as fh: # Open the file
-                                        for i in range(len(values[1])): # Loop through all dimensions
-                                                                # Look for correct device
-                                            for device in self._board.deviceList():
-                                                                # Check if it exists and should be ignored or is hidden
-                                                if (device.name() == name and not device.ignore() and not device.hide()):
-                                                    fh.write(','.join([ name.replace(',','-'), # Write data entry
-                                                                        str(i),
-                                                                        str(values[0]),
-                                                                        str(values[1][i])]) + '\n')
-
-                                if (self._broadcast != None):   # Stream data to UDP using same format as for the CSV files
-                                    for i in range(len(values[1])): # Loop through all dimensions
-                                        for device in self._board.deviceList(): # Look for correct device
-                                                                # Check if it exists and should be ignored or is hidden
-                                            if (device.name() == name and not device.ignore() and not device.hide()):
-                                                self._broadcast.send(','.join([ name.replace(',','-'), # Send data entry
-                                                                                str(i),
-                                                                                str(values[0]),
-                                                                                str(values[1][i])]))
-                                if (self._popupPlotWidget != None and self._popupPlotWidget.isVisible()): # Multiplot data in window
-                                    multiPlot = True
-                                    p = 0
-                                    for d, device in enumerate(self._popupPlotsDevices):
-                                        pastData = device.pastData()
-                                        for i in range(device.dim()):
-                                            if device.activeDim()[i] == True: # Check if dimension is active
-                                                self._popupPlots[p].setData(y=np.asarray(pastData[i]), x=np.arange(len(pastData[i]))) # Plot values
-                                                p += 1
-
-                    elif (message.type == 'CycleDuration'):     # Cycle duration message
-                        self._logger.debug('Cycle durations: {}', str(message.data['values']))
-                        self._interface.setCycleDurationLabel(message.data['values'])
-                        self._updateLoopDurations.append(message.data['values']['update'] * 1000) # in ms
-                        while (MAX_POINTS < len(self._updateLoopDurations)): # Create overflow for past values
-                            self._updateLoopDurations.pop(0)
-                        if self._popupDiagPlot != None:
-                            self._popupDiagPlot.setData(y=np.asarray(self._updateLoopDurations), x=np.arange(len(self._updateLoopDurations))) # Plot values
-                    elif (message.type == 'Ping'):              # Ping message
-                        self._logger.debug('PING')
-
-                    else:                                       # Message with unknown type
-                        self._logger.warn('Unknown message type: {}'.format(message.type))
-                        pass
-
-                if (data and not multiPlot):                    # Update data if data flag has been raised (except multi plot is active)
-                    self.updateData()
-                if (ui):                                        # Update UI if UI flag has been raised
-                    self.updateUI()
-
-            else:
-                pass
-
             messagesSend = []                                   # Messages for outgoing devices
 
             # for device in self._board.deviceList():             # Calculate new values for all outgoing devices
@@ -690,6 +678,47 @@ class MainWindow(QMainWindow):
             """Ping"""
             # self._connection.sendMessages([self._board.serializeMessage(Message('Ping',''))]);
 
+    @pyqtSlot(str)
+    def _registeredListener(self, name):
+        """Listen to devices registered by the ingest thread."""
+        self._uiPending = True                                  # Raise UI refresh flag
+        self._logger.info('Register Device: {}'.format(name))
+        self._statusBar.showMessage('Register Device: {}'.format(name))
+
+    @pyqtSlot(str)
+    def _deregisteredListener(self, name):
+        """Listen to devices deregistered by the ingest thread."""
+        self._uiPending = True                                  # Raise UI refresh flag
+        self._logger.info('Deregister Device: {}'.format(name))
+        self._statusBar.showMessage('Deregister Device: {}'.format(name))
+
+    @pyqtSlot(dict)
+    def _cycleDurationListener(self, values):
+        """Listen to cycle durations received by the ingest thread."""
+        self._logger.debug('Cycle durations: {}'.format(str(values)))
+        self._interface.setCycleDurationLabel(values, self._connection.getDropped(), self._connection.getStreamStats())
+        self._updateLoopDurations.append(values['update'] * 1000) # in ms
+        while (MAX_POINTS < len(self._updateLoopDurations)):    # Create overflow for past values
+            self._updateLoopDurations.pop(0)
+        if self._popupDiagPlot != None:
+            self._popupDiagPlot.setData(y=np.asarray(self._updateLoopDurations), x=np.arange(len(self._updateLoopDurations))) # Plot values
+
+    @pyqtSlot()
+    def _dataUpdatedListener(self):
+        """Listen to new data ingested by the ingest thread."""
+        with self._board.lock():                                # Ingest thread waits while the data is handed to the plots
+            if (self._popupPlotWidget != None and self._popupPlotWidget.isVisible()): # Multiplot data in window
+                p = 0
+                for d, device in enumerate(self._popupPlotsDevices):
+                    pastData = device.pastData()
+                    for i in range(device.dim()):
+                        if device.activeDim()[i] == True:       # Check if dimension is active
+                            self._popupPlots[p].setData(y=pastData[i], x=np.arange(len(pastData[i]))) # Plot values
+                            p += 1
+            else:                                               # Update data (except multi plot is active)
+                self.updateData()
+        self._ingestThread.refreshed()                          # Ready for the next refresh
+
     @pyqtSlot(Message)
     def _sendMessageListener(self, message):
         """Listen to send message event from the interface and pass them to the connection."""
@@ -739,11 +768,11 @@ class MainWindow(QMainWindow):
         self._popupDiagPlotWidget.raise_()
 
 
-    def saveFileDialog(self):
+    def saveFileDialog(self, extension='csv', filter="Text Files (*.csv)"):
         """Dialog to select location to save file."""
         options = QFileDialog.Options()
         #options |= QFileDialog.DontUseNativeDialog             # Can be uncommented if there is a problem with the default menu on OSX
-        fileName, _ = QFileDialog.getSaveFileName(self, "Save Board Multi Plot For {}".format(self._board.name()),"{}/../Plots/{} Multi Plot.csv".format(sys.path[0], self._board.name()),"Text Files (*.csv)", options=options) # Select file to store data stream
+        fileName, _ = QFileDialog.getSaveFileName(self, "Save Board Multi Plot For {}".format(self._board.name()),"{}/../Plots/{} Multi Plot.{}".format(sys.path[0], self._board.name(), extension),filter, options=options) # Select file to store data stream
         if not fileName:
             self._logger.info('No file selected')
             return
@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+# Author: Cyrill Lippuner
+# Date: October 2018
+"""
+Recording of the data stream to a file.
+
+The file is kept open and written through a large buffer by a background thread,
+the blocks of samples are only queued by the ingest thread. Supported formats:
+
+'csv'  one row per sample and dimension: Device,Dim,Date,Value (Multi Plot format)
+'wide' one row per sample with one column per dimension: Device,Date,Dim[1],Dim[2],…
+       padded with empty columns to the same number of dimensions for every device
+'npy'  chunks of NumPy arrays: the device name followed by its samples as rows of
+       [timestamp, values…], read back with load()
+"""
+
+import collections                                              # Queue of the blocks
+import threading                                                # Background writer thread
+import time                                                     # Throughput measurement
+import logging                                                  # Logging package
+import numpy as np                                              # Number utility package
+
+# Logging settings
+LOG_LEVEL_PRINT = logging.INFO                                  # Set print level for stout logging
+LOG_LEVEL_SAVE = logging.DEBUG                                  # Set print level for .log logging
+
+FORMAT_CSV = 'csv'                                              # One row per sample and dimension
+FORMAT_WIDE = 'wide'                                            # One row per sample
+FORMAT_NPY = 'npy'                                              # Chunks of NumPy arrays
+FORMATS = [FORMAT_CSV, FORMAT_WIDE, FORMAT_NPY]                 # Supported formats
+CSV_HEADER = 'Device,Dimension,Date,Value\n'                    # First line of the 'csv' format
+WIDE_DIM = 17                                                   # Largest dimension of the Firmware drivers (BNO055)
+BUFFER_SIZE = 1 << 20                                           # Size of the file buffer in bytes
+WRITE_PERIOD = 0.1                                              # Longest wait for new blocks in [s]
+STATS_PERIOD = 1.                                               # Period of the throughput measurement in [s]
+
+
+class Recorder():
+    """Recorder writing blocks of samples to a file from a background thread."""
+
+    # Name of the file
+    _fileName = None
+    # Format of the file
+    _format = FORMAT_CSV
+    # Number of dimension columns of the 'wide' format
+    _dim = WIDE_DIM
+    # File handle
+    _fh = None
+    # Queued blocks (name, [[timestamp, [values]]])
+    _blocks = None
+    # Number of queued samples
+    _backlog = 0
+    # Condition guarding the queue, notified for new blocks
+    _condition = None
+    # Flag whether the recorder should keep running
+    _running = False
+    # Writer thread
+    _thread = None
+    # Written bytes and samples
+    _written = None
+    # Written bytes per second of the last measurement
+    _throughput = 0.
+    # Logger module
+    _logger = None
+
+
+    def __init__(self, fileName, format=FORMAT_CSV, dim=WIDE_DIM, bufferSize=BUFFER_SIZE):
+        """Open the file and start the writer thread, dim is the number of dimension columns of the 'wide' format."""
+        if format not in FORMATS:
+            raise ValueError('Format {} is not allowed'.format(format))
+        if dim < 1:
+            raise ValueError('Dim {} is not allowed'.format(dim))
+
+        # Configure the logger
+        self._logger = logging.getLogger('Recorder')
+        self._logger.setLevel(LOG_LEVEL_PRINT)                  # Only {LOG_LEVEL} level or above will be saved
+        # fh = logging.FileHandler('../Logs/Recorder.log', 'w')
+        # formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
+        # fh.setFormatter(formatter)
+        # fh.setLevel(LOG_LEVEL_SAVE)                             # Only {LOG_LEVEL} level or above will be saved
+        # self._logger.addHandler(fh)
+
+        self._fileName = fileName
+        self._format = format
+        self._dim = dim
+        self._blocks = collections.deque()
+        self._backlog = 0
+        self._condition = threading.Condition()
+        self._written = {'bytes': 0, 'samples': 0}
+        self._throughput = 0.
+        if format == FORMAT_NPY:                                # Binary file
+            self._fh = open(fileName, 'wb', buffering=bufferSize)
+        else:                                                   # Text file with header
+            self._fh = open(fileName, 'w', buffering=bufferSize)
+            header = CSV_HEADER
+            if format == FORMAT_WIDE:                           # One column per dimension
+                header = ','.join(['Device', 'Date'] + ['Dim[{}]'.format(i + 1) for i in range(dim)]) + '\n'
+            self._fh.write(header)
+            self._written['bytes'] += len(header)
+        self._running = True
+        self._thread = threading.Thread(target=self._writerThread, name="RecorderThread")
+        self._thread.daemon = True                              # Set thread as daemonic
+        self._thread.start()
+        self._logger.info("Record data to file '{}' ({})".format(fileName, format))
+
+    def fileName(self):
+        """Return the file name."""
+        return self._fileName
+
+    def format(self):
+        """Return the format."""
+        return self._format
+
+    def put(self, name, values):
+        """Queue a block of samples [[timestamp, [values]]] of a device."""
+        if len(values) == 0:                                    # Nothing to record
+            return
+        with self._condition:
+            self._blocks.append((name, values))
+            self._backlog += len(values)
+            self._condition.notify()
+
+    def stats(self):
+        """Return the written bytes and samples, the written bytes per second and the queued samples."""
+        with self._condition:
+            return {'bytes': self._written['bytes'], 'samples': self._written['samples'],
+                    'bytesPerSecond': self._throughput, 'backlog': self._backlog}
+
+    def close(self):
+        """Write the queued blocks, stop the writer thread and close the file."""
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        self._thread.join()
+        self._fh.close()
+        self._logger.info("Closed file '{}'".format(self._fileName))
+
+    def _writerThread(self):
+        """Writer thread function, writes the queued blocks until closed."""
+        measureStart = time.time()
+        measureBytes = 0
+        while True:
+            with self._condition:
+                if self._running and len(self._blocks) == 0:
+                    self._condition.wait(WRITE_PERIOD)          # Wait for new blocks
+                blocks = self._blocks                           # Take all queued blocks
+                self._blocks = collections.deque()
+                running = self._running
+            try:
+                written = self._write(blocks)
+            except (IOError, ValueError) as exc:                # Log errors, the blocks are lost
+                self._logger.error('Write Error occurred: ' + str(exc))
+                written = 0
+            samples = sum(len(values) for name, values in blocks)
+            now = time.time()
+            with self._condition:
+                self._backlog -= samples
+                self._written['bytes'] += written
+                self._written['samples'] += samples
+                measureBytes += written
+                if now - measureStart >= STATS_PERIOD:          # Measure the throughput
+                    self._throughput = measureBytes / (now - measureStart)
+                    measureStart = now
+                    measureBytes = 0
+            if not running:                                     # All blocks taken before the stop are written
+                return
+
+    def _write(self, blocks):
+        """Write the blocks to the file buffer, return the number of written bytes."""
+        if self._format == FORMAT_NPY:
+            return self._writeNpy(blocks)
+        lines = []
+        for name, values in blocks:
+            entryName = name.replace(',','-')                   # Name used in the entries
+            if self._format == FORMAT_WIDE:
+                if len(values[0][1]) > self._dim:               # Keep the columns of the header
+                    self._logger.error('Device {} has more than {} dimensions, truncated'.format(name, self._dim))
+                padding = [''] * max(0, self._dim - len(values[0][1]))
+                for value in values:                            # One row per sample
+                    lines.append(','.join([entryName, str(value[0])] + [str(el) for el in value[1][:self._dim]] + padding))
+            else:
+                for value in values:                            # One row per sample and dimension
+                    timestamp = str(value[0])
+                    for i, el in enumerate(value[1]):
+                        lines.append(','.join([entryName, str(i), timestamp, str(el)]))
+        if len(lines) == 0:
+            return 0
+        text = '\n'.join(lines) + '\n'
+        self._fh.write(text)
+        return len(text)
+
+    def _writeNpy(self, blocks):
+        """Write the blocks as one chunk per device, return the number of written bytes."""
+        chunks = collections.OrderedDict()                      # Merge the blocks of every device
+        for name, values in blocks:
+            chunks.setdefault(name, []).extend(values)
+        start = self._fh.tell()
+        for name, values in chunks.items():
+            samples = np.array([[value[0]] + list(value[1]) for value in values], dtype=float) # None becomes NaN
+            np.save(self._fh, np.array(name))
+            np.save(self._fh, samples)
+        return self._fh.tell() - start
+
+
+def load(fileName):
+    """Load a file recorded in the 'npy' format, return the samples [[timestamp, values…]] by device name."""
+    devices = {}
+    with open(fileName, 'rb') as fh:
+        while True:
+            try:
+                name = str(np.load(fh))
+            except (EOFError, ValueError):                      # End of the file
+                break
+            devices.setdefault(name, []).append(np.load(fh))
+    return dict((name, np.concatenate(chunks)) for name, chunks in devices.items())